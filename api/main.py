@@ -2,18 +2,28 @@
 Web API
 提供监控面板数据接口
 """
-from fastapi import FastAPI, Header, HTTPException, Depends, status
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Header, HTTPException, Depends, Query, Request, status
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import hashlib
+import json
 import sys
 import os
+import threading
+import time
 
 # 添加父目录到路径
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from config import Config
-from bot import Database, OKXTrader
+from bot import Database
+from bot.snapshot import SnapshotReader
+from api.stream import EventHub
 
 app = FastAPI(title="AI炒币监控面板")
 
@@ -26,16 +36,50 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+class CompressionMiddleware:
+    """gzip压缩较大的响应
+
+    SSE流不压缩：压缩器会攒数据，事件就不能及时推到浏览器了
+    """
+
+    def __init__(self, app, minimum_size: int = 1000, skip_paths=('/api/stream',)):
+        self.app = app
+        self.skip_paths = skip_paths
+        self.compressed = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] not in self.skip_paths:
+            await self.compressed(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
+app.add_middleware(CompressionMiddleware)
+
 # 初始化数据库
 db = Database(Config.DATABASE_PATH)
 
-# 初始化交易器（仅用于查询）
-trader = OKXTrader(
-    Config.OKX_API_KEY,
-    Config.OKX_SECRET_KEY,
-    Config.OKX_PASSPHRASE,
-    Config.OKX_SIMULATED
-)
+# 机器人发布的状态快照（面板不再持有OKX凭证，也不请求交易所）
+snapshot_reader = SnapshotReader(Config.SNAPSHOT_PATH)
+
+# 阻塞操作（SQLite查询、读快照文件）放到有界线程池里执行，不占用事件循环
+executor = ThreadPoolExecutor(max_workers=Config.API_WORKERS, thread_name_prefix='api-io')
+
+
+async def run_blocking(func, *args, timeout: float = None):
+    """
+    在线程池中执行阻塞函数
+    :param timeout: 超时秒数（默认Config.API_TIMEOUT），超时返回504；线程里的查询会继续执行完
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(
+            loop.run_in_executor(executor, functools.partial(func, *args)),
+            timeout or Config.API_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="数据读取超时")
 
 
 def verify_panel_token(x_panel_token: str = Header(default=None)):
@@ -49,62 +93,57 @@ def verify_panel_token(x_panel_token: str = Header(default=None)):
     return True
 
 
+def verify_stream_token(token: str = Query(default=None), x_panel_token: str = Header(default=None)):
+    """SSE连接的Token校验（EventSource不能带自定义Header，改用?token=参数）"""
+    return verify_panel_token(x_panel_token or token)
+
+
+INDEX_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'web', 'index.html')
+# (mtime, html)元组一次替换，线程池里并发读写也不会拼出不一致的组合
+index_cache = {'entry': (None, None)}
+
+
+def load_index_html() -> str:
+    """读取面板HTML（在线程池里执行stat；文件未修改时直接用内存缓存）"""
+    mtime = os.stat(INDEX_PATH).st_mtime_ns
+    entry = index_cache['entry']
+    if mtime != entry[0]:
+        with open(INDEX_PATH, "r", encoding="utf-8") as f:
+            entry = (mtime, f.read())
+        index_cache['entry'] = entry
+    return entry[1]
+
+
 @app.get("/")
 async def root():
-    """返回监控面板HTML"""
-    with open("web/index.html", "r", encoding="utf-8") as f:
-        html_content = f.read()
-    return HTMLResponse(content=html_content)
+    """返回监控面板HTML（缓存在内存，文件修改后自动重新读取）"""
+    return HTMLResponse(content=await run_blocking(load_index_html))
 
 
-@app.get("/api/balance", dependencies=[Depends(verify_panel_token)])
-async def get_balance():
-    """获取账户余额（包含平均成本价和盈亏）"""
-    balance = trader.get_balance()
-    if not balance['success']:
-        return {"success": False, "error": balance.get('error')}
-    
-    # 获取当前价格
-    price = trader.get_ticker(Config.TRADING_SYMBOL)
-    
-    total_value = 0
-    if price:
-        total_value = balance['btc'] * price + balance['usdt']
-    
-    # 获取平均成本价（从成交记录计算）
-    avg_cost_data = trader.get_spot_avg_cost(Config.TRADING_SYMBOL, balance['btc'])
-    avg_cost = 0
-    unrealized_pnl = 0
-    unrealized_pnl_percent = 0
-    
-    if avg_cost_data['success'] and avg_cost_data.get('avg_price', 0) > 0:
-        avg_cost = avg_cost_data['avg_price']
-        if price and balance['btc'] > 0:
-            unrealized_pnl = (price - avg_cost) * balance['btc']
-            unrealized_pnl_percent = ((price - avg_cost) / avg_cost * 100) if avg_cost > 0 else 0
+def balance_payload():
+    """余额数据（包含平均成本价和盈亏；来自机器人发布的快照，snapshot_age为快照秒数）"""
+    snapshot = snapshot_reader.read()
+    if snapshot is None:
+        return {"success": False, "error": "机器人尚未发布状态快照"}
     
+    price = snapshot.get('price') or 0
     return {
         "success": True,
-        "usdt": round(balance['usdt'], 2),
-        "btc": round(balance['btc'], 8),  # 改为8位小数，BTC标准精度
-        "btc_price": round(price, 2) if price else 0,
-        "total_value": round(total_value, 2),
-        "avg_cost": round(avg_cost, 2),
-        "unrealized_pnl": round(unrealized_pnl, 2),
-        "unrealized_pnl_percent": round(unrealized_pnl_percent, 2)
+        "usdt": round(snapshot['usdt'], 2),
+        "btc": round(snapshot['btc'], 8),  # 改为8位小数，BTC标准精度
+        "btc_price": round(price, 2),
+        "total_value": round(snapshot['total_value'], 2),
+        "avg_cost": round(snapshot['avg_cost'], 2),
+        "unrealized_pnl": round(snapshot['unrealized_pnl'], 2),
+        "unrealized_pnl_percent": round(snapshot['unrealized_pnl_percent'], 2),
+        "snapshot_version": snapshot['version'],
+        "published_at": snapshot['published_at'],
+        "snapshot_age": round(time.time() - snapshot['published_at'], 2)
     }
 
 
-@app.get("/api/trades", dependencies=[Depends(verify_panel_token)])
-async def get_trades(limit: int = 10):
-    """获取最近交易记录"""
-    trades = db.get_recent_trades(limit)
-    return {"success": True, "trades": trades}
-
-
-@app.get("/api/statistics", dependencies=[Depends(verify_panel_token)])
-async def get_statistics():
-    """获取统计数据（包含历史表现）"""
+def statistics_payload():
+    """统计数据（包含历史表现）"""
     stats = db.get_statistics()
     performance = db.get_recent_performance(20)  # 最近20笔
     
@@ -119,26 +158,197 @@ async def get_statistics():
     return {"success": True, "statistics": stats}
 
 
+def snapshot_payload():
+    """完整快照（snapshot_age为快照秒数）"""
+    snapshot = snapshot_reader.read()
+    if snapshot is None:
+        return {"success": False, "error": "机器人尚未发布状态快照"}
+    return {"success": True, "snapshot": snapshot, "snapshot_age": round(time.time() - snapshot['published_at'], 2)}
+
+
+def trades_payload(limit: int):
+    """最近交易记录"""
+    return {"success": True, "trades": db.get_recent_trades(limit)}
+
+
+def status_payload():
+    """最新状态（不含推理过程）"""
+    return {"success": True, "status": db.get_latest_status()}
+
+
+def reasoning_payload(status_id: int):
+    """某条状态的AI推理过程"""
+    reasoning = db.get_reasoning(status_id)
+    if reasoning is None:
+        return {"success": False, "error": "该状态没有推理过程"}
+    return {"success": True, "status_id": status_id, "reasoning": reasoning}
+
+
+async def json_response(func, *args):
+    """在线程池里取数据并编码JSON（大列表的序列化也不占用事件循环）"""
+    def build():
+        return json.dumps(func(*args), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return Response(content=await run_blocking(build), media_type="application/json")
+
+
+@app.get("/api/balance", dependencies=[Depends(verify_panel_token)])
+async def get_balance():
+    """获取账户余额（包含平均成本价和盈亏）"""
+    return await json_response(balance_payload)
+
+
+@app.get("/api/snapshot", dependencies=[Depends(verify_panel_token)])
+async def get_snapshot():
+    """机器人发布的完整状态快照（余额、价格、成本、最近决策、成交、循环耗时）"""
+    return await json_response(snapshot_payload)
+
+
+@app.get("/api/trades", dependencies=[Depends(verify_panel_token)])
+async def get_trades(limit: int = 10):
+    """获取最近交易记录"""
+    return await json_response(trades_payload, limit)
+
+
+@app.get("/api/statistics", dependencies=[Depends(verify_panel_token)])
+async def get_statistics():
+    """获取统计数据（包含历史表现）"""
+    return await json_response(statistics_payload)
+
+
 @app.get("/api/status", dependencies=[Depends(verify_panel_token)])
 async def get_status():
     """获取最新状态"""
-    status = db.get_latest_status()
-    return {"success": True, "status": status}
+    return await json_response(status_payload)
+
+
+@app.get("/api/status/{status_id}/reasoning", dependencies=[Depends(verify_panel_token)])
+async def get_status_reasoning(status_id: int):
+    """获取某条状态的AI推理过程（面板展开时按需加载）"""
+    return await json_response(reasoning_payload, status_id)
+
+
+PANEL_CONFIG = {
+    "symbol": Config.TRADING_SYMBOL,
+    "max_trading_amount": Config.MAX_TRADING_AMOUNT,
+    "max_position_percent": Config.MAX_POSITION_PERCENT,
+    "check_mode": "准点（每15分钟）",
+    "simulated": Config.OKX_SIMULATED
+}
 
 
 @app.get("/api/config", dependencies=[Depends(verify_panel_token)])
 async def get_config():
     """获取配置信息"""
-    return {
-        "success": True,
-        "config": {
-            "symbol": Config.TRADING_SYMBOL,
-            "max_trading_amount": Config.MAX_TRADING_AMOUNT,
-            "max_position_percent": Config.MAX_POSITION_PERCENT,
-            "check_mode": "准点（每15分钟）",
-            "simulated": Config.OKX_SIMULATED
-        }
-    }
+    return {"success": True, "config": PANEL_CONFIG}
+
+
+# 面板聚合数据缓存：(快照版本, 最新状态id, 最新交易id, limit) 不变时直接复用上次的JSON和ETag
+# 整个(key, etag, body)元组一次替换，线程池里并发读写也不会拼出不一致的组合
+dashboard_cache = {'entry': (None, None, None)}
+
+
+def dashboard_body(limit: int):
+    """
+    面板全部数据（一次请求代替balance/statistics/config/status/trades五个接口）
+    :return: (etag, JSON字节)；数据没变化时只需一次stat和一条主键查询
+    """
+    snapshot = snapshot_reader.read()
+    ids = db.get_latest_ids()
+    key = (snapshot['version'] if snapshot else None, ids['status'], ids['trade'], limit)
+    entry = dashboard_cache['entry']
+    if key != entry[0]:
+        balance = balance_payload()
+        # snapshot_age每次都不同，会让ETag失效；面板renderBalance用published_at在本地计算快照时长
+        balance.pop('snapshot_age', None)
+        body = json.dumps({
+            "success": True,
+            "balance": balance,
+            "statistics": statistics_payload()['statistics'],
+            "config": PANEL_CONFIG,
+            "status": db.get_latest_status(),
+            "trades": db.get_recent_trades(limit)
+        }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        entry = (key, f'"{hashlib.sha256(body).hexdigest()}"', body)
+        dashboard_cache['entry'] = entry
+    return entry[1], entry[2]
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match是否命中（支持多个值、W/弱校验前缀和*）"""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(',')]
+    return '*' in candidates or etag in (value[2:] if value.startswith('W/') else value for value in candidates)
+
+
+@app.get("/api/dashboard", dependencies=[Depends(verify_panel_token)])
+async def get_dashboard(limit: int = 10, if_none_match: str = Header(default=None)):
+    """面板聚合数据：ETag为内容sha256，没有变化时返回304"""
+    etag, body = await run_blocking(dashboard_body, limit)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+class DashboardWatcher:
+    """面板数据变化检测：快照版本（余额/价格）+ 最新状态id + 最新交易id，每次只需一次stat和一条主键查询"""
+
+    def __init__(self):
+        self.version = None
+        self.ids = None
+        self._lock = threading.Lock()
+
+    def detect(self):
+        """返回自上次检测以来的变化事件（第一次只记录基线）"""
+        with self._lock:
+            return self._detect()
+
+    def _detect(self):
+        snapshot = snapshot_reader.read()
+        version = snapshot['version'] if snapshot else None
+        ids = db.get_latest_ids()
+        if self.ids is None:
+            self.version, self.ids = version, ids
+            return []
+
+        events = []
+        if version != self.version:
+            events.append(('balance', balance_payload()))
+        if ids['status'] != self.ids['status']:
+            events.append(('status', status_payload()))
+        if ids['trade'] != self.ids['trade']:
+            # 交易只推新增的几条，面板自己合并进列表
+            events.append(('trade', {"success": True, "trades": db.get_trades_after(self.ids['trade'], 10)}))
+            events.append(('statistics', statistics_payload()))
+        self.version, self.ids = version, ids
+        return events
+
+    def snapshot(self):
+        """新连接的完整状态"""
+        with self._lock:
+            if self.ids is None:
+                self._detect()
+        return [
+            ('balance', balance_payload()),
+            ('statistics', statistics_payload()),
+            ('status', status_payload()),
+            ('trades', trades_payload(10)),
+        ]
+
+
+watcher = DashboardWatcher()
+event_hub = EventHub(watcher.detect, watcher.snapshot, interval=Config.STREAM_POLL_INTERVAL, run=run_blocking)
+
+
+@app.get("/api/stream", dependencies=[Depends(verify_stream_token)])
+async def stream(request: Request):
+    """实时推送（SSE）：余额/价格变化、新状态、新交易；断线重连按Last-Event-ID续传"""
+    return StreamingResponse(
+        event_hub.stream(request.headers.get('last-event-id')),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+"""
+面板实时推送（Server-Sent Events）
+一个后台轮询任务检测数据变化，广播给所有连接；最近的事件保存在环形缓冲里，断线重连时按Last-Event-ID补发
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+Event = Tuple[str, Dict]
+
+
+async def run_inline(func: Callable):
+    """直接在事件循环里调用"""
+    return func()
+
+
+class EventHub:
+    """SSE事件中心
+
+    - detect()：返回自上次调用以来的变化 [(event, data)]，只有有连接时才轮询，没人看面板时零开销
+    - snapshot()：返回完整状态 [(event, data)]，新连接或无法续传时先发一遍
+    - 事件id为"{启动标识}-{序号}"，服务重启后旧id不会被误认为可续传
+    """
+
+    RETRY_MS = 3000     # 浏览器断线后的重连间隔
+
+    def __init__(self, detect: Callable[[], List[Event]], snapshot: Callable[[], List[Event]],
+                 interval: float = 0.5, buffer_size: int = 256, keepalive: float = 15,
+                 run: Callable[[Callable], Awaitable] = run_inline):
+        """
+        :param detect: 变化检测函数
+        :param snapshot: 完整状态函数
+        :param interval: 轮询间隔（秒）
+        :param buffer_size: 环形缓冲保存的事件数（也是单个连接允许积压的上限）
+        :param keepalive: 无事件时发送注释行的间隔（秒），防止代理断开空闲连接
+        :param run: 执行detect/snapshot的方式（默认直接在事件循环里调用；传入线程池执行器避免阻塞）
+        """
+        self.detect = detect
+        self.snapshot = snapshot
+        self.interval = interval
+        self.keepalive = keepalive
+        self.run = run
+        self.boot = format(int(time.time()), 'x')
+        self.seq = 0
+        self._buffer = deque(maxlen=buffer_size)
+        self._subscribers = set()
+        self._poller: Optional[asyncio.Task] = None
+
+    @property
+    def last_event_id(self) -> str:
+        return f"{self.boot}-{self.seq}"
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    @staticmethod
+    def format(event_id: Optional[str], event: str, data: Dict) -> str:
+        """序列化为SSE消息"""
+        lines = [f"id: {event_id}"] if event_id else []
+        lines.append(f"event: {event}")
+        lines.append(f"data: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}")
+        return '\n'.join(lines) + '\n\n'
+
+    def publish(self, event: str, data: Dict):
+        """编号、写入环形缓冲并广播"""
+        self.seq += 1
+        message = self.format(self.last_event_id, event, data)
+        self._buffer.append((self.seq, message))
+        for queue in list(self._subscribers):
+            if queue.qsize() >= self._buffer.maxlen:
+                # 积压过多的慢连接直接断开，浏览器重连后按Last-Event-ID续传
+                self._subscribers.discard(queue)
+                queue.put_nowait(None)
+            else:
+                queue.put_nowait(message)
+
+    def replay(self, last_event_id: Optional[str]) -> Optional[List[str]]:
+        """
+        续传last_event_id之后的事件
+        :return: 待补发的消息；id无效、来自上次启动或已滚出缓冲时返回None（需要发完整状态）
+        """
+        if not last_event_id:
+            return None
+        boot, _, seq = last_event_id.partition('-')
+        if boot != self.boot or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if seq > self.seq:
+            return None
+        if seq == self.seq:
+            return []
+        if not self._buffer or self._buffer[0][0] > seq + 1:
+            return None
+        return [message for event_seq, message in self._buffer if event_seq > seq]
+
+    async def stream(self, last_event_id: Optional[str] = None):
+        """单个连接的SSE消息流（供StreamingResponse使用）"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.add(queue)
+        self._ensure_poller()
+        try:
+            yield f"retry: {self.RETRY_MS}\n\n"
+            # 先订阅再取完整状态：取状态期间广播的事件已进队列，稍后重复发送一次也无妨（面板按整块替换/按id去重）
+            backlog = self.replay(last_event_id)
+            if backlog is None:
+                event_id = self.last_event_id
+                backlog = [self.format(event_id, event, data) for event, data in await self.run(self.snapshot)]
+            for message in backlog:
+                yield message
+
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=self.keepalive)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if message is None:
+                    break
+                yield message
+        finally:
+            self._subscribers.discard(queue)
+
+    def _ensure_poller(self):
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.get_running_loop().create_task(self._poll())
+
+    async def _poll(self):
+        """轮询变化；最后一个连接断开后退出，下次有连接时重新启动（期间的变化在第一次检测时补上）"""
+        while self._subscribers:
+            try:
+                for event, data in await self.run(self.detect):
+                    self.publish(event, data)
+            except Exception as e:
+                print(f"⚠️ 面板推送检测失败: {e}")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,77 @@
+"""面板并发延迟：阻塞调用在事件循环里直接执行（改动前） vs 有界线程池执行
+
+运行: python benchmarks/bench_api_latency.py [并发数] [每项秒数]
+并发客户端里1/10请求/api/trades（服务端给这个查询固定加200ms，模拟磁盘/锁等待这类慢I/O），
+其余客户端每隔THINK_TIME秒请求/api/dashboard或/api/status（模拟打开的面板），统计这些轻请求的p50/p95/p99延迟。
+"""
+import asyncio
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+from panel_server import TOKEN, prepare_data, start_server
+
+HEAVY_PATH = '/api/trades?limit=10'
+SLOW_IO = 0.2
+LIGHT_PATHS = ('/api/dashboard', '/api/status')
+THINK_TIME = 0.5
+
+
+async def load_test(base_url: str, concurrency: int, heavy_clients: int, duration: float):
+    """返回(轻请求延迟列表秒, 轻请求数, 慢请求数)"""
+    latencies = []
+    heavy_done = 0
+    deadline = time.perf_counter() + duration
+
+    async def light_worker(client, index):
+        path = LIGHT_PATHS[index % len(LIGHT_PATHS)]
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200
+            await asyncio.sleep(THINK_TIME)
+
+    async def heavy_worker(client):
+        nonlocal heavy_done
+        while time.perf_counter() < deadline:
+            await client.get(HEAVY_PATH)
+            heavy_done += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, headers={'X-Panel-Token': TOKEN},
+                                 limits=limits, timeout=30) as client:
+        await asyncio.gather(
+            *(heavy_worker(client) for _ in range(heavy_clients)),
+            *(light_worker(client, i) for i in range(concurrency - heavy_clients))
+        )
+    return latencies, len(latencies), heavy_done
+
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    heavy_clients = max(1, concurrency // 10)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare_data(tmp)
+        print(f"并发 {concurrency}（其中 {heavy_clients} 个请求 {HEAVY_PATH}，每次慢 {SLOW_IO * 1000:.0f}ms），"
+              f"每项 {duration:.0f}s")
+        print(f"  {'':<22} {'p50':>9} {'p95':>9} {'p99':>9} {'轻请求/秒':>10} {'慢请求/秒':>10}")
+        for label, inline in (('事件循环内执行（改动前）', True), ('有界线程池', False)):
+            server, base_url = start_server(tmp, inline=inline, slow_trades=SLOW_IO)
+            try:
+                latencies, light, heavy = asyncio.run(load_test(base_url, concurrency, heavy_clients, duration))
+            finally:
+                server.terminate()
+                server.wait()
+            p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+            print(f"  {label:<22} {p50:>7.1f}ms {p95:>7.1f}ms {p99:>7.1f}ms "
+                  f"{light / duration:>10.0f} {heavy / duration:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
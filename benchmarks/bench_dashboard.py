@@ -0,0 +1,77 @@
+"""面板接口压测：旧版每次刷新5个接口 vs 聚合接口/api/dashboard（200和304）
+
+运行: python benchmarks/bench_dashboard.py [并发数] [每项秒数]
+在临时目录生成数据库和快照，子进程启动面板，用httpx并发请求。
+"""
+import asyncio
+import sys
+import tempfile
+import time
+
+import httpx
+
+from panel_server import TOKEN, prepare_data, start_server
+
+OLD_ENDPOINTS = ('/api/balance', '/api/statistics', '/api/config', '/api/status', '/api/trades?limit=10')
+
+
+async def load_test(base_url: str, refresh, concurrency: int, duration: float):
+    """concurrency个客户端循环执行refresh(client)，返回(刷新次数/秒, 请求数/秒, 平均传输字节（压缩后）)"""
+    refreshes = requests = received = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(client):
+        nonlocal refreshes, requests, received
+        while time.perf_counter() < deadline:
+            responses = await refresh(client)
+            refreshes += 1
+            requests += len(responses)
+            received += sum(r.num_bytes_downloaded for r in responses)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, headers={'X-Panel-Token': TOKEN}, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return refreshes / elapsed, requests / elapsed, received / max(requests, 1)
+
+
+async def old_refresh(client):
+    return await asyncio.gather(*(client.get(path) for path in OLD_ENDPOINTS))
+
+
+async def dashboard_refresh(client):
+    return [await client.get('/api/dashboard')]
+
+
+def conditional_refresh(etag: str):
+    async def refresh(client):
+        response = await client.get('/api/dashboard', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        return [response]
+    return refresh
+
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare_data(tmp)
+        server, base_url = start_server(tmp)
+        etag = httpx.get(f'{base_url}/api/dashboard', headers={'X-Panel-Token': TOKEN}).headers['ETag']
+
+        print(f"并发 {concurrency}，每项 {duration:.0f}s")
+        print(f"  {'':<26} {'刷新/秒':>10} {'请求/秒':>10} {'平均响应':>10}")
+        for label, refresh in (('旧版 5个接口', old_refresh),
+                               ('/api/dashboard 200', dashboard_refresh),
+                               ('/api/dashboard 304', conditional_refresh(etag))):
+            refreshes, requests, size = asyncio.run(load_test(base_url, refresh, concurrency, duration))
+            print(f"  {label:<26} {refreshes:>10.0f} {requests:>10.0f} {size:>9.0f}B")
+
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""K线解析微基准：旧版 pandas+iterrows 与 KlineSeries 对比
+
+运行: python benchmarks/bench_kline_parse.py
+旧版实现需要pandas（已不在requirements中），未安装时只测新版。
+"""
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.kline_series import KlineSeries
+
+
+def make_rows(n: int):
+    """构造OKX格式K线（从新到旧）"""
+    start = 1_700_000_000_000
+    return [
+        [str(start - i * 900_000), '37000.1', '37100.5', '36900.2', '37050.3', '12.345', '456789.1', '456789.1', '1']
+        for i in range(n)
+    ]
+
+
+def parse_pandas_iterrows(rows):
+    """旧版get_kline_data的解析逻辑"""
+    import pandas as pd
+    df = pd.DataFrame(rows)
+    df = df.iloc[:, :8]
+    df.columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume', 'volCcy', 'volCcyQuote']
+    for col in ['open', 'high', 'low', 'close', 'volume']:
+        df[col] = df[col].astype(float)
+    df = df.sort_values('timestamp')
+    return [
+        {
+            'timestamp': int(row['timestamp']),
+            'open': float(row['open']),
+            'high': float(row['high']),
+            'low': float(row['low']),
+            'close': float(row['close']),
+            'volume': float(row['volume'])
+        }
+        for _, row in df.iterrows()
+    ]
+
+
+def format_dicts(klines):
+    """旧版_build_prompt的K线格式化"""
+    return ''.join(
+        f"\n{i:2d}. [{k['open']:.0f},{k['high']:.0f},{k['low']:.0f},{k['close']:.0f},{k['volume']:.2f}]"
+        for i, k in enumerate(klines[-30:], 1)
+    )
+
+
+def format_series(series):
+    """新版_build_prompt的K线格式化"""
+    s = series.tail(30)
+    rows = zip(s.open.tolist(), s.high.tolist(), s.low.tolist(), s.close.tolist(), s.volume.tolist())
+    return ''.join(
+        f"\n{i:2d}. [{o:.0f},{h:.0f},{l:.0f},{c:.0f},{v:.2f}]"
+        for i, (o, h, l, c, v) in enumerate(rows, 1)
+    )
+
+
+def bench(label, func, number):
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"  {label:<32} {seconds * 1e6:>10.1f} µs")
+
+
+def main():
+    try:
+        import pandas  # noqa: F401
+        has_pandas = True
+    except ImportError:
+        has_pandas = False
+        print("未安装pandas，跳过旧版实现\n")
+
+    for n in (30, 100, 300):
+        rows = make_rows(n)
+        print(f"{n}根K线:")
+        if has_pandas:
+            bench('pandas+iterrows 解析', lambda: parse_pandas_iterrows(rows), 50)
+            dicts = parse_pandas_iterrows(rows)
+            bench('dict列表 格式化提示词', lambda: format_dicts(dicts), 2000)
+        bench('KlineSeries.from_okx 解析', lambda: KlineSeries.from_okx(rows), 2000)
+        series = KlineSeries.from_okx(rows)
+        bench('KlineSeries 格式化提示词', lambda: format_series(series), 2000)
+        bench('KlineSeries.tail(30) 视图', lambda: series.tail(30), 20000)
+        print()
+
+
+if __name__ == '__main__':
+    main()
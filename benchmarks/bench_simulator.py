@@ -0,0 +1,86 @@
+"""OKXTrader对本地模拟服务器的端到端压测：正常 / 注入延迟 / 注入错误、限流和丢失下单响应
+
+运行: python benchmarks/bench_simulator.py [每个场景的轮数]
+每轮按run_once的调用顺序：余额 → 价格 → 多周期K线 → 持仓成本 → 市价买入 → 市价卖出，统计各调用的p50/p95、
+失败次数，并核对服务器上的订单数和机器人认为成功的交易数一致（丢失响应后按clOrdId核对，不重复下单）。
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from bot.trader import OKXTrader, RateLimiter
+from simulator import FaultInjector, MatchingEngine, ReplayMarket, SimulatorServer, synthetic_candles
+
+SYMBOL = 'BTC-USDT'
+SCENARIOS = (
+    ('正常', {}),
+    ('延迟50±25ms', {'latency_ms': 25, 'jitter_ms': 50}),
+    ('错误5%+限流5%+丢响应20%', {'error_rate': 0.05, 'throttle_rate': 0.05, 'lost_reply_rate': 0.2}),
+)
+STEPS = ('余额', '价格', '多周期K线', '持仓成本', '买入', '卖出')
+
+
+def run_scenario(rounds: int, fault_options: dict):
+    """返回(各步骤耗时, 各步骤失败数, 服务器订单数, 成功交易数, 故障计数)"""
+    market = ReplayMarket(synthetic_candles(3000))
+    engine = MatchingEngine(market, SYMBOL, usdt=100000)
+    faults = FaultInjector(seed=1, **fault_options)
+    timings = {step: [] for step in STEPS}
+    failures = dict.fromkeys(STEPS, 0)
+    trades = 0
+
+    with SimulatorServer(engine, faults) as server:
+        trader = OKXTrader('', '', '', base_url=server.base_url, rate_limiter=RateLimiter())
+        trader.ORDER_RETRY_BASE_DELAY = 0.01
+        devnull = open(os.devnull, 'w')
+        stdout, sys.stdout = sys.stdout, devnull    # 交易日志太多，只看统计
+        try:
+            for _ in range(rounds):
+                calls = (
+                    ('余额', lambda: trader.get_balance()),
+                    ('价格', lambda: trader.get_ticker(SYMBOL)),
+                    ('多周期K线', lambda: trader.get_multi_timeframe_data(SYMBOL)),
+                    ('持仓成本', lambda: trader.get_spot_avg_cost(SYMBOL, engine.available['BTC'])),
+                    ('买入', lambda: trader.buy_market(SYMBOL, 200, 'bench')),
+                    ('卖出', lambda: trader.sell_market(SYMBOL, 0.001, 'bench')),
+                )
+                for step, call in calls:
+                    started = time.perf_counter()
+                    try:
+                        result = call()
+                    except Exception:
+                        result = None
+                    timings[step].append(time.perf_counter() - started)
+                    ok = result is not None and (not isinstance(result, dict) or result.get('success', True))
+                    if not ok:
+                        failures[step] += 1
+                    elif step in ('买入', '卖出'):
+                        trades += 1
+        finally:
+            sys.stdout = stdout
+            devnull.close()
+            trader.close()
+    return timings, failures, len(engine.orders), trades, dict(faults.counts)
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    print(f"OKXTrader -> 本地模拟服务器，每个场景{rounds}轮\n")
+    for name, options in SCENARIOS:
+        started = time.perf_counter()
+        timings, failures, orders, trades, counts = run_scenario(rounds, options)
+        elapsed = time.perf_counter() - started
+        print(f"[{name}] {elapsed:.1f}s，服务器订单{orders}笔 / 成功交易{trades}笔，注入 {counts}")
+        for step in STEPS:
+            ms = np.array(timings[step]) * 1000
+            print(f"  {step:<8} p50 {np.percentile(ms, 50):7.1f}ms  p95 {np.percentile(ms, 95):7.1f}ms  "
+                  f"失败 {failures[step]}")
+        print()
+
+
+if __name__ == '__main__':
+    main()
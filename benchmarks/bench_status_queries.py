@@ -0,0 +1,97 @@
+"""状态/交易查询基准：100万条status记录下，迁移（索引 + format列）前后对比
+
+运行: python benchmarks/bench_status_queries.py [行数]
+在临时目录生成数据库，不影响data/下的数据。
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.database import Database
+
+
+# 迁移前（v1）的查询语句
+OLD_QUERIES = {
+    'get_latest_status': '''
+        SELECT * FROM status
+        WHERE ai_suggestion IS NOT NULL AND TRIM(ai_suggestion) LIKE '{%'
+        ORDER BY timestamp DESC LIMIT 1
+    ''',
+    'get_recent_ai_decisions': '''
+        SELECT timestamp, btc_price, ai_suggestion FROM status
+        WHERE ai_suggestion IS NOT NULL AND ai_suggestion != ''
+        ORDER BY timestamp DESC LIMIT 10
+    ''',
+    'get_recent_trades': 'SELECT * FROM trades ORDER BY timestamp DESC LIMIT 10',
+    'get_recent_performance': '''
+        SELECT * FROM trades WHERE action = 'SELL' AND profit IS NOT NULL
+        ORDER BY timestamp DESC LIMIT 20
+    ''',
+}
+
+
+def build_v1_database(path: str, status_rows: int, trade_rows: int):
+    """生成迁移前结构的数据库（每15分钟一条状态，约2%的旧版纯文本建议）"""
+    conn = sqlite3.connect(path)
+    Database._migrate_v1_tables(conn.cursor())
+    conn.execute('PRAGMA user_version = 1')
+
+    suggestion = json.dumps({'action': 'HOLD', 'confidence': 55, 'risk_level': 'medium', 'reason': '震荡整理'},
+                            ensure_ascii=False)
+    start = 1_600_000_000
+    conn.executemany(
+        '''INSERT INTO status (timestamp, btc_price, usdt_balance, btc_balance, total_value, ai_suggestion, ai_reasoning)
+           VALUES (datetime(?, 'unixepoch'), ?, 100, 0.01, 500, ?, ?)''',
+        ((start + i * 900, 40000 + i % 1000, suggestion if i % 50 else 'HOLD', '推理过程' * 20)
+         for i in range(status_rows))
+    )
+    conn.executemany(
+        '''INSERT INTO trades (timestamp, action, price, amount, reason, profit, balance_usdt, balance_btc)
+           VALUES (datetime(?, 'unixepoch'), ?, 40000, 0.001, 'bench', ?, 100, 0.01)''',
+        ((start + i * 3600, 'BUY' if i % 2 else 'SELL', (i % 7) - 3) for i in range(trade_rows))
+    )
+    conn.commit()
+    conn.close()
+
+
+def bench(label: str, func, number: int = 20):
+    seconds = min(timeit.repeat(func, number=number, repeat=3)) / number
+    print(f"  {label:<28} {seconds * 1000:9.3f} ms")
+
+
+def main():
+    status_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    trade_rows = status_rows // 20
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        started = time.perf_counter()
+        build_v1_database(path, status_rows, trade_rows)
+        print(f"生成 {status_rows:,} 条status、{trade_rows:,} 条trades: {time.perf_counter() - started:.1f}s, "
+              f"{os.path.getsize(path) / 1024 / 1024:.0f}MB")
+
+        print("\n迁移前（全表扫描）:")
+        conn = sqlite3.connect(path)
+        for name, sql in OLD_QUERIES.items():
+            bench(name, lambda: conn.execute(sql).fetchall(), number=3)
+        conn.close()
+
+        print("\n执行迁移:")
+        db = Database(path)
+
+        print("\n迁移后（Database方法）:")
+        bench('get_latest_status', db.get_latest_status)
+        bench('get_recent_ai_decisions', lambda: db.get_recent_ai_decisions(10))
+        bench('get_recent_trades', lambda: db.get_recent_trades(10))
+        bench('get_recent_performance', lambda: db.get_recent_performance(20))
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
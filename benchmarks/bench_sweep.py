@@ -0,0 +1,42 @@
+"""参数扫描的多进程扩展性：同一组参数网格分别用1..N个进程跑
+
+运行: python benchmarks/bench_sweep.py [最大进程数] [年数]
+K线为一年15m几何布朗运动数据（与bench_backtest相同）；参数网格为均线长度 × 信心阈值 × 买入资金比例。
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_backtest import synthetic_klines  # noqa: E402
+from bot.sweep import SweepRunner, expand_grid  # noqa: E402
+
+GRID = {
+    'fast': [6, 12, 24],
+    'slow': [48, 96, 192],
+    'min_confidence': [60, 80],
+    'balance_ratio': [0.5, 0.95],
+}
+
+
+def main():
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 1)
+    years = float(sys.argv[2]) if len(sys.argv) > 2 else 1
+    klines = synthetic_klines(int(365 * 96 * years))
+    combos = expand_grid(GRID)
+    print(f"{len(combos)}组参数 × {len(klines):,}根K线，CPU核数 {os.cpu_count()}")
+
+    baseline = None
+    workers = 1
+    while workers <= max_workers:
+        started = time.perf_counter()
+        SweepRunner(klines, workers=workers).run(combos, progress=False)
+        elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        print(f"  {workers:>2}进程  {elapsed:>6.2f}s  {len(combos) / elapsed:>6.1f}组/秒  加速比 {baseline / elapsed:.2f}x")
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""面板压测用的服务端：临时数据库 + 快照，uvicorn在子进程里运行（不和压测客户端抢GIL）
+
+也可以单独运行: python benchmarks/panel_server.py <数据目录> <端口> [--inline] [--slow-trades 秒]
+"""
+import os
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from config import Config
+
+TOKEN = 'bench-token'
+
+
+def use_data_dir(data_dir: str):
+    """把面板指向data_dir里的数据库和快照（必须在导入api.main之前）"""
+    Config.DATABASE_PATH = os.path.join(data_dir, 'bench.db')
+    Config.SNAPSHOT_PATH = os.path.join(data_dir, 'snapshot.json')
+    Config.PANEL_TOKEN = TOKEN
+
+
+def prepare_data(data_dir: str, trades: int = 200, statuses: int = 500):
+    """生成带数据的数据库和快照"""
+    use_data_dir(data_dir)
+    from bot.database import Database
+    from bot.snapshot import SnapshotPublisher
+
+    db = Database(Config.DATABASE_PATH)
+    for i in range(trades):
+        db.add_trade('BUY' if i % 2 == 0 else 'SELL', 60000 + i, 0.001, '压测数据' * 5,
+                     None if i % 2 == 0 else (i % 7) - 3, 100, 0.01)
+    for i in range(statuses):
+        db.add_status(60000 + i, 100, 0.01, 700,
+                      '{"action": "HOLD", "confidence": 55, "risk_level": "medium", "reason": "震荡整理"}',
+                      '推理过程' * 200)
+    db.close()
+    SnapshotPublisher(Config.SNAPSHOT_PATH).publish(
+        price=60000, usdt=100, btc=0.01, total_value=700, avg_cost=59000,
+        unrealized_pnl=10, unrealized_pnl_percent=1.69
+    )
+
+
+async def run_inline(func, *args, timeout: float = None):
+    """改动前的行为：阻塞调用直接在事件循环线程里执行"""
+    return func(*args)
+
+
+def serve(data_dir: str, port: int, inline: bool = False, slow_trades: float = 0):
+    """
+    :param inline: 阻塞调用改回在事件循环里执行（对比改动前）
+    :param slow_trades: 给交易记录查询加上固定耗时，模拟磁盘/锁等待这类慢I/O
+    """
+    import uvicorn
+
+    use_data_dir(data_dir)
+    import api.main
+    if inline:
+        api.main.run_blocking = run_inline
+    if slow_trades:
+        get_recent_trades = api.main.db.get_recent_trades
+
+        def slow_get_recent_trades(limit: int = 10):
+            time.sleep(slow_trades)
+            return get_recent_trades(limit)
+        api.main.db.get_recent_trades = slow_get_recent_trades
+    uvicorn.run(api.main.app, host='127.0.0.1', port=port, log_level='warning')
+
+
+def start_server(data_dir: str, inline: bool = False, slow_trades: float = 0):
+    """
+    子进程启动面板（参数见serve）
+    :return: (进程, base_url)
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    args = [sys.executable, os.path.abspath(__file__), data_dir, str(port)]
+    if inline:
+        args.append('--inline')
+    if slow_trades:
+        args += ['--slow-trades', str(slow_trades)]
+    process = subprocess.Popen(args, stdout=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f'{base_url}/api/config', headers={'X-Panel-Token': TOKEN})
+            return process, base_url
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('面板启动超时')
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('data_dir')
+    parser.add_argument('port', type=int)
+    parser.add_argument('--inline', action='store_true')
+    parser.add_argument('--slow-trades', type=float, default=0)
+    options = parser.parse_args()
+    serve(options.data_dir, options.port, options.inline, options.slow_trades)
@@ -7,9 +7,15 @@ import json
 class AIAnalyzer:
     """DeepSeek AI分析器"""
     
-    def __init__(self, api_key: str, base_url: str = 'https://api.deepseek.com'):
+    def __init__(self, api_key: str, base_url: str = 'https://api.deepseek.com', cache=None):
+        """
+        :param api_key: DeepSeek API Key
+        :param base_url: API地址
+        :param cache: AIResponseCache（可选，相同请求直接返回缓存的响应）
+        """
         self.api_key = api_key
         self.base_url = base_url.rstrip('/')
+        self.cache = cache
         self.headers = {
             'Authorization': f'Bearer {api_key}',
             'Content-Type': 'application/json'
@@ -93,36 +99,51 @@ class AIAnalyzer:
                 print("\n")
             
             # 使用 deepseek-reasoner 模型获取推理过程
-            response = requests.post(
-                f'{self.base_url}/chat/completions',
-                headers=self.headers,
-                json={
-                    'model': 'deepseek-reasoner',  # 使用Reasoner模型
-                    'messages': messages,
-                    'max_tokens': 8000,  # Reasoner需要更多token（默认32K，最大64K）
-                    'response_format': {'type': 'json_object'}  # 强制JSON输出
-                },
-                timeout=90  # Reasoner推理需要更长时间
-            )
-            
-            if response.status_code != 200:
-                error_body = ""
-                try:
-                    error_body = response.text[:300]
-                except Exception:
-                    pass
+            payload = {
+                'model': 'deepseek-reasoner',  # 使用Reasoner模型
+                'messages': messages,
+                'max_tokens': 8000,  # Reasoner需要更多token（默认32K，最大64K）
+                'response_format': {'type': 'json_object'}  # 强制JSON输出
+            }
+            cached = self.cache.get(payload) if self.cache else None
+            if cached:
+                content, reasoning_content = cached
+                print("💾 AI响应缓存命中")
+            elif self.cache and self.cache.offline:
                 return {
                     'success': False,
-                    'error': f'API请求失败: {response.status_code}',
-                    'details': error_body
+                    'error': 'AI缓存未命中（只读模式不请求API）'
                 }
-            
-            result = response.json()
-            message = result['choices'][0]['message']
-            
-            # 提取决策内容和推理过程
-            content = message.get('content', '')
-            reasoning_content = message.get('reasoning_content', '')  # DeepSeek Reasoner的思维链
+            else:
+                response = requests.post(
+                    f'{self.base_url}/chat/completions',
+                    headers=self.headers,
+                    json=payload,
+                    timeout=90  # Reasoner推理需要更长时间
+                )
+                
+                if response.status_code != 200:
+                    error_body = ""
+                    try:
+                        error_body = response.text[:300]
+                    except Exception:
+                        pass
+                    return {
+                        'success': False,
+                        'error': f'API请求失败: {response.status_code}',
+                        'details': error_body
+                    }
+                
+                result = response.json()
+                message = result['choices'][0]['message']
+                
+                # 提取决策内容和推理过程
+                content = message.get('content', '')
+                reasoning_content = message.get('reasoning_content', '')  # DeepSeek Reasoner的思维链
+                
+                # 空响应不缓存（JSON Output已知问题，重试可能成功）
+                if self.cache and content and content.strip():
+                    self.cache.put(payload, content, reasoning_content)
             
             # 调试模式下输出AI响应
             from config import Config
@@ -204,15 +225,19 @@ class AIAnalyzer:
             prompt += "\n\nK线数据（从旧到新排序）:"
             for tf in ['15m', '1H']:
                 if tf in market_data['timeframes']:
-                    klines = market_data['timeframes'][tf].get('recent_klines', [])
-                    if klines:
+                    klines = market_data['timeframes'][tf].get('klines')
+                    if klines is not None and len(klines):
                         # 15分钟发30根（7.5小时），1小时发24根（24小时）
                         num_klines = 30 if tf == '15m' else 24
-                        selected_klines = klines[-num_klines:]
-                        prompt += f"\n\n{tf}周期（共{len(selected_klines)}根，最新在最后）:"
-                        for i, k in enumerate(selected_klines, 1):
-                            # 格式：序号. [开,高,低,收,量]
-                            prompt += f"\n{i:2d}. [{k['open']:.0f},{k['high']:.0f},{k['low']:.0f},{k['close']:.0f},{k['volume']:.2f}]"
+                        selected = klines.tail(num_klines)
+                        prompt += f"\n\n{tf}周期（共{len(selected)}根，最新在最后）:"
+                        # 按列一次性转为Python列表，再逐行格式化：序号. [开,高,低,收,量]
+                        rows = zip(selected.open.tolist(), selected.high.tolist(), selected.low.tolist(),
+                                   selected.close.tolist(), selected.volume.tolist())
+                        prompt += ''.join(
+                            f"\n{i:2d}. [{o:.0f},{h:.0f},{l:.0f},{c:.0f},{v:.2f}]"
+                            for i, (o, h, l, c, v) in enumerate(rows, 1)
+                        )
         
         
         # 最近表现（如果有）
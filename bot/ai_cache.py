@@ -0,0 +1,167 @@
+"""AI响应缓存（按请求内容寻址）
+
+键 = sha256(模型 + messages + 其他请求参数的规范化JSON)，提示词逐字节相同才会命中。
+content和reasoning_content用zlib压缩存进SQLite，按最近使用时间（LRU）和总大小淘汰。
+回测、调试时重放相同的决策不再等待30-90秒的deepseek-reasoner请求，结果也完全一致。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from .database import compress_reasoning, decompress_reasoning
+
+
+class AIResponseCache:
+    """AI响应缓存
+
+    模式:
+    - off：不使用缓存
+    - read_only：只读，命中直接返回；未命中不请求API（离线重放，结果确定）
+    - write_through：先查缓存，未命中请求API并写入
+    - bypass：总是请求API，并用新响应覆盖缓存（刷新）
+    """
+
+    MODES = ('off', 'read_only', 'write_through', 'bypass')
+
+    def __init__(self, path: str, mode: str = 'write_through', max_bytes: int = 200 * 1024 * 1024,
+                 max_entries: int = 0):
+        """
+        :param path: 缓存数据库文件
+        :param mode: 缓存模式（见类说明）
+        :param max_bytes: 压缩后总大小上限，超出时淘汰最久未使用的条目（0=不限）
+        :param max_entries: 条目数上限（0=不限）
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"未知的AI缓存模式: {mode}（可选: {'/'.join(self.MODES)}）")
+        self.path = path
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        if mode != 'off':
+            self._conn = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.mode == 'read_only':
+            if not os.path.exists(self.path):
+                raise FileNotFoundError(f"AI缓存文件不存在: {self.path}")
+            # 只读打开：缓存文件可以放在只读目录或作为回归测试的固定数据
+            conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+            conn.execute('PRAGMA query_only=ON')
+            return conn
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS ai_responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                codec TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                content BLOB NOT NULL,
+                reasoning BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_ai_responses_last_used ON ai_responses(last_used);
+        ''')
+        return conn
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != 'off'
+
+    @property
+    def offline(self) -> bool:
+        """未命中时是否禁止请求API"""
+        return self.mode == 'read_only'
+
+    @staticmethod
+    def make_key(payload: Dict) -> str:
+        """请求体的内容哈希（键排序、紧凑分隔符，保证同一请求得到同一个键）"""
+        canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def get(self, payload: Dict) -> Optional[Tuple[str, str]]:
+        """
+        查询缓存
+        :param payload: 发给chat/completions的请求体
+        :return: (content, reasoning_content)；未命中、bypass或off模式返回None
+        """
+        if self.mode in ('off', 'bypass'):
+            return None
+        key = self.make_key(payload)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT codec, content, reasoning FROM ai_responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if self.mode != 'read_only':
+                with self._conn:
+                    self._conn.execute(
+                        'UPDATE ai_responses SET last_used = ?, hits = hits + 1 WHERE key = ?', (time.time(), key)
+                    )
+        codec, content, reasoning = row
+        return decompress_reasoning(codec, content), decompress_reasoning(codec, reasoning)
+
+    def put(self, payload: Dict, content: str, reasoning: str = ''):
+        """写入一条响应（read_only/off模式忽略），超出上限时按LRU淘汰"""
+        if self.mode in ('off', 'read_only'):
+            return
+        codec, _, content_data = compress_reasoning(content)
+        _, _, reasoning_data = compress_reasoning(reasoning or '')
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO ai_responses '
+                '(key, model, created_at, last_used, hits, codec, size, content, reasoning) '
+                'VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?)',
+                (self.make_key(payload), payload.get('model', ''), now, now, codec,
+                 len(content_data) + len(reasoning_data), content_data, reasoning_data)
+            )
+            self._evict()
+
+    def _evict(self):
+        """从最久未使用的条目开始删除，直到满足条目数和总大小上限"""
+        count, total = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ai_responses').fetchone()
+        excess_count = count - self.max_entries if self.max_entries else 0
+        excess_bytes = total - self.max_bytes if self.max_bytes else 0
+        if excess_count <= 0 and excess_bytes <= 0:
+            return
+        victims = []
+        for key, size in self._conn.execute('SELECT key, size FROM ai_responses ORDER BY last_used'):
+            if excess_count <= 0 and excess_bytes <= 0:
+                break
+            victims.append((key,))
+            excess_count -= 1
+            excess_bytes -= size
+        self._conn.executemany('DELETE FROM ai_responses WHERE key = ?', victims)
+
+    def stats(self) -> Dict:
+        """条目数、压缩后总大小和本进程的命中统计"""
+        if not self.enabled:
+            return {'mode': self.mode, 'entries': 0, 'bytes': 0, 'hits': 0, 'misses': 0}
+        with self._lock:
+            count, total = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ai_responses'
+            ).fetchone()
+        return {'mode': self.mode, 'entries': count, 'bytes': total, 'hits': self.hits, 'misses': self.misses}
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,600 @@
+"""历史K线回测（逐根K线走和run_once相同的决策换算，模拟OKX撮合；资金曲线和指标用NumPy向量化计算）
+
+用法:
+    python -m bot.backtest --candles data/BTC-USDT_15m.csv --provider rule
+    python -m bot.backtest --candles data/BTC-USDT_15m.csv --provider recorded   # 重放数据库里记录的AI决策
+"""
+import argparse
+import math
+from abc import ABC, abstractmethod
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .candle_store import BAR_MILLISECONDS
+from .cost_basis import CostBasisEngine
+from .kline_series import KlineSeries
+from .strategy import BUY_BALANCE_RATIO, MIN_ORDER_BTC, plan_trade
+
+
+# OKX现货Taker手续费（每边）
+DEFAULT_FEE_RATE = 0.0009
+# BTC数量精度
+LOT_SIZE = 0.00000001
+MS_PER_YEAR = 365 * 24 * 60 * 60 * 1000
+
+
+# ---------- K线文件 ----------
+
+def load_candles(path: str) -> KlineSeries:
+    """
+    读取K线文件
+    - .npz：save_candles保存的列（timestamp/open/high/low/close/volume）
+    - .csv：OKX格式 [ts, o, h, l, c, vol, ...]，有无表头均可，顺序不限
+    - .candles：candle_archive的归档文件（文件名为 {交易对}_{周期}.candles，内存映射不复制）
+    """
+    if path.endswith('.candles'):
+        from .candle_archive import CandleArchive
+        symbol, _, bar = os.path.basename(path)[:-len('.candles')].rpartition('_')
+        return CandleArchive(os.path.dirname(path), symbol, bar, readonly=True).range()
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            series = KlineSeries(*(data[name] for name in KlineSeries.__slots__))
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            first = f.readline()
+        skip = 0 if first.split(',')[0].strip().lstrip('-').isdigit() else 1
+        table = np.loadtxt(path, delimiter=',', skiprows=skip, usecols=range(6), dtype=np.float64, ndmin=2)
+        series = KlineSeries(table[:, 0].astype(np.int64), *(np.ascontiguousarray(table[:, i]) for i in range(1, 6)))
+    order = np.argsort(series.timestamp, kind='stable')
+    return KlineSeries(*(getattr(series, name)[order] for name in KlineSeries.__slots__))
+
+
+def save_candles(path: str, klines: KlineSeries):
+    """保存为.npz（列式，读取比CSV快）"""
+    np.savez(path, **{name: getattr(klines, name) for name in KlineSeries.__slots__})
+
+
+# ---------- 模拟交易所 ----------
+
+class SimulatedExchange:
+    """模拟OKX现货市价单撮合
+
+    - 成交价 = 下一根K线开盘价 ± 滑点（固定基点 + 按成交额占该K线成交额比例的冲击），不超出该K线最高/最低价
+    - 买入手续费从得到的BTC里扣，卖出手续费从得到的USDT里扣（与OKX一致）
+    - 数量按8位小数向下取整，低于最小下单量拒单
+    - 成交记录格式与OKX fills一致，可直接交给CostBasisEngine计算FIFO成本
+    """
+
+    def __init__(self, usdt: float, btc: float = 0.0, fee_rate: float = DEFAULT_FEE_RATE,
+                 slippage_bps: float = 2.0, impact: float = 0.1, min_size: float = MIN_ORDER_BTC,
+                 symbol: str = 'BTC-USDT'):
+        """
+        :param usdt/btc: 初始余额
+        :param fee_rate: 手续费率（每边）
+        :param slippage_bps: 固定滑点（基点）
+        :param impact: 冲击系数，滑点额外加上 impact × 成交额/K线成交额
+        :param min_size: 最小下单量（BTC）
+        :param symbol: 交易对（成交记录的手续费币种）
+        """
+        self.base_ccy, _, self.quote_ccy = symbol.partition('-')
+        self.usdt = usdt
+        self.btc = btc
+        self.fee_rate = fee_rate
+        self.slippage_bps = slippage_bps
+        self.impact = impact
+        self.min_size = min_size
+        self.fills: List[Dict] = []
+        self.total_fees = 0.0      # 折算成USDT
+        # 向量化记账用：每笔成交所在K线、USDT/BTC变化
+        self.fill_bars: List[int] = []
+        self.usdt_deltas: List[float] = []
+        self.btc_deltas: List[float] = []
+
+    def fill_price(self, side: str, bar_open: float, high: float, low: float, notional: float,
+                   bar_volume: float) -> float:
+        """市价单成交价（含滑点）"""
+        participation = notional / (bar_volume * bar_open) if bar_volume > 0 else 0.0
+        slip = self.slippage_bps / 10000 + self.impact * participation
+        if side == 'buy':
+            return min(bar_open * (1 + slip), max(high, bar_open))
+        return max(bar_open * (1 - slip), min(low, bar_open))
+
+    def buy_market(self, usdt_amount: float, bar: int, klines: KlineSeries, reason: str = '') -> Dict:
+        """
+        按USDT金额市价买入（在第bar根K线开盘成交）
+        :return: 与OKXTrader.buy_market相同格式
+        """
+        usdt_amount = min(usdt_amount, self.usdt)
+        price = self.fill_price('buy', klines.open[bar], klines.high[bar], klines.low[bar],
+                                usdt_amount, klines.volume[bar])
+        size = math.floor(usdt_amount / price / LOT_SIZE) * LOT_SIZE
+        if size < self.min_size:
+            return {'success': False, 'error': f'数量{size:.8f}低于最小下单量{self.min_size}'}
+        cost = size * price
+        fee = size * self.fee_rate
+        self.usdt -= cost
+        self.btc += size - fee
+        self.total_fees += fee * price
+        return self._record('buy', bar, klines, size, price, fee, -cost, size - fee, reason)
+
+    def sell_market(self, amount: float, bar: int, klines: KlineSeries, reason: str = '') -> Dict:
+        """
+        按BTC数量市价卖出（在第bar根K线开盘成交）
+        :return: 与OKXTrader.sell_market相同格式
+        """
+        size = math.floor(min(amount, self.btc) / LOT_SIZE) * LOT_SIZE
+        if size < self.min_size:
+            return {'success': False, 'error': f'数量{size:.8f}低于最小下单量{self.min_size}'}
+        price = self.fill_price('sell', klines.open[bar], klines.high[bar], klines.low[bar],
+                                size * klines.open[bar], klines.volume[bar])
+        proceeds = size * price
+        fee = proceeds * self.fee_rate
+        self.btc -= size
+        self.usdt += proceeds - fee
+        self.total_fees += fee
+        return self._record('sell', bar, klines, size, price, fee, proceeds - fee, -size, reason)
+
+    def _record(self, side: str, bar: int, klines: KlineSeries, size: float, price: float, fee: float,
+                usdt_delta: float, btc_delta: float, reason: str) -> Dict:
+        order_id = str(len(self.fills) + 1)
+        self.fills.append({
+            'billId': order_id, 'ordId': order_id, 'side': side,
+            'fillSz': str(size), 'fillPx': str(price), 'fee': str(-fee),
+            'feeCcy': self.base_ccy if side == 'buy' else self.quote_ccy, 'ts': str(int(klines.timestamp[bar])),
+        })
+        self.fill_bars.append(bar)
+        self.usdt_deltas.append(usdt_delta)
+        self.btc_deltas.append(btc_delta)
+        return {'success': True, 'order_id': order_id, 'price': price, 'amount': size, 'fee': fee, 'reason': reason}
+
+    def fetch_fills(self, after: str = '') -> List[Dict]:
+        """一页成交记录（从新到旧，billId小于after；供CostBasisEngine增量同步）"""
+        end = int(after) - 1 if after else len(self.fills)
+        return self.fills[max(end - CostBasisEngine.PAGE_SIZE, 0):end][::-1]
+
+
+# ---------- 决策来源 ----------
+
+@dataclass
+class BarContext:
+    """某根K线收盘后（下一根开盘时）做决策所需的信息，字段与run_once传给AI的一致"""
+    backtest: 'Backtester'
+    index: int          # 已收盘的最后一根K线
+    price: float        # 决策时的价格（下一根K线开盘价）
+    usdt: float
+    btc: float
+
+    def market_data(self) -> Dict:
+        """多时间周期K线（与OKXTrader.combine_timeframes格式一致，只含决策时已知的数据）"""
+        timeframes = {}
+        for bar, limit in self.backtest.timeframes:
+            klines = self.backtest.klines_until(bar, self.index, limit)
+            if len(klines):
+                timeframes[bar] = {
+                    'current_price': self.price,
+                    'bar_period': bar,
+                    'data_count': len(klines),
+                    'klines': klines,
+                }
+        return {'symbol': self.backtest.symbol, 'timeframes': timeframes, 'current_price': self.price}
+
+    def position(self) -> Dict:
+        """当前持仓（与run_once的current_position格式一致，成本来自FIFO引擎）"""
+        avg_price = self.backtest.cost_basis.position(self.btc).get('avg_price') or self.price
+        return {'has_position': self.btc >= MIN_ORDER_BTC, 'amount': self.btc, 'avg_price': avg_price}
+
+    def recent_trades(self, limit: int = 5) -> List[Dict]:
+        """最近的模拟成交（从新到旧）"""
+        return self.backtest.trades[-limit:][::-1]
+
+    def performance_stats(self, limit: int = 20) -> Dict:
+        """最近limit笔卖出的表现（与Database.get_recent_performance主要字段一致）"""
+        profits = [trade['profit'] for trade in self.backtest.trades if trade['action'] == 'SELL'][-limit:]
+        if not profits:
+            return {'total_trades': 0, 'win_rate': 0, 'total_profit': 0}
+        profits = np.array(profits)
+        return {
+            'total_trades': len(profits),
+            'win_rate': round(float(np.mean(profits > 0)) * 100, 1),
+            'total_profit': round(float(profits.sum()), 2),
+        }
+
+    def recent_decisions(self, limit: int = 10) -> List[Dict]:
+        """最近的决策（从旧到新，与Database.get_recent_ai_decisions一致）"""
+        return self.backtest.decisions[-limit:]
+
+
+class DecisionProvider(ABC):
+    """决策来源接口
+
+    prepare()在回测开始时调用一次，可以返回需要决策的K线下标（其余K线视为HOLD，直接跳过）；
+    decide()返回与AIAnalyzer.analyze_market相同格式的结果。
+    """
+
+    name = 'base'
+
+    def prepare(self, backtest: 'Backtester') -> Optional[np.ndarray]:
+        return None
+
+    @abstractmethod
+    def decide(self, context: BarContext) -> Dict:
+        """在context对应的K线收盘后做决策"""
+
+
+class RuleBasedProvider(DecisionProvider):
+    """均线交叉（AI的规则替身，做基线对比）：快线上穿慢线全仓BUY，下穿全部SELL
+
+    均线一次性向量化算好，只在交叉的K线上决策，其余K线直接跳过。
+    """
+
+    name = 'rule'
+
+    def __init__(self, fast: int = 12, slow: int = 48, confidence: int = 70):
+        """
+        :param fast/slow: 快/慢均线长度（K线根数）
+        :param confidence: 给出的信心度
+        """
+        if fast >= slow:
+            raise ValueError('快线周期必须小于慢线周期')
+        self.fast = fast
+        self.slow = slow
+        self.confidence = confidence
+        self._above = None
+
+    @staticmethod
+    def moving_average(values: np.ndarray, window: int) -> np.ndarray:
+        """简单移动平均（前window-1根为NaN）"""
+        result = np.full(len(values), np.nan)
+        if len(values) >= window:
+            cumsum = np.cumsum(np.r_[0.0, values])
+            result[window - 1:] = (cumsum[window:] - cumsum[:-window]) / window
+        return result
+
+    def prepare(self, backtest: 'Backtester') -> np.ndarray:
+        close = backtest.klines.close
+        fast = self.moving_average(close, self.fast)
+        slow = self.moving_average(close, self.slow)
+        self._above = fast > slow
+        valid = np.flatnonzero(~np.isnan(slow))
+        if len(valid) < 2:
+            return np.empty(0, dtype=np.int64)
+        above = self._above[valid]
+        # 第一根有效K线也算一次信号，之后只看状态翻转
+        changes = np.flatnonzero(np.diff(above.astype(np.int8))) + 1
+        return valid[np.r_[0, changes]]
+
+    def decide(self, context: BarContext) -> Dict:
+        if self._above[context.index]:
+            return {'success': True, 'action': 'BUY', 'confidence': self.confidence, 'risk_level': 'MEDIUM',
+                    'reason': f'MA{self.fast}上穿MA{self.slow}', 'suggested_usdt': context.usdt}
+        return {'success': True, 'action': 'SELL', 'confidence': self.confidence, 'risk_level': 'MEDIUM',
+                'reason': f'MA{self.fast}下穿MA{self.slow}', 'suggested_amount': max(context.btc, MIN_ORDER_BTC)}
+
+
+class RecordedDecisionProvider(DecisionProvider):
+    """重放已记录的AI决策（status表里的ai_suggestion），评估同样的决策在不同成交假设下的表现
+
+    决策按记录时间落到对应K线：记录时间在第i+1根K线内，就视为第i根收盘后做出的决策。
+    """
+
+    name = 'recorded'
+
+    def __init__(self, decisions: List[Tuple[int, Dict]]):
+        """
+        :param decisions: [(毫秒时间戳, AI决策字典), ...]
+        """
+        self.decisions = sorted(decisions, key=lambda item: item[0])
+        self._by_bar: Dict[int, Dict] = {}
+
+    @classmethod
+    def from_database(cls, db) -> 'RecordedDecisionProvider':
+        """从数据库读取（SQLite时间为UTC）"""
+        decisions = []
+        for row in db.get_ai_decision_history():
+            ts = datetime.strptime(row['timestamp'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+            decisions.append((int(ts.timestamp() * 1000), row['suggestion']))
+        return cls(decisions)
+
+    def prepare(self, backtest: 'Backtester') -> np.ndarray:
+        if not self.decisions:
+            return np.empty(0, dtype=np.int64)
+        times = np.array([ts for ts, _ in self.decisions], dtype=np.int64)
+        decision_times = backtest.klines.timestamp + backtest.step
+        bars = np.searchsorted(decision_times, times, side='right') - 1
+        # 落在K线范围外（或中间缺数据）的决策丢弃；同一根K线有多条时以最后一条为准
+        valid = (bars >= 0) & (times - decision_times[np.clip(bars, 0, None)] < backtest.step)
+        self._by_bar = {int(bar): self.decisions[i][1] for i, bar in zip(np.flatnonzero(valid), bars[valid])}
+        return np.array(sorted(self._by_bar), dtype=np.int64)
+
+    def decide(self, context: BarContext) -> Dict:
+        return dict(self._by_bar[context.index], success=True)
+
+
+class AIDecisionProvider(DecisionProvider):
+    """调用AIAnalyzer（与run_once相同的输入；未缓存的请求每次都要等API，配合AIResponseCache可离线重放）"""
+
+    name = 'ai'
+
+    def __init__(self, analyzer, every: int = 1):
+        """
+        :param analyzer: AIAnalyzer
+        :param every: 每隔几根K线决策一次
+        """
+        self.analyzer = analyzer
+        self.every = max(every, 1)
+
+    def prepare(self, backtest: 'Backtester') -> np.ndarray:
+        return np.arange(0, len(backtest.klines), self.every)
+
+    def decide(self, context: BarContext) -> Dict:
+        return self.analyzer.analyze_market(
+            context.price, context.btc, context.usdt,
+            market_data=context.market_data(),
+            current_position=context.position(),
+            recent_trades=context.recent_trades(),
+            performance_stats=context.performance_stats(),
+            recent_decisions=context.recent_decisions()
+        )
+
+
+# ---------- 回测 ----------
+
+@dataclass
+class BacktestResult:
+    """回测结果"""
+    timestamp: np.ndarray
+    equity: np.ndarray          # 每根K线收盘时的总资产（USDT）
+    usdt: np.ndarray
+    btc: np.ndarray
+    trades: List[Dict]
+    metrics: Dict
+    skipped: Dict[str, int] = field(default_factory=dict)   # 没有下单的原因计数
+    elapsed: float = 0.0
+
+    def report(self) -> str:
+        m = self.metrics
+        start = datetime.fromtimestamp(self.timestamp[0] / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
+        end = datetime.fromtimestamp(self.timestamp[-1] / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
+        lines = [
+            f"📈 回测 {start} ~ {end}（{len(self.timestamp):,}根K线，耗时{self.elapsed:.2f}s）",
+            f"  资产: ${m['start_equity']:,.2f} → ${m['end_equity']:,.2f}"
+            f"  收益 {m['total_return_pct']:+.2f}%（持有不动 {m['buy_hold_return_pct']:+.2f}%）",
+            f"  年化 {m['annual_return_pct']:+.2f}%  波动 {m['volatility_pct']:.2f}%"
+            f"  夏普 {m['sharpe']:.2f}  索提诺 {m['sortino']:.2f}",
+            f"  最大回撤 {m['max_drawdown_pct']:.2f}%（最长 {m['max_drawdown_bars']} 根K线）  持仓时间占比 {m['exposure_pct']:.1f}%",
+            f"  交易 买{m['buy_count']}/卖{m['sell_count']}  胜率 {m['win_rate']:.1f}%"
+            f"  盈亏比 {m['profit_factor']:.2f}  已实现 ${m['realized_pnl']:+,.2f}  手续费 ${m['total_fees']:,.2f}",
+        ]
+        if self.skipped:
+            lines.append('  未下单: ' + ', '.join(f"{reason} {count}" for reason, count in self.skipped.items()))
+        return '\n'.join(lines)
+
+
+def compute_metrics(equity: np.ndarray, close: np.ndarray, exposure: np.ndarray, step_ms: int,
+                    sell_profits: np.ndarray, buy_count: int, total_fees: float) -> Dict:
+    """
+    资金曲线指标（全部向量化）
+    :param equity: 每根K线收盘总资产
+    :param close: 收盘价（计算持有不动的收益）
+    :param exposure: 每根K线BTC市值占总资产的比例
+    :param step_ms: K线周期毫秒数（年化用）
+    :param sell_profits: 每笔卖出扣除手续费后的已实现盈亏（胜率、盈亏比据此计算）
+    """
+    bars_per_year = MS_PER_YEAR / step_ms
+    returns = np.diff(equity) / equity[:-1]
+    mean, std = returns.mean(), returns.std()
+    downside = np.sqrt(np.mean(np.minimum(returns, 0) ** 2))
+
+    running_max = np.maximum.accumulate(equity)
+    drawdown = equity / running_max - 1
+    # 每根K线距离最近一次创新高过了多少根
+    index = np.arange(len(equity))
+    last_peak = np.maximum.accumulate(np.where(equity >= running_max, index, 0))
+
+    wins = sell_profits[sell_profits > 0].sum()
+    losses = -sell_profits[sell_profits < 0].sum()
+    years = len(equity) / bars_per_year
+    return {
+        'start_equity': float(equity[0]),
+        'end_equity': float(equity[-1]),
+        'total_return_pct': float(equity[-1] / equity[0] - 1) * 100,
+        'buy_hold_return_pct': float(close[-1] / close[0] - 1) * 100,
+        'annual_return_pct': float((equity[-1] / equity[0]) ** (1 / years) - 1) * 100 if years > 0 else 0.0,
+        'volatility_pct': float(std * math.sqrt(bars_per_year)) * 100,
+        'sharpe': float(mean / std * math.sqrt(bars_per_year)) if std > 0 else 0.0,
+        'sortino': float(mean / downside * math.sqrt(bars_per_year)) if downside > 0 else 0.0,
+        'max_drawdown_pct': float(drawdown.min()) * 100,
+        'max_drawdown_bars': int((index - last_peak).max()),
+        'exposure_pct': float(exposure.mean()) * 100,
+        'buy_count': buy_count,
+        'sell_count': len(sell_profits),
+        'win_rate': float(np.mean(sell_profits > 0)) * 100 if len(sell_profits) else 0.0,
+        'profit_factor': float(wins / losses) if losses > 0 else (float('inf') if wins > 0 else 0.0),
+        'realized_pnl': float(sell_profits.sum()),
+        'total_fees': total_fees,
+    }
+
+
+class Backtester:
+    """逐根K线回测
+
+    第i根K线收盘后决策（只用到第i根及之前的数据），在第i+1根开盘成交，决策换算与实盘共用plan_trade。
+    决策来源只在prepare()给出的K线上调用，没有信号的K线不进Python循环；
+    资金曲线最后按成交记录用cumsum一次算出。
+    """
+
+    def __init__(self, klines: KlineSeries, provider: DecisionProvider, usdt: float = 1000.0, btc: float = 0.0,
+                 bar: str = '15m', symbol: str = 'BTC-USDT', min_confidence: float = 60,
+                 balance_ratio: float = BUY_BALANCE_RATIO, min_trade_btc: float = MIN_ORDER_BTC,
+                 timeframes=(('15m', 30), ('1H', 24)), **exchange_options):
+        """
+        :param klines: 回测K线（从旧到新，周期为bar）
+        :param provider: 决策来源
+        :param usdt/btc: 初始余额
+        :param bar: K线周期
+        :param min_confidence: 最低信心阈值（同Config.AI_MIN_CONFIDENCE）
+        :param balance_ratio: 买入最多使用的USDT比例（实盘95%）
+        :param min_trade_btc: 策略最小交易量（BTC，低于此值不下单）
+        :param timeframes: 提供给AI的多周期K线 [(周期, 根数)]，与OKXTrader.MULTI_TIMEFRAMES一致
+        :param exchange_options: SimulatedExchange参数（fee_rate/slippage_bps/impact/min_size）
+        """
+        if len(klines) < 2:
+            raise ValueError('K线数量不足')
+        self.klines = klines
+        self.provider = provider
+        self.bar = bar
+        self.step = BAR_MILLISECONDS[bar]
+        self.symbol = symbol
+        self.min_confidence = min_confidence
+        self.balance_ratio = balance_ratio
+        self.min_trade_btc = min_trade_btc
+        self.timeframes = list(timeframes)
+        self.exchange = SimulatedExchange(usdt, btc, symbol=symbol, **exchange_options)
+        self.cost_basis = CostBasisEngine(symbol, self.exchange.fetch_fills)
+        self.trades: List[Dict] = []
+        self.decisions: List[Dict] = []
+        self._resampled: Dict[str, KlineSeries] = {}
+
+    def klines_until(self, bar: str, index: int, limit: int) -> KlineSeries:
+        """第index根K线收盘时可见的bar周期K线（大周期的最后一根只合并到index为止）"""
+        if bar == self.bar:
+            return self.klines[max(index + 1 - limit, 0):index + 1]
+        step = BAR_MILLISECONDS[bar]
+        if bar not in self._resampled:
+            self._resampled[bar] = self.klines.resample(step)
+        resampled = self._resampled[bar]
+        bucket = int(self.klines.timestamp[index]) // step * step
+        position = int(np.searchsorted(resampled.timestamp, bucket))
+        first = int(np.searchsorted(self.klines.timestamp, bucket))
+        forming = self.klines[first:index + 1].resample(step)
+        return resampled[max(position - limit + 1, 0):position].merge(forming)
+
+    def run(self) -> BacktestResult:
+        started = time.perf_counter()
+        klines, exchange = self.klines, self.exchange
+        n = len(klines)
+        skipped: Dict[str, int] = {}
+
+        candidates = self.provider.prepare(self)
+        if candidates is None:
+            candidates = np.arange(n)
+        # 最后一根K线之后没有可成交的开盘价
+        for i in candidates[candidates < n - 1].tolist():
+            price = float(klines.open[i + 1])
+            context = BarContext(self, i, price, exchange.usdt, exchange.btc)
+            analysis = self.provider.decide(context)
+            if not analysis or not analysis.get('success'):
+                skipped['决策失败'] = skipped.get('决策失败', 0) + 1
+                continue
+            self.decisions.append({
+                'timestamp': int(klines.timestamp[i]), 'price': price, 'action': analysis.get('action'),
+                'confidence': analysis.get('confidence'), 'reason': analysis.get('reason', ''),
+            })
+
+            plan = plan_trade(analysis, price, exchange.usdt, exchange.btc, self.min_confidence,
+                              min_btc=self.min_trade_btc, balance_ratio=self.balance_ratio)
+            if plan['action'] is None:
+                if analysis.get('action') in ('BUY', 'SELL'):
+                    reason = '信心不足' if analysis.get('confidence', 0) < self.min_confidence else '数量不足'
+                    skipped[reason] = skipped.get(reason, 0) + 1
+                continue
+
+            reason = analysis.get('reason', '')
+            if plan['action'] == 'BUY':
+                result = exchange.buy_market(plan['usdt'], i + 1, klines, reason)
+            else:
+                result = exchange.sell_market(plan['amount'], i + 1, klines, reason)
+            if not result['success']:
+                skipped['拒单'] = skipped.get('拒单', 0) + 1
+                continue
+
+            # 与实盘一样由FIFO成本引擎给出卖出的已实现盈亏（扣除两边手续费）
+            realized_before = self.cost_basis.realized_pnl
+            self.cost_basis.sync()
+            self.trades.append({
+                'timestamp': int(klines.timestamp[i + 1]),
+                'action': plan['action'],
+                'price': result['price'],
+                'amount': result['amount'],
+                'reason': reason,
+                'profit': self.cost_basis.realized_pnl - realized_before if plan['action'] == 'SELL' else 0,
+                'balance_usdt': exchange.usdt,
+                'balance_btc': exchange.btc,
+            })
+
+        return self._result(skipped, time.perf_counter() - started)
+
+    def _result(self, skipped: Dict[str, int], elapsed: float) -> BacktestResult:
+        """按成交记录向量化生成资金曲线和指标"""
+        klines, exchange = self.klines, self.exchange
+        n = len(klines)
+        bars = np.array(exchange.fill_bars, dtype=np.int64)
+        start_usdt = exchange.usdt - sum(exchange.usdt_deltas)
+        start_btc = exchange.btc - sum(exchange.btc_deltas)
+        usdt = start_usdt + np.cumsum(np.bincount(bars, weights=exchange.usdt_deltas, minlength=n))
+        btc = start_btc + np.cumsum(np.bincount(bars, weights=exchange.btc_deltas, minlength=n))
+        position_value = btc * klines.close
+        equity = usdt + position_value
+
+        sell_profits = np.array([t['profit'] for t in self.trades if t['action'] == 'SELL'], dtype=np.float64)
+        buy_count = sum(1 for t in self.trades if t['action'] == 'BUY')
+        metrics = compute_metrics(equity, klines.close, position_value / equity, self.step,
+                                  sell_profits, buy_count, exchange.total_fees)
+        return BacktestResult(klines.timestamp, equity, usdt, btc, self.trades, metrics, skipped, elapsed)
+
+
+def main():
+    """命令行入口: python -m bot.backtest --candles FILE [--provider rule|recorded|ai]"""
+    from config import Config
+
+    parser = argparse.ArgumentParser(description='历史K线回测')
+    parser.add_argument('--candles', required=True, help='K线文件（OKX格式CSV、save_candles保存的.npz或K线归档.candles）')
+    parser.add_argument('--bar', default='15m', help='K线周期（默认15m）')
+    parser.add_argument('--provider', choices=('rule', 'recorded', 'ai'), default='rule',
+                        help='决策来源：rule=均线交叉，recorded=重放数据库里的AI决策，ai=实时调用AI')
+    parser.add_argument('--usdt', type=float, default=1000.0, help='初始USDT')
+    parser.add_argument('--btc', type=float, default=0.0, help='初始BTC')
+    parser.add_argument('--fee', type=float, default=DEFAULT_FEE_RATE, help='手续费率（每边）')
+    parser.add_argument('--slippage-bps', type=float, default=2.0, help='固定滑点（基点）')
+    parser.add_argument('--impact', type=float, default=0.1, help='冲击系数（乘以成交额占K线成交额的比例）')
+    parser.add_argument('--min-confidence', type=float, default=Config.AI_MIN_CONFIDENCE, help='最低信心阈值')
+    parser.add_argument('--fast', type=int, default=12, help='rule: 快均线')
+    parser.add_argument('--slow', type=int, default=48, help='rule: 慢均线')
+    parser.add_argument('--every', type=int, default=1, help='ai: 每隔几根K线决策一次')
+    parser.add_argument('--ai-cache', choices=('off', 'read_only', 'write_through', 'bypass'), default='write_through',
+                        help='ai: 响应缓存模式（read_only=只用缓存离线重放）')
+    args = parser.parse_args()
+
+    klines = load_candles(args.candles)
+    if args.provider == 'rule':
+        provider = RuleBasedProvider(args.fast, args.slow)
+    elif args.provider == 'recorded':
+        from .database import Database
+        provider = RecordedDecisionProvider.from_database(Database(Config.DATABASE_PATH))
+    else:
+        from .ai_analyzer import AIAnalyzer
+        from .ai_cache import AIResponseCache
+        cache = AIResponseCache(Config.AI_CACHE_PATH, mode=args.ai_cache,
+                                max_bytes=int(Config.AI_CACHE_MAX_MB * 1024 * 1024),
+                                max_entries=Config.AI_CACHE_MAX_ENTRIES)
+        provider = AIDecisionProvider(AIAnalyzer(Config.DEEPSEEK_API_KEY, Config.DEEPSEEK_BASE_URL, cache=cache),
+                                      every=args.every)
+
+    backtester = Backtester(
+        klines, provider, usdt=args.usdt, btc=args.btc, bar=args.bar, symbol=Config.TRADING_SYMBOL,
+        min_confidence=args.min_confidence, fee_rate=args.fee, slippage_bps=args.slippage_bps, impact=args.impact
+    )
+    print(backtester.run().report())
+    if args.provider == 'ai':
+        stats = cache.stats()
+        print(f"  AI缓存({stats['mode']}): 命中{stats['hits']} 未命中{stats['misses']} "
+              f"共{stats['entries']}条 {stats['bytes'] / 1024 / 1024:.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
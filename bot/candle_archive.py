@@ -0,0 +1,449 @@
+"""K线磁盘归档（定长记录、只追加、内存映射读取）+ OKX历史K线批量下载
+
+每个(交易对, 周期)两个文件：
+- {交易对}_{周期}.candles：64字节文件头 + 定长记录（CANDLE_DTYPE，每根48字节）
+- {交易对}_{周期}.index：开盘时间戳（int64，与记录一一对应），连续存放，searchsorted只访问O(log n)个页面
+
+区间查询返回内存映射上的切片（不复制），一年15m K线约1.7MB。
+
+用法:
+    python -m bot.candle_archive download --symbol BTC-USDT --bar 15m --start 2024-01-01
+    python -m bot.candle_archive info --symbol BTC-USDT --bar 15m
+"""
+import argparse
+import asyncio
+import os
+import struct
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .candle_store import BAR_MILLISECONDS, CandleStore
+from .kline_series import KlineSeries
+
+
+CANDLE_DTYPE = np.dtype([
+    ('timestamp', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+
+# 文件头：魔数、格式版本、记录长度、周期毫秒数，补齐到64字节
+MAGIC = b'OKXCNDL\0'
+VERSION = 1
+HEADER = struct.Struct('<8sIIq')
+HEADER_SIZE = 64
+
+if sys.platform == 'win32':
+    import msvcrt
+else:
+    import fcntl
+
+
+class CandleArchive:
+    """单个交易对+周期的K线归档
+
+    只追加：新K线的时间戳必须大于归档最后一根（归档只存已收盘K线）。
+    先写记录再写索引：只读打开时只映射两者较短的长度，不改动文件（下载进程可能正写到一半）；
+    写入方打开时持有锁文件，只有它会截断异常中断留下的不完整尾部。
+    """
+
+    def __init__(self, directory: str, symbol: str, bar: str, readonly: bool = False):
+        """
+        :param directory: 归档目录
+        :param symbol: 交易对
+        :param bar: K线周期（见BAR_MILLISECONDS）
+        :param readonly: 只读打开（文件不存在时抛FileNotFoundError，不创建、不修复）
+        """
+        if bar not in BAR_MILLISECONDS:
+            raise ValueError(f"不支持的K线周期: {bar}")
+        self.directory = directory
+        self.symbol = symbol
+        self.bar = bar
+        self.step = BAR_MILLISECONDS[bar]
+        name = f"{symbol}_{bar}"
+        self.data_path = os.path.join(directory, f"{name}.candles")
+        self.index_path = os.path.join(directory, f"{name}.index")
+        self.lock_path = os.path.join(directory, f"{name}.lock")
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._data = None
+        self._index = None
+        self._count = 0
+        self._open()
+
+    @classmethod
+    def exists(cls, directory: str, symbol: str, bar: str) -> bool:
+        return os.path.exists(os.path.join(directory, f"{symbol}_{bar}.candles"))
+
+    # ---------- 文件 ----------
+
+    def _open(self):
+        """校验文件头；写入方还会创建文件、修复中断写入留下的不一致"""
+        if self.readonly:
+            if not os.path.exists(self.data_path):
+                raise FileNotFoundError(f"K线归档不存在: {self.data_path}")
+            self._check_header()
+            records = (os.path.getsize(self.data_path) - HEADER_SIZE) // CANDLE_DTYPE.itemsize
+            indexed = os.path.getsize(self.index_path) // 8 if os.path.exists(self.index_path) else 0
+            self._remap(min(records, indexed))
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._acquire_writer_lock()
+        if not os.path.exists(self.data_path):
+            with open(self.data_path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION, CANDLE_DTYPE.itemsize, self.step).ljust(HEADER_SIZE, b'\0'))
+            open(self.index_path, 'wb').close()
+
+        self._check_header()
+        if not os.path.exists(self.index_path):
+            open(self.index_path, 'wb').close()
+
+        records = (os.path.getsize(self.data_path) - HEADER_SIZE) // CANDLE_DTYPE.itemsize
+        indexed = os.path.getsize(self.index_path) // 8
+        count = min(records, indexed)
+        if (os.path.getsize(self.data_path) != HEADER_SIZE + count * CANDLE_DTYPE.itemsize
+                or os.path.getsize(self.index_path) != count * 8):
+            print(f"  ⚠️ K线归档 {self.symbol} {self.bar} 上次写入未完成，截断到{count}根")
+            os.truncate(self.data_path, HEADER_SIZE + count * CANDLE_DTYPE.itemsize)
+            os.truncate(self.index_path, count * 8)
+        self._remap(count)
+
+    def _check_header(self):
+        with open(self.data_path, 'rb') as f:
+            magic, version, itemsize, step = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION or itemsize != CANDLE_DTYPE.itemsize:
+            raise ValueError(f"不是有效的K线归档: {self.data_path}")
+        if step != self.step:
+            raise ValueError(f"归档周期不一致: 文件{step}ms，期望{self.step}ms")
+
+    def _acquire_writer_lock(self):
+        """独占锁文件（同一归档同时只能有一个写入方）"""
+        lock_file = open(self.lock_path, 'a+b')
+        try:
+            if sys.platform == 'win32':
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise RuntimeError(f"K线归档正被另一个进程写入: {self.data_path}")
+        self._lock_file = lock_file
+
+    def close(self):
+        """释放写入锁（只读打开时无操作）"""
+        if self._lock_file is not None:
+            self._lock_file.close()     # 关闭文件即释放flock/locking
+            self._lock_file = None
+
+    def __enter__(self) -> 'CandleArchive':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _remap(self, count: int):
+        """按当前长度重新映射（长度为0时不映射）"""
+        self._count = count
+        if count:
+            self._data = np.memmap(self.data_path, dtype=CANDLE_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+            self._index = np.memmap(self.index_path, dtype=np.int64, mode='r', shape=(count,))
+        else:
+            self._data = np.empty(0, dtype=CANDLE_DTYPE)
+            self._index = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def first_timestamp(self) -> Optional[int]:
+        return int(self._index[0]) if self._count else None
+
+    @property
+    def last_timestamp(self) -> Optional[int]:
+        return int(self._index[-1]) if self._count else None
+
+    # ---------- 写入 ----------
+
+    def append(self, klines: KlineSeries) -> int:
+        """
+        追加已收盘K线（只写入时间戳大于归档最后一根的部分）
+        :param klines: 从旧到新、时间戳严格递增的K线
+        :return: 写入数量
+        """
+        if self.readonly:
+            raise PermissionError(f"K线归档以只读方式打开: {self.data_path}")
+        if not len(klines):
+            return 0
+        timestamp = np.asarray(klines.timestamp, dtype=np.int64)
+        if np.any(np.diff(timestamp) <= 0):
+            raise ValueError('K线时间戳必须严格递增')
+        with self._lock:
+            last = self.last_timestamp
+            start = int(np.searchsorted(timestamp, last, side='right')) if last is not None else 0
+            if start == len(timestamp):
+                return 0
+            if np.any((timestamp[start:] - (last if last is not None else timestamp[start])) % self.step):
+                raise ValueError(f'K线时间戳没有按{self.bar}对齐')
+
+            records = np.empty(len(timestamp) - start, dtype=CANDLE_DTYPE)
+            for name in CANDLE_DTYPE.names:
+                records[name] = getattr(klines, name)[start:]
+            # 先记录后索引：中断时索引不会指向不存在的记录
+            for path, payload in ((self.data_path, records), (self.index_path, records['timestamp'])):
+                with open(path, 'ab') as f:
+                    f.write(payload.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._remap(self._count + len(records))
+            return len(records)
+
+    # ---------- 读取 ----------
+
+    def _series(self, lo: int, hi: int) -> KlineSeries:
+        """第lo~hi条记录（内存映射切片，不复制）"""
+        data = self._data[lo:hi]
+        return KlineSeries(self._index[lo:hi], *(data[name] for name in KlineSeries.PRICE_COLUMNS))
+
+    def locate(self, start: int = None, end: int = None) -> Tuple[int, int]:
+        """
+        时间范围对应的记录下标（二分查找）
+        :param start: 起始开盘时间（含），None=从头
+        :param end: 结束开盘时间（不含），None=到尾
+        :return: (lo, hi)
+        """
+        lo = int(np.searchsorted(self._index, start, side='left')) if start is not None else 0
+        hi = int(np.searchsorted(self._index, end, side='left')) if end is not None else self._count
+        return lo, max(lo, hi)
+
+    def range(self, start: int = None, end: int = None) -> KlineSeries:
+        """开盘时间在[start, end)内的K线（从旧到新，不复制）"""
+        with self._lock:
+            return self._series(*self.locate(start, end))
+
+    def tail(self, n: int) -> KlineSeries:
+        """最后n根K线（不复制）"""
+        with self._lock:
+            return self._series(max(self._count - n, 0), self._count)
+
+    def find_gaps(self) -> List[Tuple[int, int]]:
+        """归档中的缺口（交易所停机等原因没有K线的时段）"""
+        breaks = np.flatnonzero(np.diff(self._index) != self.step)
+        return [(int(self._index[i]), int(self._index[i + 1])) for i in breaks]
+
+
+# ---------- 下载 ----------
+
+def verify_page(rows: List[List[str]], before: int, after: int, step: int, anchor: Optional[int],
+                page_size: int) -> KlineSeries:
+    """
+    校验一页history-candles数据
+    :param rows: OKX返回的data
+    :param before/after: 请求的开区间 (before, after)
+    :param anchor: 对齐基准时间戳（归档最后一根；为None时以本页第一根为准）
+    :return: 已收盘的K线（从旧到新）；遇到未收盘K线时只保留它之前的部分
+    :raises ValueError: 数据不完整或不合理
+    """
+    if len(rows) > page_size:
+        raise ValueError(f"返回{len(rows)}根，超过请求的{page_size}根")
+    if any(len(row) < 9 for row in rows):
+        raise ValueError('K线字段不完整')
+    klines = KlineSeries.from_okx(rows)
+    confirmed = np.array([row[8] == '1' for row in rows])[np.argsort([int(row[0]) for row in rows], kind='stable')]
+    if len(klines) and not confirmed.all():
+        klines = klines[:int(np.argmin(confirmed))]
+    if not len(klines):
+        return klines
+
+    ts = klines.timestamp
+    if ts[0] <= before or ts[-1] >= after:
+        raise ValueError('K线时间超出请求范围')
+    if np.any(np.diff(ts) <= 0):
+        raise ValueError('K线时间戳重复')
+    if np.any((ts - (anchor if anchor is not None else ts[0])) % step):
+        raise ValueError('K线时间戳没有对齐周期')
+    prices = np.vstack([klines.open, klines.high, klines.low, klines.close])
+    if not np.isfinite(prices).all() or (prices <= 0).any() or not np.isfinite(klines.volume).all():
+        raise ValueError('K线价格无效')
+    if (np.any(klines.high < np.maximum(klines.open, klines.close))
+            or np.any(klines.low > np.minimum(klines.open, klines.close)) or np.any(klines.volume < 0)):
+        raise ValueError('K线OHLCV不自洽')
+    return klines
+
+
+class HistoryDownloader:
+    """按时间正序翻页下载history-candles并追加到归档
+
+    每页请求开区间 (before, after) 恰好page_size根，校验通过后立即追加；
+    断点续传以归档最后一根为准，中断后重新运行会从下一根继续。
+    """
+
+    PAGE_SIZE = 100
+
+    def __init__(self, client, archive: CandleArchive, rate_limiter=None, retries: int = 3,
+                 retry_delay: float = 2.0):
+        """
+        :param client: AsyncOKXClient（行情接口无需API Key）
+        :param archive: 目标归档
+        :param rate_limiter: 接口限速器（默认进程共享的RATE_LIMITER）
+        :param retries: 单页请求/校验失败的重试次数
+        :param retry_delay: 重试间隔（秒，逐次翻倍）
+        """
+        if rate_limiter is None:
+            from .trader import RATE_LIMITER
+            rate_limiter = RATE_LIMITER
+        self.client = client
+        self.archive = archive
+        self.rate_limiter = rate_limiter
+        self.retries = retries
+        self.retry_delay = retry_delay
+
+    async def _fetch_page(self, before: int, after: int) -> KlineSeries:
+        """请求并校验一页，失败按退避重试"""
+        archive = self.archive
+        for attempt in range(self.retries + 1):
+            try:
+                # 下载是顺序的单任务，限速等待直接阻塞事件循环即可
+                self.rate_limiter.acquire('history_candles')
+                result = await self.client.get_history_candlesticks(
+                    instId=archive.symbol, bar=archive.bar,
+                    after=str(after), before=str(before), limit=str(self.PAGE_SIZE)
+                )
+                if result.get('code') != '0':
+                    raise ValueError(f"OKX: {result.get('msg')} (code: {result.get('code')})")
+                return verify_page(result['data'], before, after, archive.step, archive.last_timestamp,
+                                   self.PAGE_SIZE)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.retry_delay * 2 ** attempt
+                print(f"  ⚠️ {format_ms(before + archive.step)} 起的一页下载失败 ({e})，{delay:.0f}秒后重试")
+                await asyncio.sleep(delay)
+
+    async def download(self, start: int, end: int = None, progress: bool = True) -> int:
+        """
+        下载[start, end)之间的K线（已有数据之后的部分）
+        :param start: 起始开盘时间（毫秒）；归档已有数据时从最后一根之后继续
+        :param end: 结束开盘时间（毫秒，不含），默认到当前未收盘K线之前
+        :return: 新写入的K线数量
+        """
+        archive, step = self.archive, self.archive.step
+        if end is None:
+            now = int(time.time() * 1000)
+            end = now - now % step
+        start = -(-start // step) * step  # 向上对齐到K线开盘时间（默认的"一年前"不在整根K线上）
+        if archive.first_timestamp is not None and start < archive.first_timestamp:
+            print(f"  ⚠️ 归档从{format_ms(archive.first_timestamp)}开始，只追加不补前面，"
+                  f"更早的数据请下载到新目录")
+        cursor = archive.last_timestamp if archive.last_timestamp is not None else start - step
+        if cursor >= start:
+            print(f"  ↻ 从 {format_ms(cursor + step)} 续传")
+
+        written = pages = missing = 0
+        started = time.perf_counter()
+        while cursor + step < end:
+            after = min(cursor + (self.PAGE_SIZE + 1) * step, end)
+            klines = await self._fetch_page(cursor, after)
+            written += archive.append(klines)
+            pages += 1
+            # 连续缺数据的页（上市之前、交易所停机）合并成一条提示
+            page_missing = max(0, (after - cursor) // step - 1 - len(klines))
+            if page_missing and not missing:
+                gap_from = cursor + step
+            missing += page_missing
+            if missing and (len(klines) or after >= end):
+                print(f"  ⚠️ {format_ms(gap_from)} ~ {format_ms(after - step)} 缺少{missing}根（交易所无数据）")
+                missing = 0
+            cursor = after - step
+            if progress and pages % 50 == 0:
+                rate = written / (time.perf_counter() - started)
+                print(f"  ⏳ 已到 {format_ms(cursor)}，新增{written:,}根（{rate:,.0f}根/秒）")
+        return written
+
+
+def format_ms(ms: int) -> str:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime('%Y-%m-%d %H:%M')
+
+
+def parse_date(text: str) -> int:
+    """YYYY-MM-DD（UTC）-> 毫秒时间戳"""
+    return int(datetime.strptime(text, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def warm_candle_store(store: CandleStore, directory: str, symbol: str, bars: Iterable[str],
+                      now_ms: int = None) -> Dict[str, int]:
+    """
+    用归档预热内存K线缓存（启动时调用；归档落后超过缓存窗口时跳过，交给REST完整拉取）
+    :return: {周期: 载入的K线数量}
+    """
+    if now_ms is None:
+        now_ms = int(time.time() * 1000)
+    loaded = {}
+    for bar in bars:
+        if bar not in BAR_MILLISECONDS or not CandleArchive.exists(directory, symbol, bar):
+            continue
+        archive = CandleArchive(directory, symbol, bar, readonly=True)
+        if not len(archive) or (now_ms - archive.last_timestamp) // archive.step >= store.max_bars:
+            continue
+        klines = archive.tail(store.max_bars)
+        # 复制出内存映射，缓存不持有归档文件
+        store.replace(symbol, bar, KlineSeries(*(np.array(getattr(klines, name)) for name in KlineSeries.__slots__)))
+        loaded[bar] = len(klines)
+    return loaded
+
+
+def main():
+    """命令行入口: python -m bot.candle_archive download|info ..."""
+    from config import Config
+
+    parser = argparse.ArgumentParser(description='K线归档')
+    parser.add_argument('command', choices=('download', 'info'))
+    parser.add_argument('--symbol', default=Config.TRADING_SYMBOL, help='交易对')
+    parser.add_argument('--bar', default='15m', help='K线周期')
+    parser.add_argument('--start', default=None, help='起始日期 YYYY-MM-DD（UTC，默认一年前）')
+    parser.add_argument('--end', default=None, help='结束日期 YYYY-MM-DD（不含，默认到现在）')
+    parser.add_argument('--dir', default=Config.CANDLE_ARCHIVE_DIR, help='归档目录')
+    args = parser.parse_args()
+
+    if args.command == 'info' and not CandleArchive.exists(args.dir, args.symbol, args.bar):
+        print(f"📦 {args.symbol} {args.bar}: 不存在")
+        return
+    archive = CandleArchive(args.dir, args.symbol, args.bar, readonly=args.command == 'info')
+    if args.command == 'download':
+        from .okx_client import AsyncOKXClient
+
+        start = parse_date(args.start) if args.start else int(time.time() * 1000) - 365 * 86400 * 1000
+        end = parse_date(args.end) if args.end else None
+
+        async def run():
+            client = AsyncOKXClient('', '', '', simulated=False, base_url=Config.OKX_BASE_URL)
+            try:
+                return await HistoryDownloader(client, archive).download(start, end)
+            finally:
+                await client.aclose()
+
+        print(f"📥 下载 {args.symbol} {args.bar} → {archive.data_path}")
+        written = asyncio.run(run())
+        print(f"✓ 新增{written:,}根")
+
+    if len(archive):
+        gaps = archive.find_gaps()
+        print(f"📦 {args.symbol} {args.bar}: {len(archive):,}根 "
+              f"{format_ms(archive.first_timestamp)} ~ {format_ms(archive.last_timestamp)}，缺口{len(gaps)}处")
+    else:
+        print(f"📦 {args.symbol} {args.bar}: 空")
+    archive.close()
+
+
+if __name__ == '__main__':
+    main()
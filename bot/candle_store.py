@@ -0,0 +1,164 @@
+"""K线内存缓存（按交易对+周期增量维护最近N根K线）"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .kline_series import KlineSeries
+
+
+# K线周期对应的毫秒数（OKX的K线按UTC对齐）
+BAR_MILLISECONDS = {
+    '1m': 60 * 1000,
+    '3m': 3 * 60 * 1000,
+    '5m': 5 * 60 * 1000,
+    '15m': 15 * 60 * 1000,
+    '30m': 30 * 60 * 1000,
+    '1H': 60 * 60 * 1000,
+    '2H': 2 * 60 * 60 * 1000,
+    '4H': 4 * 60 * 60 * 1000,
+    '1D': 24 * 60 * 60 * 1000,
+}
+
+
+class CandleStore:
+    """K线内存缓存
+
+    每个(交易对, 周期)保存最近max_bars根K线（KlineSeries，从旧到新），
+    预热后只需拉取上次最后一根之后的新K线即可。
+    """
+
+    def __init__(self, max_bars: int = 100):
+        """
+        :param max_bars: 每个周期最多保留的K线数量
+        """
+        self.max_bars = max_bars
+        self._series: Dict[Tuple[str, str], KlineSeries] = {}
+        self._lock = threading.Lock()
+
+    def size(self, symbol: str, bar: str) -> int:
+        """已缓存的K线数量"""
+        with self._lock:
+            series = self._series.get((symbol, bar))
+            return len(series) if series is not None else 0
+
+    def last_timestamp(self, symbol: str, bar: str) -> Optional[int]:
+        """最后一根K线的开盘时间戳（毫秒），没有缓存时返回None"""
+        with self._lock:
+            series = self._series.get((symbol, bar))
+            return series.last_timestamp if series is not None and len(series) else None
+
+    def replace(self, symbol: str, bar: str, klines: KlineSeries):
+        """用一段完整的K线窗口替换缓存（预热/修复缺口时使用）"""
+        with self._lock:
+            self._series[(symbol, bar)] = klines.tail(self.max_bars)
+
+    def merge(self, symbol: str, bar: str, klines: KlineSeries) -> int:
+        """
+        合并新K线：相同时间戳覆盖（未收盘的K线会被更新），新时间戳追加
+        :return: 新增K线数量
+        """
+        with self._lock:
+            stored = self._series.get((symbol, bar))
+            if stored is None:
+                self._series[(symbol, bar)] = klines.tail(self.max_bars)
+                return len(klines)
+            added = int(np.count_nonzero(~np.isin(klines.timestamp, stored.timestamp)))
+            self._series[(symbol, bar)] = stored.merge(klines, self.max_bars)
+            return added
+
+    def get(self, symbol: str, bar: str, limit: int = None) -> KlineSeries:
+        """获取最近limit根K线（从旧到新，视图不复制）"""
+        with self._lock:
+            series = self._series.get((symbol, bar))
+        if series is None:
+            return KlineSeries.empty()
+        return series.tail(limit) if limit else series
+
+    def find_gaps(self, symbol: str, bar: str) -> List[Tuple[int, int]]:
+        """
+        检查缓存中的缺口
+        :return: [(缺口前一根时间戳, 缺口后一根时间戳), ...]
+        """
+        step = BAR_MILLISECONDS.get(bar)
+        if not step:
+            return []
+        with self._lock:
+            series = self._series.get((symbol, bar))
+        return series.find_gaps(step) if series is not None else []
+
+    def bars_missing(self, symbol: str, bar: str, now_ms: int = None) -> Optional[int]:
+        """
+        距离最后一根缓存K线，又新开了多少根K线
+        :return: 新K线数量；没有缓存或周期未知时返回None
+        """
+        step = BAR_MILLISECONDS.get(bar)
+        last_ts = self.last_timestamp(symbol, bar)
+        if not step or last_ts is None:
+            return None
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        current_open = now_ms - now_ms % step
+        return max((current_open - last_ts) // step, 0)
+
+
+class CandleRing:
+    """定长环形缓冲区（只存已收盘K线，写满后覆盖最旧的）"""
+
+    def __init__(self, capacity: int = 300):
+        """
+        :param capacity: 最多保存的K线数量
+        """
+        self.capacity = capacity
+        self._timestamp = np.zeros(capacity, dtype=np.int64)
+        self._values = np.zeros((capacity, len(KlineSeries.PRICE_COLUMNS)), dtype=np.float64)
+        self._head = 0     # 下一根写入的位置
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def last_timestamp(self) -> Optional[int]:
+        """最新一根K线的开盘时间戳"""
+        if not self._count:
+            return None
+        return int(self._timestamp[(self._head - 1) % self.capacity])
+
+    def clear(self):
+        """清空缓冲"""
+        self._head = 0
+        self._count = 0
+
+    def append(self, timestamp: int, values: Tuple[float, ...]) -> bool:
+        """
+        写入一根已收盘K线（时间戳相同则覆盖，更早的忽略）
+        :return: 是否新增
+        """
+        last_ts = self.last_timestamp
+        if last_ts is not None and timestamp <= last_ts:
+            if timestamp == last_ts:
+                self._values[(self._head - 1) % self.capacity] = values
+            return False
+        self._timestamp[self._head] = timestamp
+        self._values[self._head] = values
+        self._head = (self._head + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+        return True
+
+    def seed(self, klines: KlineSeries) -> int:
+        """用REST拉到的K线预热（只写入比当前最新更新的部分）"""
+        added = 0
+        columns = [getattr(klines, col) for col in KlineSeries.PRICE_COLUMNS]
+        for i, ts in enumerate(klines.timestamp.tolist()):
+            if self.append(ts, tuple(col[i] for col in columns)):
+                added += 1
+        return added
+
+    def to_series(self, limit: int = None) -> KlineSeries:
+        """按从旧到新顺序导出最近limit根（环形存储可能回绕，这里会复制）"""
+        n = self._count if not limit else min(limit, self._count)
+        index = (self._head - n + np.arange(n)) % self.capacity
+        values = self._values[index]
+        return KlineSeries(self._timestamp[index], *(values[:, i] for i in range(values.shape[1])))
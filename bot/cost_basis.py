@@ -0,0 +1,183 @@
+"""现货持仓成本引擎（FIFO批次，增量同步成交记录）"""
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+
+# 低于此数量视为0（BTC精度8位）
+DUST = 0.00000001
+
+
+class CostBasisEngine:
+    """FIFO持仓成本引擎
+
+    维护未平仓的买入批次(deque)和已处理到的最后一条成交billId。
+    每次同步只向前翻页拉取新成交：BUY追加批次，SELL从头部扣除并计算已实现盈亏。
+    手续费按成交记录的fee/feeCcy计入：买入扣BTC的批次记净数量，卖出扣USDT的从卖出所得里减去。
+    配合Database持久化后，重启也不需要重放全部历史。
+    """
+
+    PAGE_SIZE = 100
+
+    def __init__(self, symbol: str, fetch_fills: Callable[[str], List[Dict]], db=None):
+        """
+        :param symbol: 交易对，如 BTC-USDT
+        :param fetch_fills: 拉取一页成交记录 fetch_fills(after_bill_id) -> [fill, ...]（从新到旧）
+        :param db: Database（为None时只在内存中维护）
+        """
+        self.symbol = symbol
+        self.base_ccy, _, self.quote_ccy = symbol.partition('-')
+        self.fetch_fills = fetch_fills
+        self.db = db
+        self.lots = deque()          # [[数量, 价格], ...] 先进先出
+        self.last_bill_id: Optional[str] = None
+        self.buy_count = 0
+        self.realized_pnl = 0.0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """从数据库恢复状态"""
+        self._loaded = True
+        if self.db is None:
+            return
+        state = self.db.get_cost_basis(self.symbol)
+        if state:
+            self.lots = deque([list(lot) for lot in state['lots']])
+            self.last_bill_id = state['last_bill_id']
+            self.buy_count = state['buy_count']
+            self.realized_pnl = state['realized_pnl']
+
+    def sync(self) -> int:
+        """
+        拉取并处理上次之后的新成交
+        :return: 新处理的成交笔数
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load()
+
+            new_fills = self._fetch_new_fills()
+            if not new_fills:
+                return 0
+
+            realized = []
+            # 从旧到新处理
+            for fill in reversed(new_fills):
+                sell = self._apply(fill)
+                if sell:
+                    realized.append(sell)
+            self.last_bill_id = new_fills[0]['billId']
+
+            if self.db is not None:
+                self.db.save_cost_basis(
+                    self.symbol, list(self.lots), self.last_bill_id,
+                    self.buy_count, self.realized_pnl, realized
+                )
+            return len(new_fills)
+
+    def _fetch_new_fills(self) -> List[Dict]:
+        """从最新一页往回翻，直到遇到已处理过的billId（返回从新到旧）"""
+        last_seen = int(self.last_bill_id) if self.last_bill_id else None
+        new_fills = []
+        after = ''
+        while True:
+            page = self.fetch_fills(after)
+            for fill in page:
+                if last_seen is not None and int(fill['billId']) <= last_seen:
+                    return new_fills
+                new_fills.append(fill)
+            if len(page) < self.PAGE_SIZE:
+                return new_fills
+            after = page[-1]['billId']
+
+    def _apply(self, fill: Dict) -> Optional[Dict]:
+        """
+        处理一笔成交
+        :return: SELL时返回已实现盈亏记录，BUY返回None
+        """
+        side = fill.get('side')
+        size = float(fill.get('fillSz') or 0)
+        price = float(fill.get('fillPx') or 0)
+        base_fee, quote_fee = self._fees(fill)
+
+        if side == 'buy':
+            # 批次记实际到账的数量，成本含手续费
+            net_size = size - base_fee
+            if net_size > DUST:
+                self.lots.append([net_size, (size * price + quote_fee) / net_size])
+            self.buy_count += 1
+            return None
+
+        if side != 'sell':
+            return None
+
+        # 卖出：从队列头部扣除（先进先出）
+        remaining = size
+        matched = 0.0
+        cost = 0.0
+        while remaining > DUST and self.lots:
+            lot = self.lots[0]
+            take = min(lot[0], remaining)
+            matched += take
+            cost += take * lot[1]
+            remaining -= take
+            lot[0] -= take
+            if lot[0] <= DUST:
+                self.lots.popleft()
+
+        # 只有能匹配到买入批次的部分才计算盈亏（更早的持仓没有成本数据），手续费按匹配比例分摊
+        fee = base_fee * price + quote_fee
+        pnl = matched * price - cost - (fee * matched / size if size > 0 else 0.0)
+        self.realized_pnl += pnl
+        return {
+            'bill_id': fill['billId'],
+            'ord_id': fill.get('ordId', ''),
+            'ts': int(fill.get('ts') or 0),
+            'size': size,
+            'price': price,
+            'matched': matched,
+            'cost': cost,
+            'pnl': pnl,
+        }
+
+    def _fees(self, fill: Dict):
+        """
+        成交记录的手续费（OKX的fee扣费为负、返佣为正）
+        :return: (BTC手续费, USDT手续费)；其他币种（如OKB抵扣）不计入
+        """
+        fee = -float(fill.get('fee') or 0)
+        fee_ccy = fill.get('feeCcy')
+        if fee_ccy == self.base_ccy:
+            return fee, 0.0
+        if fee_ccy == self.quote_ccy:
+            return 0.0, fee
+        return 0.0, 0.0
+
+    def position(self, current_balance: float) -> Dict:
+        """
+        当前持仓的加权平均成本（返回格式与get_spot_avg_cost一致）
+        :param current_balance: 当前BTC余额
+        """
+        with self._lock:
+            total_accounted = sum(lot[0] for lot in self.lots)
+            total_cost = sum(lot[0] * lot[1] for lot in self.lots)
+            pieces = len(self.lots)
+
+        if total_accounted <= 0:
+            return {
+                'success': True,
+                'has_position': False,
+                'amount': current_balance,
+                'avg_price': 0
+            }
+        return {
+            'success': True,
+            'has_position': True,
+            'amount': current_balance,
+            'avg_price': total_cost / total_accounted,
+            'total_accounted': total_accounted,  # FIFO计算出的持仓数量
+            'fills_count': self.buy_count,  # 总买入笔数
+            'position_pieces': pieces,  # 剩余持仓分几笔买入
+            'realized_pnl': self.realized_pnl  # 累计已实现盈亏
+        }
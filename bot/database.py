@@ -1,25 +1,177 @@
 """数据库操作"""
+import gzip
+import json
+import queue
 import sqlite3
-from datetime import datetime
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Optional
 import os
 
 
+# 高频写入语句（文本固定，命中连接的预编译语句缓存）
+INSERT_TRADE_SQL = '''
+    INSERT INTO trades (action, price, amount, reason, profit, balance_usdt, balance_btc, order_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+INSERT_STATUS_SQL = '''
+    INSERT INTO status (btc_price, usdt_balance, btc_balance, total_value, ai_suggestion, format)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+INSERT_REASONING_SQL = '''
+    INSERT OR REPLACE INTO status_reasoning (status_id, codec, size, data) VALUES (?, ?, ?, ?)
+'''
+
+# 数据保留：聚合粒度 -> (时间戳'YYYY-MM-DD HH:MM:SS'保留的前缀长度, 补齐的后缀)
+ROLLUP_PERIODS = {
+    'hour': (13, ':00:00'),
+    'day': (10, ' 00:00:00'),
+}
+
+# 状态查询返回的列（推理过程只返回引用：是否存在和原始大小，内容按需用get_reasoning读取）
+STATUS_COLUMNS = '''
+    s.id, s.timestamp, s.btc_price, s.usdt_balance, s.btc_balance, s.total_value,
+    s.ai_suggestion, s.format, r.size AS reasoning_size
+'''
+
+
+def status_format(ai_suggestion: Optional[str]) -> str:
+    """AI建议的存储格式：json（结构化建议）/ text（旧版纯文本）/ empty"""
+    text = (ai_suggestion or '').strip()
+    if not text:
+        return 'empty'
+    return 'json' if text.startswith('{') else 'text'
+
+
+def compress_reasoning(text: str) -> tuple:
+    """压缩AI推理过程 -> (codec, 原始字节数, 压缩数据)"""
+    raw = text.encode('utf-8')
+    return 'zlib', len(raw), zlib.compress(raw, 6)
+
+
+def decompress_reasoning(codec: str, data: bytes) -> str:
+    """解压AI推理过程"""
+    if codec == 'zlib':
+        return zlib.decompress(data).decode('utf-8')
+    raise ValueError(f"未知的压缩格式: {codec}")
+
+
 class Database:
-    """交易数据库"""
+    """交易数据库
+
+    每个线程持有一条长连接（WAL模式：读不阻塞写，机器人和面板可同时访问同一文件），
+    语句文本固定以复用sqlite3的预编译语句缓存。
+    开启write_behind后，状态快照这类非关键写入先进队列，由后台线程合并成一个事务写入。
+    """
     
-    def __init__(self, db_path: str = 'data/trading.db'):
+    # 结构迁移（PRAGMA user_version记录已应用的版本，按顺序执行未应用的迁移）
+    MIGRATIONS = [
+        (1, '_migrate_v1_tables'),
+        (2, '_migrate_v2_indexes'),
+        (3, '_migrate_v3_status_format'),
+        (4, '_migrate_v4_trade_stats'),
+        (5, '_migrate_v5_status_reasoning'),
+        (6, '_migrate_v6_status_rollup'),
+        (7, '_migrate_v7_trade_order_id'),
+        (8, '_migrate_v8_status_restored'),
+    ]
+    
+    # 聚合表保存的最近SELL窗口大小（get_recent_performance的limit不超过它时O(1)读取）
+    PERFORMANCE_WINDOW = 20
+    
+    # 连接参数
+    BUSY_TIMEOUT_MS = 5000
+    CACHE_SIZE_KB = 8192
+    STATEMENT_CACHE = 128
+    
+    def __init__(self, db_path: str = 'data/trading.db', write_behind: bool = False,
+                 flush_interval: float = 1.0):
+        """
+        :param db_path: 数据库文件路径
+        :param write_behind: 状态快照是否异步批量写入
+        :param flush_interval: 异步写入的合并间隔（秒）
+        """
         self.db_path = db_path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
         self._ensure_database()
+        
+        # 可选的后台批量写入
+        self.flush_interval = flush_interval
+        self._write_queue: Optional[queue.Queue] = None
+        self._writer: Optional[threading.Thread] = None
+        if write_behind:
+            self._write_queue = queue.Queue()
+            self._writer = threading.Thread(target=self._write_loop, name='db-writer', daemon=True)
+            self._writer.start()
+    
+    def _conn(self) -> sqlite3.Connection:
+        """当前线程的长连接（首次使用时创建并设置PRAGMA）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=self.BUSY_TIMEOUT_MS / 1000,
+                cached_statements=self.STATEMENT_CACHE,
+                check_same_thread=False  # 只在创建它的线程使用；close()时可跨线程关闭
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')  # WAL下NORMAL不会损坏数据库，只可能丢最后一次提交
+            conn.execute(f'PRAGMA cache_size=-{self.CACHE_SIZE_KB}')
+            conn.execute(f'PRAGMA busy_timeout={self.BUSY_TIMEOUT_MS}')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    def close(self):
+        """写完队列中的数据并关闭所有线程的连接"""
+        if self._write_queue is not None:
+            self._write_queue.put(None)
+            self._writer.join(timeout=10)
+            self._write_queue = None
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
     
     def _ensure_database(self):
-        """确保数据库和表存在"""
+        """确保数据库存在并迁移到最新结构版本"""
         # 确保data目录存在
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        conn = self._conn()
+        for version, name in self.MIGRATIONS:
+            if self._user_version(conn) >= version:
+                continue
+            # 写锁内再检查一次：机器人和面板可能同时启动
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if self._user_version(conn) < version:
+                    migrate = getattr(self, name)
+                    started = time.perf_counter()
+                    migrate(conn.cursor())
+                    conn.execute(f'PRAGMA user_version = {version}')
+                    print(f"  🗄️ 数据库迁移到v{version}: {migrate.__doc__} ({time.perf_counter() - started:.2f}s)")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    
+    @staticmethod
+    def _user_version(conn: sqlite3.Connection) -> int:
+        """当前数据库结构版本"""
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+    
+    @staticmethod
+    def _migrate_v1_tables(cursor):
+        """创建数据表"""
         # 创建交易记录表
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS trades (
@@ -49,43 +201,330 @@ class Database:
             )
         ''')
         
-        conn.commit()
-        conn.close()
+        # 持仓成本引擎：未平仓买入批次（FIFO顺序）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cost_lots (
+                symbol TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                amount REAL NOT NULL,
+                price REAL NOT NULL,
+                PRIMARY KEY (symbol, seq)
+            )
+        ''')
+        
+        # 持仓成本引擎：同步进度
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cost_state (
+                symbol TEXT PRIMARY KEY,
+                last_bill_id TEXT,
+                buy_count INTEGER DEFAULT 0,
+                realized_pnl REAL DEFAULT 0,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # 持仓成本引擎：每笔卖出成交的已实现盈亏
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cost_realized (
+                bill_id TEXT PRIMARY KEY,
+                symbol TEXT NOT NULL,
+                ord_id TEXT,
+                ts INTEGER,
+                size REAL,
+                price REAL,
+                matched REAL,
+                cost REAL,
+                pnl REAL
+            )
+        ''')
+    
+    @staticmethod
+    def _migrate_v2_indexes(cursor):
+        """按时间排序查询的索引"""
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_status_timestamp ON status (timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_trades_timestamp ON trades (timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_trades_action_timestamp ON trades (action, timestamp)')
+    
+    @staticmethod
+    def _migrate_v3_status_format(cursor):
+        """status.format列（替代TRIM(ai_suggestion) LIKE过滤）并回填"""
+        cursor.execute('ALTER TABLE status ADD COLUMN format TEXT')
+        cursor.execute('''
+            UPDATE status SET format = CASE
+                WHEN ai_suggestion IS NULL OR TRIM(ai_suggestion) = '' THEN 'empty'
+                WHEN TRIM(ai_suggestion) LIKE '{%' THEN 'json'
+                ELSE 'text'
+            END
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_status_format_timestamp ON status (format, timestamp)')
+    
+    @classmethod
+    def _migrate_v4_trade_stats(cls, cursor):
+        """交易统计聚合表（随add_trade同事务更新）"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS trade_stats (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                total_trades INTEGER NOT NULL DEFAULT 0,
+                buy_count INTEGER NOT NULL DEFAULT 0,
+                sell_count INTEGER NOT NULL DEFAULT 0,
+                total_profit REAL NOT NULL DEFAULT 0,
+                win_count INTEGER NOT NULL DEFAULT 0,
+                loss_count INTEGER NOT NULL DEFAULT 0,
+                best_profit REAL,
+                worst_profit REAL,
+                recent_sells TEXT NOT NULL DEFAULT '[]'
+            )
+        ''')
+        cls._write_stats(cursor, cls._recompute_stats(cursor))
+    
+    @classmethod
+    def _migrate_v5_status_reasoning(cls, cursor):
+        """AI推理过程移到压缩的status_reasoning表"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS status_reasoning (
+                status_id INTEGER PRIMARY KEY,
+                codec TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                data BLOB NOT NULL
+            )
+        ''')
+        
+        size_before = cls._used_size(cursor)
+        moved = 0
+        last_id = 0
+        # 分批搬运，避免一次把所有推理过程读进内存
+        while True:
+            rows = cursor.execute('''
+                SELECT id, ai_reasoning FROM status
+                WHERE id > ? AND ai_reasoning IS NOT NULL AND ai_reasoning != ''
+                ORDER BY id LIMIT 1000
+            ''', (last_id,)).fetchall()
+            if not rows:
+                break
+            cursor.executemany(INSERT_REASONING_SQL, [
+                (status_id, *compress_reasoning(text)) for status_id, text in rows
+            ])
+            moved += len(rows)
+            last_id = rows[-1][0]
+        cursor.execute("UPDATE status SET ai_reasoning = NULL WHERE ai_reasoning IS NOT NULL")
+        size_after = cls._used_size(cursor)
+        
+        if moved:
+            print(f"  🗄️ 推理过程迁移: {moved}条，数据库占用 {size_before / 1024 / 1024:.1f}MB -> "
+                  f"{size_after / 1024 / 1024:.1f}MB（空出的页会被复用，可用 python -m bot.database --vacuum 收缩文件）")
+    
+    @staticmethod
+    def _migrate_v6_status_rollup(cursor):
+        """状态降采样表（超过保留期的记录聚合为OHLC点）"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS status_rollup (
+                resolution TEXT NOT NULL,
+                period_start DATETIME NOT NULL,
+                samples INTEGER NOT NULL,
+                price_open REAL, price_high REAL, price_low REAL, price_close REAL,
+                value_open REAL, value_high REAL, value_low REAL, value_close REAL,
+                usdt_close REAL,
+                btc_close REAL,
+                PRIMARY KEY (resolution, period_start)
+            )
+        ''')
+        # 保留任务进度：已计入聚合的最大status id（重新导入的归档不会被重复聚合）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS retention_state (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+    
+    @staticmethod
+    def _migrate_v7_trade_order_id(cursor):
+        """trades.order_id列（沿用已有订单时据此判断是否已记录过）"""
+        cursor.execute('ALTER TABLE trades ADD COLUMN order_id TEXT')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_trades_order_id ON trades (order_id)')
+    
+    @staticmethod
+    def _migrate_v8_status_restored(cursor):
+        """从归档导回的状态记录id（保留任务跳过它们，不再归档和删除）"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS status_restored (
+                status_id INTEGER PRIMARY KEY
+            )
+        ''')
+    
+    @staticmethod
+    def _used_size(cursor) -> int:
+        """数据库实际占用字节数（不含空闲页）"""
+        page_size = cursor.execute('PRAGMA page_size').fetchone()[0]
+        page_count = cursor.execute('PRAGMA page_count').fetchone()[0]
+        free_pages = cursor.execute('PRAGMA freelist_count').fetchone()[0]
+        return (page_count - free_pages) * page_size
     
     def add_trade(self, action: str, price: float, amount: float, 
                   reason: str = '', profit: float = 0,
-                  balance_usdt: float = 0, balance_btc: float = 0):
-        """添加交易记录"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+                  balance_usdt: float = 0, balance_btc: float = 0, order_id: str = None):
+        """添加交易记录（关键数据，同步写入；统计聚合在同一事务内更新）"""
+        with self._conn() as conn:
+            cursor = conn.cursor()
+            # INSERT先拿到写锁，之后的读-改-写不会与其他写入交错
+            cursor.execute(INSERT_TRADE_SQL, (action, price, amount, reason, profit, balance_usdt, balance_btc,
+                                              order_id))
+            stats = self._read_stats(cursor)
+            self._apply_trade(stats, action, price, amount, profit)
+            self._write_stats(cursor, stats)
+    
+    # ---------- 交易统计聚合 ----------
+    
+    @staticmethod
+    def _read_stats(cursor) -> Dict:
+        """读取聚合行（recent_sells解析为 [[profit, price, amount], ...]，从旧到新）"""
+        row = cursor.execute('SELECT * FROM trade_stats WHERE id = 1').fetchone()
+        stats = dict(row)
+        stats['recent_sells'] = json.loads(stats['recent_sells'])
+        return stats
+    
+    @staticmethod
+    def _write_stats(cursor, stats: Dict):
+        cursor.execute('''
+            INSERT OR REPLACE INTO trade_stats (
+                id, total_trades, buy_count, sell_count, total_profit,
+                win_count, loss_count, best_profit, worst_profit, recent_sells
+            ) VALUES (1, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            stats['total_trades'], stats['buy_count'], stats['sell_count'], stats['total_profit'],
+            stats['win_count'], stats['loss_count'], stats['best_profit'], stats['worst_profit'],
+            json.dumps(stats['recent_sells'])
+        ))
+    
+    @classmethod
+    def _apply_trade(cls, stats: Dict, action: str, price: float, amount: float, profit: Optional[float]):
+        """把一笔新交易累加到聚合中"""
+        stats['total_trades'] += 1
+        stats['total_profit'] += profit or 0
+        if action == 'BUY':
+            stats['buy_count'] += 1
+        elif action == 'SELL':
+            stats['sell_count'] += 1
+            if profit is not None:
+                if profit > 0:
+                    stats['win_count'] += 1
+                else:
+                    stats['loss_count'] += 1
+                stats['best_profit'] = profit if stats['best_profit'] is None else max(stats['best_profit'], profit)
+                stats['worst_profit'] = profit if stats['worst_profit'] is None else min(stats['worst_profit'], profit)
+                stats['recent_sells'] = (stats['recent_sells'] + [[profit, price, amount]])[-cls.PERFORMANCE_WINDOW:]
+    
+    @classmethod
+    def _recompute_stats(cls, cursor) -> Dict:
+        """全表重新计算聚合（迁移回填和校验用）"""
+        cursor.execute('''
+            SELECT
+                COUNT(*),
+                COALESCE(SUM(action = 'BUY'), 0),
+                COALESCE(SUM(action = 'SELL'), 0),
+                COALESCE(SUM(profit), 0),
+                COALESCE(SUM(action = 'SELL' AND profit > 0), 0),
+                COALESCE(SUM(action = 'SELL' AND profit <= 0), 0),
+                MAX(CASE WHEN action = 'SELL' THEN profit END),
+                MIN(CASE WHEN action = 'SELL' THEN profit END)
+            FROM trades
+        ''')
+        keys = ('total_trades', 'buy_count', 'sell_count', 'total_profit',
+                'win_count', 'loss_count', 'best_profit', 'worst_profit')
+        stats = dict(zip(keys, cursor.fetchone()))
         
         cursor.execute('''
-            INSERT INTO trades (action, price, amount, reason, profit, balance_usdt, balance_btc)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (action, price, amount, reason, profit, balance_usdt, balance_btc))
+            SELECT profit, price, amount FROM trades
+            WHERE action = 'SELL' AND profit IS NOT NULL
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ?
+        ''', (cls.PERFORMANCE_WINDOW,))
+        stats['recent_sells'] = [list(row) for row in reversed(cursor.fetchall())]
+        return stats
+    
+    def verify_stats(self) -> Dict[str, tuple]:
+        """
+        聚合与全表重算对比
+        :return: 不一致的字段 {字段: (聚合值, 重算值)}，一致时为空
+        """
+        cursor = self._conn().cursor()
+        stored = self._read_stats(cursor)
+        expected = self._recompute_stats(cursor)
+        cursor.close()
         
-        conn.commit()
-        conn.close()
+        def same(a, b):
+            if isinstance(a, list) and isinstance(b, list):
+                return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+            if a is None or b is None:
+                return a is b
+            return abs(a - b) <= 1e-9 * max(1.0, abs(a), abs(b))
+        
+        return {key: (stored[key], value) for key, value in expected.items() if not same(stored[key], value)}
+    
+    def rebuild_stats(self):
+        """用全表重算的结果覆盖聚合"""
+        with self._conn() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            cursor = conn.cursor()
+            self._write_stats(cursor, self._recompute_stats(cursor))
     
     def add_status(self, btc_price: float, usdt_balance: float = 0,
                    btc_balance: float = 0, total_value: float = 0,
                    ai_suggestion: str = '', ai_reasoning: str = ''):
-        """添加系统状态记录"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO status (btc_price, usdt_balance, btc_balance, total_value, ai_suggestion, ai_reasoning)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (btc_price, usdt_balance, btc_balance, total_value, ai_suggestion, ai_reasoning))
-        
-        conn.commit()
-        conn.close()
+        """添加系统状态记录（推理过程压缩后存入status_reasoning；开启write_behind时进入队列异步写入）"""
+        row = (btc_price, usdt_balance, btc_balance, total_value, ai_suggestion,
+               status_format(ai_suggestion), ai_reasoning)
+        if self._write_queue is not None:
+            self._write_queue.put(row)
+            return
+        with self._conn() as conn:
+            self._insert_status(conn.cursor(), row)
+    
+    @staticmethod
+    def _insert_status(cursor, row: tuple):
+        """写入一条状态及其推理过程（调用方负责事务）"""
+        *values, reasoning = row
+        cursor.execute(INSERT_STATUS_SQL, values)
+        if reasoning:
+            cursor.execute(INSERT_REASONING_SQL, (cursor.lastrowid, *compress_reasoning(reasoning)))
+    
+    def flush(self):
+        """阻塞直到队列中的状态记录全部写入"""
+        if self._write_queue is not None:
+            self._write_queue.join()
+    
+    def _write_loop(self):
+        """后台写入线程：每flush_interval秒把队列里的状态记录合并成一个事务"""
+        write_queue = self._write_queue
+        stopping = False
+        while not stopping:
+            rows = [write_queue.get()]
+            # 攒一个间隔内的其余写入（收到停止标记None立即写入退出）
+            deadline = time.monotonic() + self.flush_interval
+            while rows[-1] is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(write_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            pending = [row for row in rows if row is not None]
+            stopping = len(pending) != len(rows)
+            try:
+                if pending:
+                    with self._conn() as conn:
+                        cursor = conn.cursor()
+                        for row in pending:
+                            self._insert_status(cursor, row)
+            except Exception as e:
+                print(f"  ⚠️ 状态记录批量写入失败({len(pending)}条): {e}")
+            finally:
+                for _ in rows:
+                    write_queue.task_done()
     
     def get_recent_trades(self, limit: int = 10) -> List[Dict]:
         """获取最近的交易记录"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = self._conn()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -93,55 +532,94 @@ class Database:
         ''', (limit,))
         
         rows = cursor.fetchall()
-        conn.close()
+        cursor.close()
         
         return [dict(row) for row in rows]
-    
+
+    def get_trades_after(self, trade_id: int, limit: int = 10) -> List[Dict]:
+        """获取id大于trade_id的交易记录（最新的limit条，按时间倒序）"""
+        cursor = self._conn().cursor()
+        cursor.execute('''
+            SELECT * FROM trades WHERE id > ? ORDER BY id DESC LIMIT ?
+        ''', (trade_id, limit))
+        rows = cursor.fetchall()
+        cursor.close()
+        return [dict(row) for row in rows]
+
+    def get_latest_ids(self) -> Dict[str, int]:
+        """最新状态/交易记录的id（主键MAX走B树末端，不扫表；面板推送据此判断有无新数据）"""
+        cursor = self._conn().cursor()
+        cursor.execute('''
+            SELECT (SELECT COALESCE(MAX(id), 0) FROM status),
+                   (SELECT COALESCE(MAX(id), 0) FROM trades)
+        ''')
+        status_id, trade_id = cursor.fetchone()
+        cursor.close()
+        return {'status': status_id, 'trade': trade_id}
+
     def get_latest_status(self) -> Optional[Dict]:
         """获取最新状态
         优先返回最新一条 JSON 格式(ai_suggestion 以"{"开头) 的记录，
         避免旧版本写入的纯字符串覆盖新AI结果。
         """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = self._conn()
         cursor = conn.cursor()
         
-        # 先取最近一条 JSON 格式的状态
-        cursor.execute('''
-            SELECT * FROM status
-            WHERE ai_suggestion IS NOT NULL
-              AND TRIM(ai_suggestion) LIKE '{%%'
-            ORDER BY timestamp DESC
+        # 先取最近一条 JSON 格式的状态（format+timestamp索引，不扫表）
+        cursor.execute(f'''
+            SELECT {STATUS_COLUMNS} FROM status s
+            LEFT JOIN status_reasoning r ON r.status_id = s.id
+            WHERE s.format = 'json'
+            ORDER BY s.timestamp DESC
             LIMIT 1
         ''')
         row = cursor.fetchone()
         
         # 如果还没有JSON记录，退回到最新一条任意记录
         if row is None:
-            cursor.execute('''
-                SELECT * FROM status ORDER BY timestamp DESC LIMIT 1
+            cursor.execute(f'''
+                SELECT {STATUS_COLUMNS} FROM status s
+                LEFT JOIN status_reasoning r ON r.status_id = s.id
+                ORDER BY s.timestamp DESC LIMIT 1
             ''')
             row = cursor.fetchone()
         
-        conn.close()
-        return dict(row) if row else None
+        cursor.close()
+        if row is None:
+            return None
+        status = dict(row)
+        status['has_reasoning'] = bool(status['reasoning_size'])
+        return status
+    
+    def get_reasoning(self, status_id: int) -> Optional[str]:
+        """读取并解压某条状态的AI推理过程（没有时返回None）"""
+        cursor = self._conn().cursor()
+        cursor.execute('SELECT codec, data FROM status_reasoning WHERE status_id = ?', (status_id,))
+        row = cursor.fetchone()
+        cursor.close()
+        return decompress_reasoning(row['codec'], row['data']) if row else None
     
     def get_recent_performance(self, limit: int = 20) -> Dict:
-        """获取最近N笔交易的表现统计，用于AI历史反馈"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """获取最近N笔交易的表现统计，用于AI历史反馈（limit不超过PERFORMANCE_WINDOW时直接读聚合行）"""
+        conn = self._conn()
         cursor = conn.cursor()
         
-        # 获取最近的交易记录（只统计有盈亏的SELL）
-        cursor.execute('''
-            SELECT * FROM trades 
-            WHERE action = 'SELL' AND profit IS NOT NULL
-            ORDER BY timestamp DESC 
-            LIMIT ?
-        ''', (limit,))
-        
-        recent_trades = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+        if limit <= self.PERFORMANCE_WINDOW:
+            recent_sells = self._read_stats(cursor)['recent_sells'][-limit:] if limit > 0 else []
+            recent_trades = [
+                {'action': 'SELL', 'profit': profit, 'price': price, 'amount': amount}
+                for profit, price, amount in reversed(recent_sells)
+            ]
+        else:
+            # 获取最近的交易记录（只统计有盈亏的SELL）
+            cursor.execute('''
+                SELECT * FROM trades 
+                WHERE action = 'SELL' AND profit IS NOT NULL
+                ORDER BY timestamp DESC, id DESC 
+                LIMIT ?
+            ''', (limit,))
+            recent_trades = [dict(row) for row in cursor.fetchall()]
+        cursor.close()
         
         if not recent_trades:
             return {
@@ -200,13 +678,13 @@ class Database:
     
     def get_recent_ai_decisions(self, limit: int = 10) -> list:
         """获取最近N条AI决策记录（用于AI记忆）"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn()
         cursor = conn.cursor()
         
         cursor.execute('''
             SELECT timestamp, btc_price, ai_suggestion 
             FROM status 
-            WHERE ai_suggestion IS NOT NULL AND ai_suggestion != ''
+            WHERE format = 'json'
             ORDER BY timestamp DESC 
             LIMIT ?
         ''', (limit,))
@@ -219,7 +697,6 @@ class Database:
             
             # 解析AI建议JSON
             try:
-                import json
                 suggestion = json.loads(ai_suggestion)
                 decisions.append({
                     'timestamp': timestamp,
@@ -231,40 +708,366 @@ class Database:
             except:
                 pass
         
-        conn.close()
+        cursor.close()
         # 按时间正序返回（从旧到新）
         return list(reversed(decisions))
+
+    def get_ai_decision_history(self) -> List[Dict]:
+        """全部AI决策记录（从旧到新，回测重放用）：[{timestamp, price, suggestion}, ...]"""
+        cursor = self._conn().cursor()
+        cursor.execute('''
+            SELECT timestamp, btc_price, ai_suggestion FROM status
+            WHERE format = 'json'
+            ORDER BY timestamp, id
+        ''')
+        decisions = []
+        for timestamp, price, ai_suggestion in cursor:
+            try:
+                suggestion = json.loads(ai_suggestion)
+            except ValueError:
+                continue
+            decisions.append({'timestamp': timestamp, 'price': price, 'suggestion': suggestion})
+        cursor.close()
+        return decisions
     
     def get_statistics(self) -> Dict:
-        """获取统计数据"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """获取统计数据（读聚合行）"""
+        cursor = self._conn().cursor()
+        stats = self._read_stats(cursor)
+        cursor.close()
         
-        # 总交易次数
-        cursor.execute('SELECT COUNT(*) FROM trades')
-        total_trades = cursor.fetchone()[0]
+        # 平均盈亏（只统计SELL交易，因为BUY没有盈亏）
+        sell_count = stats['sell_count']
+        avg_profit = stats['total_profit'] / sell_count if sell_count > 0 else 0
         
-        # 总盈亏
-        cursor.execute('SELECT SUM(profit) FROM trades')
-        total_profit = cursor.fetchone()[0] or 0
+        return {
+            'total_trades': stats['total_trades'],
+            'total_profit': round(stats['total_profit'], 2),
+            'buy_count': stats['buy_count'],
+            'sell_count': sell_count,
+            'avg_profit': round(avg_profit, 2),
+            'win_count': stats['win_count'],
+            'loss_count': stats['loss_count'],
+            'best_profit': stats['best_profit'],
+            'worst_profit': stats['worst_profit']
+        }
+    
+    # ---------- 数据保留 ----------
+    
+    def default_archive_dir(self) -> str:
+        """默认归档目录：数据库同级的archive/<数据库名>/"""
+        name = os.path.splitext(os.path.basename(self.db_path))[0]
+        return os.path.join(os.path.dirname(self.db_path), 'archive', name)
+    
+    def run_retention(self, retention_days: int, rollup: str = 'hour', archive_dir: str = None,
+                      batch_size: int = 500, now: datetime = None) -> Dict:
+        """
+        增量执行一批数据保留：处理最早的batch_size条超过保留期的状态记录
+        - 按小时/天聚合为价格和总资产的OHLC点（status_rollup）
+        - 原始记录（含解压后的推理过程）追加到按日期分区的gzip归档，可用import_archive导回
+        - 从status/status_reasoning删除
+        import_archive导回的记录不参与（否则下一轮又会被归档、删除）
+        :param retention_days: 保留完整记录的天数
+        :param rollup: 聚合粒度 hour/day
+        :param archive_dir: 归档目录（默认default_archive_dir()）
+        :param now: 当前时间（UTC，默认现在）
+        :return: {'archived': 本批处理条数, 'rolled_up': 计入聚合条数, 'files': 写入的归档文件}
+        """
+        period = ROLLUP_PERIODS[rollup]
+        archive_dir = archive_dir or self.default_archive_dir()
+        now = now or datetime.now(timezone.utc)
+        cutoff = (now - timedelta(days=retention_days)).strftime('%Y-%m-%d %H:%M:%S')
         
-        # 买入次数
-        cursor.execute('SELECT COUNT(*) FROM trades WHERE action = "BUY"')
-        buy_count = cursor.fetchone()[0]
+        conn = self._conn()
+        rows = conn.execute('''
+            SELECT s.*, r.codec, r.data FROM status s
+            LEFT JOIN status_reasoning r ON r.status_id = s.id
+            WHERE s.timestamp < ?
+              AND NOT EXISTS (SELECT 1 FROM status_restored p WHERE p.status_id = s.id)
+            ORDER BY s.id
+            LIMIT ?
+        ''', (cutoff, batch_size)).fetchall()
+        if not rows:
+            return {'archived': 0, 'rolled_up': 0, 'files': []}
         
-        # 卖出次数
-        cursor.execute('SELECT COUNT(*) FROM trades WHERE action = "SELL"')
-        sell_count = cursor.fetchone()[0]
+        # 1. 先写归档（崩溃后重跑时跳过文件里已有的id）
+        files = self._archive_status_rows(rows, archive_dir)
         
-        # 平均盈亏（只统计SELL交易，因为BUY没有盈亏）
-        avg_profit = total_profit / sell_count if sell_count > 0 else 0
+        # 2. 同一事务内：聚合 + 删除 + 记录进度
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            state = conn.execute("SELECT value FROM retention_state WHERE name = 'rolled_up_id'").fetchone()
+            rolled_up_id = state[0] if state else 0
+            fresh = [row for row in rows if row['id'] > rolled_up_id]
+            self._rollup_status_rows(conn.cursor(), fresh, rollup, period)
+            
+            ids = [(row['id'],) for row in rows]
+            conn.executemany('DELETE FROM status_reasoning WHERE status_id = ?', ids)
+            conn.executemany('DELETE FROM status WHERE id = ?', ids)
+            conn.execute('''
+                INSERT OR REPLACE INTO retention_state (name, value) VALUES ('rolled_up_id', ?)
+            ''', (max(rolled_up_id, rows[-1]['id']),))
         
-        conn.close()
+        return {'archived': len(rows), 'rolled_up': len(fresh), 'files': files}
+    
+    @staticmethod
+    def _archive_status_rows(rows: List[sqlite3.Row], archive_dir: str) -> List[str]:
+        """按日期追加到 status-YYYY-MM-DD.jsonl.gz（每次追加一个gzip member，写完fsync；文件里已有的id不重复追加）"""
+        os.makedirs(archive_dir, exist_ok=True)
+        by_date: Dict[str, List[sqlite3.Row]] = {}
+        for row in rows:
+            by_date.setdefault(row['timestamp'][:10], []).append(row)
+        
+        files = []
+        for date, date_rows in by_date.items():
+            path = os.path.join(archive_dir, f'status-{date}.jsonl.gz')
+            archived = Database._archived_ids(path)
+            lines = []
+            for row in date_rows:
+                if row['id'] in archived:
+                    continue
+                record = {key: row[key] for key in row.keys() if key not in ('codec', 'data')}
+                if row['data'] is not None:
+                    record['ai_reasoning'] = decompress_reasoning(row['codec'], row['data'])
+                lines.append(json.dumps(record, ensure_ascii=False))
+            if not lines:
+                continue
+            with open(path, 'ab') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='ab') as gz:
+                    gz.write(('\n'.join(lines) + '\n').encode('utf-8'))
+                raw.flush()
+                os.fsync(raw.fileno())
+            files.append(path)
+        return files
+    
+    @staticmethod
+    def _archived_ids(path: str) -> set:
+        """归档文件里已有的status id（文件不存在返回空集；末尾写了一半的member读到哪算哪）"""
+        ids = set()
+        if not os.path.exists(path):
+            return ids
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        ids.add(json.loads(line)['id'])
+                    except (ValueError, KeyError):
+                        continue
+        except (EOFError, OSError):
+            pass
+        return ids
+    
+    @staticmethod
+    def _rollup_status_rows(cursor, rows: List[sqlite3.Row], rollup: str, period: tuple):
+        """把一批记录（按id即时间顺序）合并进status_rollup"""
+        prefix, suffix = period
+        buckets: Dict[str, Dict] = {}
+        for row in rows:
+            period_start = row['timestamp'][:prefix] + suffix
+            price = row['btc_price']
+            value = row['total_value'] or 0
+            bucket = buckets.get(period_start)
+            if bucket is None:
+                buckets[period_start] = {
+                    'samples': 1,
+                    'price': [price, price, price, price],
+                    'value': [value, value, value, value],
+                    'usdt': row['usdt_balance'],
+                    'btc': row['btc_balance'],
+                }
+                continue
+            bucket['samples'] += 1
+            for key, point in (('price', price), ('value', value)):
+                ohlc = bucket[key]
+                ohlc[1] = max(ohlc[1], point)
+                ohlc[2] = min(ohlc[2], point)
+                ohlc[3] = point
+            bucket['usdt'] = row['usdt_balance']
+            bucket['btc'] = row['btc_balance']
+        
+        # 同一周期可能跨批次：开盘保留已有的，收盘取新的
+        cursor.executemany('''
+            INSERT INTO status_rollup (
+                resolution, period_start, samples,
+                price_open, price_high, price_low, price_close,
+                value_open, value_high, value_low, value_close,
+                usdt_close, btc_close
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (resolution, period_start) DO UPDATE SET
+                samples = samples + excluded.samples,
+                price_high = MAX(price_high, excluded.price_high),
+                price_low = MIN(price_low, excluded.price_low),
+                price_close = excluded.price_close,
+                value_high = MAX(value_high, excluded.value_high),
+                value_low = MIN(value_low, excluded.value_low),
+                value_close = excluded.value_close,
+                usdt_close = excluded.usdt_close,
+                btc_close = excluded.btc_close
+        ''', [
+            (rollup, period_start, bucket['samples'], *bucket['price'], *bucket['value'], bucket['usdt'], bucket['btc'])
+            for period_start, bucket in buckets.items()
+        ])
+    
+    def import_archive(self, path: str) -> int:
+        """
+        把归档文件导回status/status_reasoning（按id去重，已存在的记录跳过）
+        导回的记录记入status_restored，保留任务不会再次聚合、归档或删除它们
+        :return: 新导入的条数
+        """
+        imported = 0
+        with gzip.open(path, 'rt', encoding='utf-8') as f, self._conn() as conn:
+            cursor = conn.cursor()
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                cursor.execute('''
+                    INSERT OR IGNORE INTO status (
+                        id, timestamp, btc_price, usdt_balance, btc_balance, total_value, ai_suggestion, format
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    record['id'], record['timestamp'], record['btc_price'], record.get('usdt_balance'),
+                    record.get('btc_balance'), record.get('total_value'), record.get('ai_suggestion'),
+                    record.get('format') or status_format(record.get('ai_suggestion'))
+                ))
+                if not cursor.rowcount:
+                    continue
+                imported += 1
+                cursor.execute('INSERT OR IGNORE INTO status_restored (status_id) VALUES (?)', (record['id'],))
+                if record.get('ai_reasoning'):
+                    cursor.execute(INSERT_REASONING_SQL, (record['id'], *compress_reasoning(record['ai_reasoning'])))
+        return imported
+    
+    def get_cost_basis(self, symbol: str) -> Optional[Dict]:
+        """读取持仓成本引擎的状态（未同步过返回None）"""
+        conn = self._conn()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT last_bill_id, buy_count, realized_pnl FROM cost_state WHERE symbol = ?
+        ''', (symbol,))
+        state = cursor.fetchone()
+        if state is None:
+            cursor.close()
+            return None
+        
+        cursor.execute('''
+            SELECT amount, price FROM cost_lots WHERE symbol = ? ORDER BY seq
+        ''', (symbol,))
+        lots = [(row[0], row[1]) for row in cursor.fetchall()]
+        cursor.close()
         
         return {
-            'total_trades': total_trades,
-            'total_profit': round(total_profit, 2),
-            'buy_count': buy_count,
-            'sell_count': sell_count,
-            'avg_profit': round(avg_profit, 2)
+            'lots': lots,
+            'last_bill_id': state[0],
+            'buy_count': state[1] or 0,
+            'realized_pnl': state[2] or 0.0
         }
+    
+    def save_cost_basis(self, symbol: str, lots: List, last_bill_id: str,
+                        buy_count: int, realized_pnl: float, realized: List[Dict] = None):
+        """保存持仓成本引擎的状态（同一事务内替换批次、更新进度、记录新卖出盈亏）"""
+        with self._conn() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('DELETE FROM cost_lots WHERE symbol = ?', (symbol,))
+            cursor.executemany('''
+                INSERT INTO cost_lots (symbol, seq, amount, price) VALUES (?, ?, ?, ?)
+            ''', [(symbol, seq, amount, price) for seq, (amount, price) in enumerate(lots)])
+            
+            cursor.execute('''
+                INSERT OR REPLACE INTO cost_state (symbol, last_bill_id, buy_count, realized_pnl, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', (symbol, last_bill_id, buy_count, realized_pnl))
+            
+            if realized:
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO cost_realized (bill_id, symbol, ord_id, ts, size, price, matched, cost, pnl)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', [
+                    (r['bill_id'], symbol, r['ord_id'], r['ts'], r['size'], r['price'], r['matched'], r['cost'], r['pnl'])
+                    for r in realized
+                ])
+    
+    def has_trade(self, order_id: str) -> bool:
+        """该OKX订单是否已记录为交易"""
+        row = self._conn().execute('SELECT 1 FROM trades WHERE order_id = ? LIMIT 1', (order_id,)).fetchone()
+        return row is not None
+    
+    def get_realized_pnl(self, order_id: str) -> Optional[float]:
+        """某笔卖出订单的已实现盈亏（成交可能拆成多笔，求和；未同步到返回None）"""
+        conn = self._conn()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT COUNT(*), SUM(pnl) FROM cost_realized WHERE ord_id = ?
+        ''', (order_id,))
+        count, pnl = cursor.fetchone()
+        cursor.close()
+        
+        return pnl if count else None
+
+
+def main():
+    """
+    数据库维护命令
+    python -m bot.database [数据库路径]                 校验交易统计聚合（与全表重算对比）
+    python -m bot.database --rebuild                     不一致时用全表重算结果重建
+    python -m bot.database --retention 30                把超过30天的状态记录全部降采样+归档
+    python -m bot.database --import data/archive/.../status-2025-01-01.jsonl.gz   导回归档
+    python -m bot.database --vacuum                      收缩数据库文件（先停止机器人和面板）
+    """
+    import argparse
+    parser = argparse.ArgumentParser(prog='python -m bot.database', description='数据库维护')
+    parser.add_argument('db_path', nargs='?', help='数据库路径（默认Config.DATABASE_PATH）')
+    parser.add_argument('--rebuild', action='store_true', help='统计聚合不一致时重建')
+    parser.add_argument('--retention', type=int, metavar='DAYS', help='执行数据保留（保留DAYS天完整记录）')
+    parser.add_argument('--rollup', choices=sorted(ROLLUP_PERIODS), default='hour', help='降采样粒度')
+    parser.add_argument('--import', dest='import_files', nargs='+', metavar='FILE', help='导回归档文件')
+    parser.add_argument('--vacuum', action='store_true', help='收缩数据库文件')
+    args = parser.parse_args()
+    
+    db_path = args.db_path
+    if not db_path:
+        from config import Config
+        db_path = Config.DATABASE_PATH
+    
+    db = Database(db_path)
+    mismatches = db.verify_stats()
+    if not mismatches:
+        print(f"✅ 统计聚合与全表重算一致: {db_path}")
+    else:
+        print(f"❌ 统计聚合与全表重算不一致: {db_path}")
+        for key, (stored, expected) in mismatches.items():
+            print(f"  {key}: 聚合={stored} 重算={expected}")
+        if args.rebuild:
+            db.rebuild_stats()
+            print("✅ 已用全表重算结果重建聚合" if not db.verify_stats() else "❌ 重建后仍不一致")
+        else:
+            print("  使用 --rebuild 重建")
+    
+    if args.retention is not None:
+        total = 0
+        while True:
+            result = db.run_retention(args.retention, rollup=args.rollup, batch_size=5000)
+            if not result['archived']:
+                break
+            total += result['archived']
+        print(f"✅ 数据保留完成: 归档{total}条（{db.default_archive_dir()}）")
+    
+    for path in args.import_files or []:
+        print(f"✅ 导回 {path}: {db.import_archive(path)}条")
+    
+    if args.vacuum:
+        # VACUUM不能在事务中执行，且需要独占访问（先停止机器人和面板）
+        size_before = os.path.getsize(db_path)
+        conn = db._conn()
+        conn.execute('VACUUM')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')  # WAL模式下收缩结果在检查点后才写回主文件
+        print(f"✅ 已收缩数据库文件: {size_before / 1024 / 1024:.1f}MB -> {os.path.getsize(db_path) / 1024 / 1024:.1f}MB")
+    db.close()
+    return 0 if not mismatches or args.rebuild else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,123 @@
+"""交易循环数据采集（并发执行互不依赖的I/O调用）"""
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+
+@dataclass
+class MarketSnapshot:
+    """一次交易循环所需的全部输入数据"""
+    symbol: str
+    market_data: Optional[Dict] = None      # 多时间周期K线（全部失败时为None）
+    balance: Optional[Dict] = None          # get_balance返回值（超时/异常时为None）
+    position_data: Optional[Dict] = None    # get_spot_avg_cost返回值
+    recent_trades: List[Dict] = field(default_factory=list)
+    performance_stats: Dict = field(default_factory=dict)
+    recent_decisions: List[Dict] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)   # 每个调用的耗时（秒）
+    errors: Dict[str, str] = field(default_factory=dict)      # 失败/超时的调用
+    wall_time: float = 0.0                                      # 采集阶段总耗时（秒）
+
+    def timing_report(self) -> str:
+        """耗时报告：各调用耗时 vs 实际总耗时"""
+        serial = sum(self.timings.values())
+        parts = ' | '.join(f"{name} {seconds:.2f}s" for name, seconds in self.timings.items())
+        report = f"数据采集 {self.wall_time:.2f}s（串行合计 {serial:.2f}s）: {parts}"
+        if self.errors:
+            report += ' | 失败: ' + ', '.join(f"{name}({error})" for name, error in self.errors.items())
+        return report
+
+
+class DataGatherer:
+    """并发数据采集器
+
+    K线(每个周期一个请求)、余额、成本价、数据库查询并发执行；
+    成本价依赖余额，在同一线程池里等余额返回后再查询。
+    """
+
+    # 每个调用的超时时间（秒，从提交开始计算）
+    DEFAULT_TIMEOUTS = {
+        'klines': 15,
+        'balance': 10,
+        'position': 20,
+        'database': 5,
+    }
+
+    def __init__(self, trader, db, max_workers: int = 8, timeouts: Dict[str, float] = None):
+        """
+        :param trader: OKXTrader
+        :param db: Database
+        :param max_workers: 线程池大小
+        :param timeouts: 覆盖默认超时 {'klines'/'balance'/'position'/'database': 秒}
+        """
+        self.trader = trader
+        self.db = db
+        self.timeouts = dict(self.DEFAULT_TIMEOUTS, **(timeouts or {}))
+        # 线程池常驻：超时的调用无法中断，留在池里跑完即可，不阻塞下一轮
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gather')
+
+    def gather(self, symbol: str) -> MarketSnapshot:
+        """并发采集一次交易循环所需的数据"""
+        snapshot = MarketSnapshot(symbol=symbol)
+        started = time.perf_counter()
+        deadlines = {}
+
+        def submit(name: str, group: str, func: Callable, *args) -> Future:
+            deadlines[name] = time.perf_counter() + self.timeouts[group]
+            return self._executor.submit(self._timed, snapshot.timings, name, func, *args)
+
+        kline_futures = {
+            bar: submit(f"klines_{bar}", 'klines', self.trader.get_kline_data, symbol, bar, limit)
+            for bar, limit in self.trader.MULTI_TIMEFRAMES
+        }
+        balance_future = submit('balance', 'balance', self.trader.get_balance)
+        deadlines['position'] = time.perf_counter() + self.timeouts['position']
+        position_future = self._executor.submit(self._position_after_balance, snapshot.timings, symbol, balance_future)
+        trades_future = submit('recent_trades', 'database', self.db.get_recent_trades, 5)
+        performance_future = submit('performance', 'database', self.db.get_recent_performance, 20)
+        decisions_future = submit('decisions', 'database', self.db.get_recent_ai_decisions, 10)
+
+        def collect(name: str, future: Future, default=None):
+            try:
+                return future.result(timeout=max(deadlines[name] - time.perf_counter(), 0))
+            except FutureTimeoutError:
+                snapshot.errors[name] = '超时'
+            except Exception as e:
+                snapshot.errors[name] = str(e)[:80]
+            return default
+
+        timeframes = {}
+        for bar, future in kline_futures.items():
+            data = collect(f"klines_{bar}", future)
+            if data:
+                timeframes[bar] = data
+        snapshot.market_data = self.trader.combine_timeframes(symbol, timeframes)
+        snapshot.balance = collect('balance', balance_future)
+        snapshot.position_data = collect('position', position_future)
+        snapshot.recent_trades = collect('recent_trades', trades_future, [])
+        snapshot.performance_stats = collect('performance', performance_future, {})
+        snapshot.recent_decisions = collect('decisions', decisions_future, [])
+
+        snapshot.wall_time = time.perf_counter() - started
+        return snapshot
+
+    def _position_after_balance(self, timings: Dict[str, float], symbol: str, balance_future: Future) -> Optional[Dict]:
+        """等余额返回后查询成本价（只计等待之后的耗时）"""
+        balance = balance_future.result(timeout=self.timeouts['balance'])
+        if not balance or not balance.get('success'):
+            return None
+        return self._timed(timings, 'position', self.trader.get_spot_avg_cost, symbol, balance['btc'])
+
+    @staticmethod
+    def _timed(timings: Dict[str, float], name: str, func: Callable, *args):
+        """执行调用并记录耗时"""
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            timings[name] = time.perf_counter() - started
+
+    def shutdown(self):
+        """关闭线程池（不等待未完成的调用）"""
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,154 @@
+"""列式K线序列（每列一个NumPy数组，不依赖pandas）"""
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+class KlineSeries:
+    """列式OHLCV序列（从旧到新）
+
+    每列是一个一维NumPy数组；切片/tail返回共享底层内存的视图，不复制数据。
+    序列按不可变对象使用：合并时生成新数组，已发出的视图不受影响。
+    """
+
+    __slots__ = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+    PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, timestamp: np.ndarray, open: np.ndarray, high: np.ndarray,
+                 low: np.ndarray, close: np.ndarray, volume: np.ndarray):
+        """
+        :param timestamp: 开盘时间戳（毫秒，int64）
+        :param open/high/low/close/volume: float64数组，长度与timestamp一致
+        """
+        self.timestamp = timestamp
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    @classmethod
+    def empty(cls) -> 'KlineSeries':
+        """空序列"""
+        return cls(np.empty(0, dtype=np.int64), *(np.empty(0) for _ in cls.PRICE_COLUMNS))
+
+    @classmethod
+    def from_okx(cls, rows: Sequence[Sequence[str]]) -> 'KlineSeries':
+        """
+        一次向量化解析OKX K线数据
+        OKX返回格式：[时间戳, 开盘价, 最高价, 最低价, 收盘价, 成交量, 成交额(Quote货币), 成交量(Base货币), confirm]
+        OKX按从新到旧返回，这里统一转为从旧到新
+        """
+        if not rows:
+            return cls.empty()
+
+        # 只取前6列（时间戳+OHLCV），字符串一次性转为float64
+        table = np.array([row[:6] for row in rows], dtype=np.float64)
+        timestamp = table[:, 0].astype(np.int64)
+
+        order = np.argsort(timestamp, kind='stable')
+        table = table[order]
+        return cls(timestamp[order], *(np.ascontiguousarray(table[:, i]) for i in range(1, 6)))
+
+    @classmethod
+    def from_dicts(cls, klines: List[Dict]) -> 'KlineSeries':
+        """从[{timestamp, open, high, low, close, volume}, ...]构建（兼容旧格式）"""
+        if not klines:
+            return cls.empty()
+        timestamp = np.fromiter((k['timestamp'] for k in klines), dtype=np.int64, count=len(klines))
+        columns = [
+            np.fromiter((k[col] for k in klines), dtype=np.float64, count=len(klines))
+            for col in cls.PRICE_COLUMNS
+        ]
+        order = np.argsort(timestamp, kind='stable')
+        return cls(timestamp[order], *(col[order] for col in columns))
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def __getitem__(self, index) -> 'KlineSeries':
+        """只支持切片（返回视图）"""
+        if not isinstance(index, slice):
+            raise TypeError('KlineSeries只支持切片访问，单根K线请用row(i)')
+        return KlineSeries(*(getattr(self, name)[index] for name in self.__slots__))
+
+    def tail(self, n: int) -> 'KlineSeries':
+        """最近n根K线（视图）"""
+        if n <= 0:
+            return self[0:0]
+        return self[-n:]
+
+    def row(self, i: int) -> Dict:
+        """第i根K线（字典格式）"""
+        return {
+            'timestamp': int(self.timestamp[i]),
+            'open': float(self.open[i]),
+            'high': float(self.high[i]),
+            'low': float(self.low[i]),
+            'close': float(self.close[i]),
+            'volume': float(self.volume[i]),
+        }
+
+    def to_dicts(self) -> List[Dict]:
+        """转换为字典列表（用于JSON输出）"""
+        columns = [self.timestamp.tolist()] + [getattr(self, col).tolist() for col in self.PRICE_COLUMNS]
+        keys = self.__slots__
+        return [dict(zip(keys, values)) for values in zip(*columns)]
+
+    @property
+    def last_timestamp(self) -> int:
+        """最后一根K线的开盘时间戳"""
+        return int(self.timestamp[-1])
+
+    @property
+    def last_close(self) -> float:
+        """最新收盘价"""
+        return float(self.close[-1])
+
+    def merge(self, newer: 'KlineSeries', max_bars: int = None) -> 'KlineSeries':
+        """
+        合并两段序列，时间戳相同的K线以newer为准（未收盘K线会被更新）
+        :param max_bars: 合并后最多保留的K线数量
+        :return: 新序列（不修改原序列）
+        """
+        timestamp = np.concatenate([self.timestamp, newer.timestamp])
+        # 反转后取首次出现 = 原序列中最后一次出现，即newer的版本
+        _, first_in_reversed = np.unique(timestamp[::-1], return_index=True)
+        keep = len(timestamp) - 1 - first_in_reversed
+        if max_bars:
+            keep = keep[-max_bars:]
+        return KlineSeries(
+            timestamp[keep],
+            *(np.concatenate([getattr(self, col), getattr(newer, col)])[keep] for col in self.PRICE_COLUMNS)
+        )
+
+    def resample(self, step_ms: int) -> 'KlineSeries':
+        """
+        合并为更大周期的K线（按UTC对齐，如15m→1H）
+        :param step_ms: 目标周期毫秒数
+        :return: 新序列；最后一组可能没有收满（对应未收盘K线）
+        """
+        if not len(self):
+            return KlineSeries.empty()
+        bucket = self.timestamp - self.timestamp % step_ms
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        ends = np.r_[starts[1:], len(self)] - 1
+        return KlineSeries(
+            bucket[starts],
+            self.open[starts],
+            np.maximum.reduceat(self.high, starts),
+            np.minimum.reduceat(self.low, starts),
+            self.close[ends],
+            np.add.reduceat(self.volume, starts)
+        )
+
+    def find_gaps(self, step_ms: int) -> List[Tuple[int, int]]:
+        """
+        检查不连续的位置
+        :return: [(缺口前一根时间戳, 缺口后一根时间戳), ...]
+        """
+        if len(self) < 2:
+            return []
+        breaks = np.nonzero(np.diff(self.timestamp) != step_ms)[0]
+        return [(int(self.timestamp[i]), int(self.timestamp[i + 1])) for i in breaks]
@@ -0,0 +1,154 @@
+"""OKX公共行情推送（tickers + K线频道，内存环形缓冲）"""
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .candle_store import BAR_MILLISECONDS, CandleRing
+from .kline_series import KlineSeries
+from .okx_ws import OKXWebSocket, OKX_WS_URLS
+
+
+class PublicMarketFeed:
+    """公共行情推送
+
+    - tickers频道（public地址）：内存里保存最新成交价
+    - candle{bar}频道（business地址）：已收盘K线写入环形缓冲，未收盘K线单独保存
+    推送健康时get_price/get_klines零网络请求；不健康时返回None，由调用方回退REST。
+    """
+
+    def __init__(self, symbol: str, bars: Iterable[str] = ('15m', '1H'), capacity: int = 300,
+                 simulated: bool = True, public_url: str = None, business_url: str = None):
+        """
+        :param symbol: 交易对
+        :param bars: 订阅的K线周期
+        :param capacity: 每个周期环形缓冲的容量
+        :param simulated: 是否模拟盘（决定默认地址）
+        :param public_url: tickers频道地址（默认OKX公共地址）
+        :param business_url: K线频道地址（默认OKX business地址）
+        """
+        urls = OKX_WS_URLS[simulated]
+        self.symbol = symbol
+        self.bars = list(bars)
+        self._rings: Dict[str, CandleRing] = {bar: CandleRing(capacity) for bar in self.bars}
+        self._forming: Dict[str, Optional[Tuple[int, Tuple[float, ...]]]] = {bar: None for bar in self.bars}
+        self._last_price: Optional[float] = None
+        self._price_at = 0.0
+        self._lock = threading.Lock()
+
+        self._public = OKXWebSocket(public_url or urls['public'], self._on_ticker, name='okx-ws-public')
+        self._public.subscribe({'channel': 'tickers', 'instId': symbol})
+        self._business = OKXWebSocket(business_url or urls['business'], self._on_candle, name='okx-ws-candles')
+        self._business.subscribe(*({'channel': f'candle{bar}', 'instId': symbol} for bar in self.bars))
+
+    def start(self):
+        """启动推送连接"""
+        self._public.start()
+        self._business.start()
+
+    def stop(self):
+        """停止推送连接"""
+        self._public.stop()
+        self._business.stop()
+
+    # ---------- 推送处理（后台线程） ----------
+
+    def _on_ticker(self, arg: Dict, data: List, message: Dict):
+        for ticker in data:
+            if ticker.get('instId') == self.symbol and ticker.get('last'):
+                with self._lock:
+                    self._last_price = float(ticker['last'])
+                    self._price_at = time.time()
+
+    def _on_candle(self, arg: Dict, data: List, message: Dict):
+        bar = arg.get('channel', '')[len('candle'):]
+        if bar not in self._rings:
+            return
+        ring = self._rings[bar]
+        with self._lock:
+            for row in data:
+                # [ts, o, h, l, c, vol, volCcy, volCcyQuote, confirm]
+                ts = int(row[0])
+                values = tuple(float(v) for v in row[1:6])
+                confirmed = len(row) > 8 and row[8] == '1'
+                forming = self._forming[bar]
+                if confirmed:
+                    ring.append(ts, values)
+                    if forming and forming[0] <= ts:
+                        self._forming[bar] = None
+                elif forming is None or ts >= forming[0]:
+                    self._forming[bar] = (ts, values)
+
+    # ---------- 读取（零网络请求） ----------
+
+    def is_healthy(self) -> bool:
+        """两条连接都在线且最近有消息"""
+        return self._public.is_healthy() and self._business.is_healthy()
+
+    def get_price(self, symbol: str, max_age: float = 5.0) -> Optional[float]:
+        """
+        最新成交价
+        :param max_age: 价格最长有效期（秒）
+        :return: 价格；推送不健康或价格过期时返回None
+        """
+        if symbol != self.symbol or not self._public.is_healthy():
+            return None
+        with self._lock:
+            if self._last_price is None or time.time() - self._price_at > max_age:
+                return None
+            return self._last_price
+
+    def get_klines(self, symbol: str, bar: str, limit: int, now_ms: int = None) -> Optional[KlineSeries]:
+        """
+        最近limit根K线（limit-1根已收盘 + 当前未收盘K线，与REST返回一致）
+        :return: K线序列；推送不健康、缓冲未预热或数据不连续时返回None
+        """
+        if symbol != self.symbol or bar not in self._rings or not self._business.is_healthy():
+            return None
+        step = BAR_MILLISECONDS[bar]
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        current_open = now_ms - now_ms % step
+
+        with self._lock:
+            ring = self._rings[bar]
+            forming = self._forming[bar]
+            # 必须已收到当前K线，且上一根已收盘K线紧挨着它
+            if forming is None or forming[0] != current_open:
+                return None
+            if ring.last_timestamp != current_open - step or len(ring) < limit - 1:
+                return None
+            closed = ring.to_series(limit - 1)
+            forming_series = KlineSeries(
+                np.array([forming[0]], dtype=np.int64),
+                *(np.array([v]) for v in forming[1])
+            )
+
+        if closed.find_gaps(step):
+            return None
+        return closed.merge(forming_series)
+
+    def seed(self, symbol: str, bar: str, klines: KlineSeries, now_ms: int = None) -> int:
+        """
+        用REST拉到的K线预热/修复环形缓冲（只写入已收盘的部分）
+        :return: 缓冲中K线数量的变化
+        """
+        if symbol != self.symbol or bar not in self._rings or not len(klines):
+            return 0
+        step = BAR_MILLISECONDS[bar]
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        current_open = now_ms - now_ms % step
+        closed = klines[:int(np.searchsorted(klines.timestamp, current_open))]
+        with self._lock:
+            ring = self._rings[bar]
+            before = len(ring)
+            # REST数据为准合并；推送断线期间漏掉的K线会形成缺口，只保留最后一个缺口之后的连续部分
+            merged = ring.to_series().merge(closed)
+            gaps = merged.find_gaps(step)
+            if gaps:
+                merged = merged[int(np.searchsorted(merged.timestamp, gaps[-1][1])):]
+            ring.clear()
+            ring.seed(merged)
+            return len(ring) - before
@@ -0,0 +1,182 @@
+"""OKX REST异步客户端（HTTP/1.1 keep-alive连接池 + 请求签名）"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import threading
+from datetime import datetime, timezone
+from typing import Coroutine, Dict, Optional
+from urllib.parse import urlencode
+
+import httpx
+
+
+OKX_API_URL = 'https://www.okx.com'
+
+
+class AsyncOKXClient:
+    """OKX REST异步客户端
+
+    只实现机器人用到的接口，方法名/参数名与python-okx保持一致，
+    返回OKX原始响应 {'code': '0', 'msg': '', 'data': [...]}。
+    网络异常直接抛出（由调用方的retry_on_error处理）。
+
+    注意：httpx的连接池绑定创建它的事件循环，一个客户端只在一个事件循环里使用。
+    """
+
+    def __init__(self, api_key: str, secret_key: str, passphrase: str, simulated: bool = True,
+                 base_url: str = OKX_API_URL, timeout: float = 10.0, max_connections: int = 10):
+        """
+        :param api_key: API Key
+        :param secret_key: Secret Key
+        :param passphrase: Passphrase
+        :param simulated: 是否使用模拟盘
+        :param base_url: REST地址（可指向本地模拟服务器）
+        :param timeout: 单次请求超时（秒）
+        :param max_connections: 连接池大小
+        """
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.passphrase = passphrase
+        self.simulated = simulated
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """懒创建连接池（必须在事件循环内创建）"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60,
+                ),
+            )
+        return self._client
+
+    def _headers(self, method: str, request_path: str, body: str) -> Dict[str, str]:
+        """签名请求头：Base64(HMAC-SHA256(timestamp + METHOD + requestPath + body))"""
+        headers = {
+            'Content-Type': 'application/json',
+            'x-simulated-trading': '1' if self.simulated else '0',
+        }
+        if not self.api_key:
+            return headers
+        timestamp = datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+        message = f"{timestamp}{method}{request_path}{body}"
+        sign = base64.b64encode(
+            hmac.new(self.secret_key.encode(), message.encode(), hashlib.sha256).digest()
+        ).decode()
+        headers.update({
+            'OK-ACCESS-KEY': self.api_key,
+            'OK-ACCESS-SIGN': sign,
+            'OK-ACCESS-TIMESTAMP': timestamp,
+            'OK-ACCESS-PASSPHRASE': self.passphrase,
+        })
+        return headers
+
+    async def request(self, method: str, path: str, params: Dict = None) -> Dict:
+        """
+        发送签名请求
+        :param method: GET/POST
+        :param path: 接口路径，如 /api/v5/account/balance
+        :param params: GET为查询参数，POST为JSON body（空值会被忽略）
+        :return: OKX原始响应
+        """
+        params = {k: v for k, v in (params or {}).items() if v is not None and v != ''}
+        if method == 'GET':
+            request_path = f"{path}?{urlencode(params)}" if params else path
+            body = ''
+        else:
+            request_path = path
+            body = json.dumps(params)
+
+        response = await self._get_client().request(
+            method, request_path,
+            content=body or None,
+            headers=self._headers(method, request_path, body),
+        )
+        return response.json()
+
+    # ---------- 账户 ----------
+
+    async def get_account_balance(self, ccy: str = '') -> Dict:
+        """GET /api/v5/account/balance"""
+        return await self.request('GET', '/api/v5/account/balance', {'ccy': ccy})
+
+    # ---------- 行情 ----------
+
+    async def get_ticker(self, instId: str) -> Dict:
+        """GET /api/v5/market/ticker"""
+        return await self.request('GET', '/api/v5/market/ticker', {'instId': instId})
+
+    async def get_candlesticks(self, instId: str, after: str = '', before: str = '',
+                               bar: str = '', limit: str = '') -> Dict:
+        """GET /api/v5/market/candles"""
+        return await self.request('GET', '/api/v5/market/candles', {
+            'instId': instId, 'after': after, 'before': before, 'bar': bar, 'limit': limit
+        })
+
+    async def get_history_candlesticks(self, instId: str, after: str = '', before: str = '',
+                                       bar: str = '', limit: str = '') -> Dict:
+        """GET /api/v5/market/history-candles（可翻页到数年前的历史K线）"""
+        return await self.request('GET', '/api/v5/market/history-candles', {
+            'instId': instId, 'after': after, 'before': before, 'bar': bar, 'limit': limit
+        })
+
+    # ---------- 交易 ----------
+
+    async def get_fills_history(self, instType: str, instId: str = '', after: str = '',
+                                before: str = '', limit: str = '') -> Dict:
+        """GET /api/v5/trade/fills-history"""
+        return await self.request('GET', '/api/v5/trade/fills-history', {
+            'instType': instType, 'instId': instId, 'after': after, 'before': before, 'limit': limit
+        })
+
+    async def place_order(self, instId: str, tdMode: str, side: str, ordType: str, sz: str,
+                          tgtCcy: str = '', clOrdId: str = '', px: str = '') -> Dict:
+        """POST /api/v5/trade/order"""
+        return await self.request('POST', '/api/v5/trade/order', {
+            'instId': instId, 'tdMode': tdMode, 'side': side, 'ordType': ordType, 'sz': sz,
+            'tgtCcy': tgtCcy, 'clOrdId': clOrdId, 'px': px
+        })
+
+    async def get_order(self, instId: str, ordId: str = '', clOrdId: str = '') -> Dict:
+        """GET /api/v5/trade/order"""
+        return await self.request('GET', '/api/v5/trade/order', {
+            'instId': instId, 'ordId': ordId, 'clOrdId': clOrdId
+        })
+
+    async def aclose(self):
+        """关闭连接池"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class EventLoopThread:
+    """后台事件循环线程：让同步代码（多个线程）调用异步客户端"""
+
+    def __init__(self, name: str = 'okx-client'):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def run(self, coro: Coroutine, timeout: float = None):
+        """在后台循环中执行协程并阻塞等待结果（线程安全）"""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except Exception:
+            future.cancel()
+            raise
+
+    def stop(self):
+        """停止事件循环"""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
@@ -0,0 +1,166 @@
+"""OKX WebSocket连接（后台事件循环 + 自动重连/重订阅 + 心跳）"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import websockets
+
+from .okx_client import EventLoopThread
+
+
+# OKX WebSocket地址（模拟盘使用wspap域名）
+OKX_WS_URLS = {
+    False: {
+        'public': 'wss://ws.okx.com:8443/ws/v5/public',
+        'private': 'wss://ws.okx.com:8443/ws/v5/private',
+        'business': 'wss://ws.okx.com:8443/ws/v5/business',
+    },
+    True: {
+        'public': 'wss://wspap.okx.com:8443/ws/v5/public',
+        'private': 'wss://wspap.okx.com:8443/ws/v5/private',
+        'business': 'wss://wspap.okx.com:8443/ws/v5/business',
+    },
+}
+
+
+class OKXWebSocket:
+    """单条OKX WebSocket连接
+
+    - 在自己的后台事件循环线程里运行，断线后指数退避重连并重新订阅
+    - 超过PING_INTERVAL秒没有收到消息就发送'ping'，再等不到任何消息则判定断线
+    - 配置了credentials时，连接后先登录再订阅（私有频道）
+    - 推送数据交给handler(arg, data, message)处理（在后台线程中调用）
+    """
+
+    PING_INTERVAL = 20      # OKX: 30秒内无消息会断开连接
+    MAX_BACKOFF = 30
+
+    def __init__(self, url: str, handler: Callable[[Dict, List, Dict], None], name: str = 'okx-ws',
+                 credentials: Tuple[str, str, str] = None):
+        """
+        :param url: WebSocket地址
+        :param handler: 推送数据回调 handler(arg, data, message)
+        :param name: 线程名（日志用）
+        :param credentials: (api_key, secret_key, passphrase)，私有频道需要
+        """
+        self.url = url
+        self.handler = handler
+        self.name = name
+        self.credentials = credentials
+        self.subscriptions: List[Dict] = []
+        self.connected = False
+        self.last_message_at = 0.0
+        self.reconnects = 0
+        self._loop: Optional[EventLoopThread] = None
+        self._current_task = None
+        self._stopping = False
+
+    def subscribe(self, *args: Dict):
+        """添加订阅（连接前调用；重连时会自动重新订阅）"""
+        self.subscriptions.extend(args)
+
+    def start(self):
+        """启动后台连接"""
+        if self._loop is not None:
+            return
+        self._stopping = False
+        self._loop = EventLoopThread(name=self.name)
+        asyncio.run_coroutine_threadsafe(self._run_forever(), self._loop.loop)
+
+    def stop(self):
+        """断开连接并停止后台线程"""
+        self._stopping = True
+        if self._loop is not None:
+            try:
+                self._loop.run(self._cancel(), timeout=5)
+            except Exception:
+                pass
+            self._loop.stop()
+            self._loop = None
+        self.connected = False
+
+    async def _cancel(self):
+        """取消连接任务（在后台循环中执行）"""
+        task = self._current_task
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def is_healthy(self, max_silence: float = None) -> bool:
+        """已连接且最近max_silence秒内收到过消息"""
+        if max_silence is None:
+            max_silence = self.PING_INTERVAL * 2
+        return self.connected and time.time() - self.last_message_at <= max_silence
+
+    async def _run_forever(self):
+        """连接循环：断线后指数退避重连"""
+        self._current_task = asyncio.current_task()
+        backoff = 1
+        while not self._stopping:
+            try:
+                async with websockets.connect(self.url, ping_interval=None, close_timeout=2) as ws:
+                    if self.credentials:
+                        await self._login(ws)
+                    if self.subscriptions:
+                        await ws.send(json.dumps({'op': 'subscribe', 'args': self.subscriptions}))
+                    self.connected = True
+                    self.last_message_at = time.time()
+                    backoff = 1
+                    await self._read_loop(ws)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"  ⚠️ {self.name} WebSocket断开: {str(e)[:80]}")
+            finally:
+                self.connected = False
+
+            if self._stopping:
+                break
+            self.reconnects += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.MAX_BACKOFF)
+
+    async def _login(self, ws):
+        """私有频道登录：sign = Base64(HMAC-SHA256(timestamp + 'GET' + '/users/self/verify'))"""
+        api_key, secret_key, passphrase = self.credentials
+        timestamp = str(int(time.time()))
+        sign = base64.b64encode(
+            hmac.new(secret_key.encode(), f"{timestamp}GET/users/self/verify".encode(), hashlib.sha256).digest()
+        ).decode()
+        await ws.send(json.dumps({'op': 'login', 'args': [{
+            'apiKey': api_key, 'passphrase': passphrase, 'timestamp': timestamp, 'sign': sign
+        }]}))
+        reply = json.loads(await asyncio.wait_for(ws.recv(), timeout=10))
+        if reply.get('event') != 'login' or reply.get('code') not in ('0', 0):
+            raise ConnectionError(f"登录失败: {reply.get('msg') or reply}")
+
+    async def _read_loop(self, ws):
+        """读消息；空闲时发送心跳ping"""
+        awaiting_pong = False
+        while True:
+            try:
+                raw = await asyncio.wait_for(ws.recv(), timeout=self.PING_INTERVAL)
+            except asyncio.TimeoutError:
+                if awaiting_pong:
+                    raise ConnectionError('心跳超时')
+                await ws.send('ping')
+                awaiting_pong = True
+                continue
+
+            awaiting_pong = False
+            self.last_message_at = time.time()
+            if raw == 'pong':
+                continue
+
+            message = json.loads(raw)
+            if message.get('event') == 'error':
+                print(f"  ⚠️ {self.name} WebSocket错误: {message.get('msg')} (code: {message.get('code')})")
+            elif 'data' in message:
+                try:
+                    self.handler(message.get('arg', {}), message['data'], message)
+                except Exception as e:
+                    print(f"  ⚠️ {self.name} 处理推送失败: {e}")
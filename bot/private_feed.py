@@ -0,0 +1,129 @@
+"""OKX私有频道推送（订单状态 + 账户余额，内存缓存）"""
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .okx_ws import OKXWebSocket, OKX_WS_URLS
+
+
+# 订单终态
+TERMINAL_ORDER_STATES = ('filled', 'canceled', 'mmp_canceled')
+
+
+class PrivateAccountFeed:
+    """私有频道推送
+
+    登录后订阅orders(SPOT)和account频道：
+    - 订单状态按ordId缓存，下单方可以等待终态推送，不必sleep后轮询
+    - 余额按币种缓存，成交后直接读推送的新余额，不必再请求REST
+    """
+
+    def __init__(self, api_key: str, secret_key: str, passphrase: str, symbol: str = None,
+                 simulated: bool = True, url: str = None, max_orders: int = 200):
+        """
+        :param api_key/secret_key/passphrase: API凭证（登录用）
+        :param symbol: 只订阅该交易对的订单（None=全部现货）
+        :param simulated: 是否模拟盘（决定默认地址）
+        :param url: 私有频道地址（默认OKX私有地址）
+        :param max_orders: 订单缓存上限
+        """
+        self.max_orders = max_orders
+        self._orders: Dict[str, Dict] = {}
+        self._cl_ord_ids: Dict[str, str] = {}
+        self._balances: Dict[str, float] = {}
+        self._balance_at = 0.0
+        self._cond = threading.Condition()
+
+        self._ws = OKXWebSocket(
+            url or OKX_WS_URLS[simulated]['private'], self._on_message,
+            name='okx-ws-private', credentials=(api_key, secret_key, passphrase)
+        )
+        orders_arg = {'channel': 'orders', 'instType': 'SPOT'}
+        if symbol:
+            orders_arg['instId'] = symbol
+        self._ws.subscribe(orders_arg, {'channel': 'account'})
+
+    def start(self):
+        """启动推送连接"""
+        self._ws.start()
+
+    def stop(self):
+        """停止推送连接"""
+        self._ws.stop()
+
+    def is_healthy(self) -> bool:
+        """连接在线且最近有消息（心跳也算）"""
+        return self._ws.is_healthy()
+
+    # ---------- 推送处理（后台线程） ----------
+
+    def _on_message(self, arg: Dict, data: List, message: Dict):
+        channel = arg.get('channel')
+        with self._cond:
+            if channel == 'orders':
+                for order in data:
+                    self._orders[order['ordId']] = dict(order, received_at=time.time())
+                    if order.get('clOrdId'):
+                        self._cl_ord_ids[order['clOrdId']] = order['ordId']
+                self._trim_orders()
+            elif channel == 'account':
+                for account in data:
+                    for detail in account.get('details', []):
+                        self._balances[detail.get('ccy')] = float(detail.get('availBal') or 0)
+                self._balance_at = time.time()
+            self._cond.notify_all()
+
+    def _trim_orders(self):
+        """订单缓存超过上限时丢弃最早的（dict保持插入顺序）"""
+        while len(self._orders) > self.max_orders:
+            ord_id = next(iter(self._orders))
+            order = self._orders.pop(ord_id)
+            self._cl_ord_ids.pop(order.get('clOrdId'), None)
+
+    # ---------- 读取 ----------
+
+    def get_order(self, ord_id: str = None, cl_ord_id: str = None) -> Optional[Dict]:
+        """缓存中的最新订单状态（OKX orders频道原始字段）"""
+        with self._cond:
+            if ord_id is None and cl_ord_id is not None:
+                ord_id = self._cl_ord_ids.get(cl_ord_id)
+            return self._orders.get(ord_id) if ord_id else None
+
+    def wait_for_order(self, ord_id: str, timeout: float = 5.0) -> Optional[Dict]:
+        """
+        等待订单进入终态（filled/canceled）
+        :return: 终态订单；超时或连接不健康时返回None（调用方回退REST）
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._ws.is_healthy():
+                order = self._orders.get(ord_id)
+                if order and order.get('state') in TERMINAL_ORDER_STATES:
+                    return order
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(min(remaining, 0.5))
+            return None
+
+    def get_balance(self, min_time: float = None, timeout: float = 2.0) -> Optional[Dict]:
+        """
+        推送缓存的可用余额（格式与OKXTrader.get_balance一致）
+        :param min_time: 要求余额更新时间不早于该时间（time.time()，下单后传下单时间）
+        :param timeout: 等待新余额推送的最长时间
+        :return: 余额；没有足够新的推送或连接不健康时返回None
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._ws.is_healthy():
+                if self._balance_at and (min_time is None or self._balance_at >= min_time):
+                    return {
+                        'success': True,
+                        'usdt': self._balances.get('USDT', 0),
+                        'btc': self._balances.get('BTC', 0)
+                    }
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(min(remaining, 0.5))
+            return None
@@ -0,0 +1,86 @@
+"""机器人状态快照（共享data目录下的JSON文件，写临时文件后os.replace原子替换）"""
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+
+class SnapshotPublisher:
+    """快照发布方（机器人进程）
+
+    每次发布把新字段合并进上一版快照，version加1后整体写入临时文件，再原子替换目标文件，
+    读取方永远只会看到完整的某一版。
+    """
+
+    SCHEMA = 1
+
+    def __init__(self, path: str):
+        """
+        :param path: 快照文件路径（放在机器人和面板共享的data目录）
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        # 重启后版本号接着上一版递增
+        previous = read_snapshot(path) or {}
+        self.version = previous.get('version', 0)
+        self._state = {k: v for k, v in previous.items() if k not in ('schema', 'version', 'published_at')}
+
+    def publish(self, **fields) -> int:
+        """
+        合并字段并发布新版本
+        :return: 新版本号
+        """
+        with self._lock:
+            self._state.update(fields)
+            self.version += 1
+            document = dict(self._state, schema=self.SCHEMA, version=self.version, published_at=time.time())
+
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(document, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            return self.version
+
+
+class SnapshotReader:
+    """快照读取方（面板进程）：文件未变化时直接返回缓存，只需一次stat"""
+
+    def __init__(self, path: str):
+        """
+        :param path: 快照文件路径
+        """
+        self.path = path
+        # (文件标识, 快照)一起替换，多线程读取时不会出现标识和内容对不上
+        self._cached = (None, None)
+
+    def read(self) -> Optional[Dict]:
+        """
+        :return: 最新快照；机器人还没发布过时返回None
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        # os.replace后inode会变，加上mtime/size足以判断是否换了新版本
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        cached_key, snapshot = self._cached
+        if key != cached_key:
+            fresh = read_snapshot(self.path)
+            if fresh is None:
+                return snapshot
+            self._cached = (key, fresh)
+            snapshot = fresh
+        return snapshot
+
+
+def read_snapshot(path: str) -> Optional[Dict]:
+    """读取快照文件（不存在或损坏时返回None）"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
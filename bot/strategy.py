@@ -1,5 +1,5 @@
 """交易策略"""
-from typing import Optional
+from typing import Dict, Optional
 
 
 class TradingStrategy:
@@ -28,3 +28,76 @@ class TradingStrategy:
         self.last_buy_price = None
         self.last_trade_amount = None
         self.position_opened = False
+
+
+# OKX BTC-USDT最小下单量
+MIN_ORDER_BTC = 0.00001
+# 买入最多用掉的USDT比例（留5%余量给滑点和手续费）
+BUY_BALANCE_RATIO = 0.95
+
+
+def plan_trade(analysis: Dict, price: float, usdt: float, btc: float, min_confidence: float,
+               min_btc: float = MIN_ORDER_BTC, balance_ratio: float = BUY_BALANCE_RATIO) -> Dict:
+    """
+    把AI决策换算成下单参数（实盘run_once和回测共用同一套规则）
+    :param analysis: analyze_market返回值（action/confidence/suggested_usdt/suggested_amount）
+    :param price: 当前价格
+    :param usdt: 可用USDT
+    :param btc: 可用BTC
+    :param min_confidence: 最低信心阈值
+    :param min_btc: 最小下单量（BTC）
+    :param balance_ratio: 买入最多使用的USDT比例
+    :return: {'action': 'BUY'/'SELL'/None（不下单）, 'usdt': 买入金额, 'amount': 卖出数量,
+              'suggested_usdt': AI建议买入金额, 'messages': [(级别warning/error, 提示), ...]}
+    """
+    action = analysis.get('action')
+    plan = {'action': None, 'usdt': 0.0, 'amount': 0.0, 'suggested_usdt': 0.0, 'messages': []}
+    if action not in ('BUY', 'SELL'):
+        return plan
+
+    confidence = analysis.get('confidence', 0)
+    if confidence < min_confidence:
+        plan['messages'].append(('warning', f"⚠️ AI建议{action}但信心不足({confidence}% < {min_confidence}%)，跳过"))
+        return plan
+
+    if action == 'BUY':
+        # 获取AI建议的USDT金额（兼容旧格式suggested_amount）
+        if 'suggested_usdt' in analysis:
+            suggested_usdt = analysis['suggested_usdt']
+        elif 'suggested_amount' in analysis:
+            # 兼容旧格式：如果AI输出的是suggested_amount（BTC），转换为USDT
+            suggested_usdt = analysis['suggested_amount'] * price
+            plan['messages'].append((
+                'warning',
+                f"⚠️ AI使用旧格式(suggested_amount={analysis['suggested_amount']:.8f} BTC)，已转换为${suggested_usdt:.2f} USDT"
+            ))
+        else:
+            plan['messages'].append(('error', "❌ AI建议买入但没有提供交易参数（需要suggested_usdt或suggested_amount）"))
+            return plan
+
+        # 根据余额限制计算实际交易金额
+        actual_usdt = min(suggested_usdt, usdt * balance_ratio)
+        plan['suggested_usdt'] = suggested_usdt
+
+        # 检查是否满足OKX最小交易量对应的USDT金额（约0.9-1 USDT，随BTC价格浮动）
+        min_usdt_value = min_btc * price
+        if actual_usdt < min_usdt_value:
+            plan['messages'].append(('warning', f"⚠️ 交易金额太小(${actual_usdt:.2f} < ${min_usdt_value})，跳过买入"))
+            return plan
+
+        # 检查余额是否充足
+        if usdt < actual_usdt:
+            plan['messages'].append(('warning', f"⚠️ USDT余额不足: 需要${actual_usdt:.2f}, 实际${usdt:.2f}，跳过买入"))
+            return plan
+
+        plan.update(action='BUY', usdt=actual_usdt)
+        return plan
+
+    # SELL：交易量必须由AI给出，不超过持仓
+    if 'suggested_amount' not in analysis:
+        return plan
+    actual_amount = min(analysis['suggested_amount'], btc)
+    if actual_amount < min_btc:
+        return plan
+    plan.update(action='SELL', amount=actual_amount)
+    return plan
@@ -0,0 +1,238 @@
+"""回测参数扫描（多进程）
+
+K线写成每列一个.npy文件，工作进程用内存映射只读打开（各进程共享操作系统页缓存，不用把K线pickle给每个任务）；
+参数网格的每个组合是一个任务，结果边完成边追加到CSV，最后按收益、回撤、交易次数排名。
+
+用法:
+    python -m bot.sweep --candles data/BTC-USDT_15m.csv \\
+        --grid min_confidence=50,60,70 balance_ratio=0.5,0.95 fast=6,12,24 slow=48,96
+"""
+import argparse
+import csv
+import itertools
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .backtest import Backtester, RecordedDecisionProvider, RuleBasedProvider, load_candles
+from .kline_series import KlineSeries
+
+
+# 各决策来源自己的参数，其余参数传给Backtester
+PROVIDER_PARAMS = {
+    'rule': ('fast', 'slow', 'confidence'),
+    'recorded': (),
+}
+BACKTEST_PARAMS = ('usdt', 'btc', 'min_confidence', 'balance_ratio', 'min_trade_btc',
+                   'fee_rate', 'slippage_bps', 'impact')
+INT_PARAMS = ('fast', 'slow')
+
+# 结果表的指标列
+RESULT_COLUMNS = ('pnl', 'total_return_pct', 'max_drawdown_pct', 'trades', 'win_rate', 'sharpe',
+                  'realized_pnl', 'total_fees', 'exposure_pct', 'elapsed')
+
+
+# ---------- 共享K线 ----------
+
+def share_candles(klines: KlineSeries, directory: str):
+    """把K线按列写成.npy（供工作进程内存映射）"""
+    for name in KlineSeries.__slots__:
+        np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(getattr(klines, name)))
+
+
+def map_candles(directory: str) -> KlineSeries:
+    """以只读内存映射打开share_candles写出的K线"""
+    return KlineSeries(*(np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+                         for name in KlineSeries.__slots__))
+
+
+# ---------- 参数网格 ----------
+
+def parse_grid(items: Iterable[str]) -> Dict[str, List]:
+    """
+    解析 name=v1,v2,... 形式的参数
+    :return: {参数名: [取值, ...]}
+    """
+    grid = {}
+    for item in items:
+        name, _, values = item.partition('=')
+        name = name.strip()
+        if not values:
+            raise ValueError(f"参数格式应为 name=v1,v2,...: {item}")
+        cast = int if name in INT_PARAMS else float
+        grid[name] = [cast(value) for value in values.split(',') if value.strip()]
+    return grid
+
+
+def expand_grid(grid: Dict[str, List]) -> List[Dict]:
+    """参数网格的全部组合（rule来源跳过fast>=slow的无效组合）"""
+    names = list(grid)
+    combos = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    return [params for params in combos if params.get('fast', 0) < params.get('slow', float('inf'))]
+
+
+# ---------- 工作进程 ----------
+
+_worker = {}
+
+
+def _init_worker(candle_dir: str, provider: str, bar: str, decisions: Optional[List[Tuple[int, Dict]]]):
+    """工作进程初始化：映射K线（只做一次，任务只传参数字典）"""
+    _worker.update(klines=map_candles(candle_dir), provider=provider, bar=bar, decisions=decisions)
+
+
+def run_one(params: Dict) -> Dict:
+    """在工作进程里跑一组参数，返回 参数 + 指标"""
+    provider_kwargs = {k: v for k, v in params.items() if k in PROVIDER_PARAMS[_worker['provider']]}
+    backtest_kwargs = {k: v for k, v in params.items() if k in BACKTEST_PARAMS}
+    if _worker['provider'] == 'rule':
+        provider = RuleBasedProvider(**provider_kwargs)
+    else:
+        provider = RecordedDecisionProvider(_worker['decisions'])
+
+    result = Backtester(_worker['klines'], provider, bar=_worker['bar'], **backtest_kwargs).run()
+    m = result.metrics
+    return dict(
+        params,
+        pnl=m['end_equity'] - m['start_equity'],
+        total_return_pct=m['total_return_pct'],
+        max_drawdown_pct=m['max_drawdown_pct'],
+        trades=len(result.trades),
+        win_rate=m['win_rate'],
+        sharpe=m['sharpe'],
+        realized_pnl=m['realized_pnl'],
+        total_fees=m['total_fees'],
+        exposure_pct=m['exposure_pct'],
+        elapsed=result.elapsed,
+    )
+
+
+def rank_results(rows: List[Dict]) -> List[Dict]:
+    """排名：收益高优先，其次回撤小，再次交易次数少"""
+    return sorted(rows, key=lambda row: (-row['pnl'], -row['max_drawdown_pct'], row['trades']))
+
+
+class SweepRunner:
+    """参数扫描
+
+    K线只在父进程写一次.npy，工作进程初始化时内存映射；每个任务只传一个参数字典、返回一行指标，
+    进程间没有大对象传输，任务之间互不依赖，吞吐随CPU核数近似线性增长。
+    """
+
+    def __init__(self, klines: KlineSeries, provider: str = 'rule', bar: str = '15m',
+                 decisions: Optional[List[Tuple[int, Dict]]] = None, workers: int = 0):
+        """
+        :param klines: 回测K线
+        :param provider: 决策来源 rule/recorded
+        :param bar: K线周期
+        :param decisions: recorded来源的决策列表 [(毫秒时间戳, 决策), ...]
+        :param workers: 进程数（0=CPU核数）
+        """
+        if provider not in PROVIDER_PARAMS:
+            raise ValueError(f"参数扫描不支持的决策来源: {provider}")
+        self.klines = klines
+        self.provider = provider
+        self.bar = bar
+        self.decisions = decisions
+        self.workers = workers or os.cpu_count() or 1
+
+    def run(self, combos: List[Dict], output: Optional[str] = None, progress: bool = True) -> List[Dict]:
+        """
+        并行执行全部参数组合
+        :param combos: 参数字典列表
+        :param output: 结果CSV路径（完成一组追加一行，结束后按排名重写）
+        :param progress: 是否打印进度
+        :return: 排好序的结果
+        """
+        columns = list(dict.fromkeys(name for params in combos for name in params)) + list(RESULT_COLUMNS)
+        rows = []
+        started = time.perf_counter()
+        candle_dir = tempfile.mkdtemp(prefix='sweep-candles-')
+        out = open(output, 'w', newline='', encoding='utf-8') if output else None
+        try:
+            share_candles(self.klines, candle_dir)
+            writer = csv.DictWriter(out, fieldnames=columns) if out else None
+            if writer:
+                writer.writeheader()
+            with ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                     initargs=(candle_dir, self.provider, self.bar, self.decisions)) as pool:
+                futures = [pool.submit(run_one, params) for params in combos]
+                for done, future in enumerate(as_completed(futures), 1):
+                    row = future.result()
+                    rows.append(row)
+                    if writer:
+                        writer.writerow(row)
+                        out.flush()
+                    if progress:
+                        print(f"\r⏳ {done}/{len(combos)}  {time.perf_counter() - started:.1f}s", end='', flush=True)
+            if progress:
+                print()
+        finally:
+            if out:
+                out.close()
+            shutil.rmtree(candle_dir, ignore_errors=True)
+
+        ranked = rank_results(rows)
+        if output:
+            with open(output, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=['rank'] + columns)
+                writer.writeheader()
+                writer.writerows(dict(row, rank=i) for i, row in enumerate(ranked, 1))
+        return ranked
+
+
+def format_table(rows: List[Dict], limit: int = 20) -> str:
+    """排名前limit的结果表"""
+    if not rows:
+        return '(无结果)'
+    params = [name for name in rows[0] if name not in RESULT_COLUMNS]
+    header = ['#'] + params + ['收益$', '收益%', '回撤%', '交易', '胜率%', '夏普']
+    lines = ['  '.join(f'{h:>10}' for h in header)]
+    for rank, row in enumerate(rows[:limit], 1):
+        cells = [rank] + [row[name] for name in params] + [
+            f"{row['pnl']:+.2f}", f"{row['total_return_pct']:+.2f}", f"{row['max_drawdown_pct']:.2f}",
+            row['trades'], f"{row['win_rate']:.1f}", f"{row['sharpe']:.2f}"]
+        lines.append('  '.join(f'{cell:>10}' for cell in cells))
+    return '\n'.join(lines)
+
+
+def main():
+    """命令行入口: python -m bot.sweep --candles FILE --grid name=v1,v2 ..."""
+    parser = argparse.ArgumentParser(description='回测参数扫描（多进程）')
+    parser.add_argument('--candles', required=True, help='K线文件（OKX格式CSV、.npz或K线归档.candles）')
+    parser.add_argument('--bar', default='15m', help='K线周期（默认15m）')
+    parser.add_argument('--provider', choices=tuple(PROVIDER_PARAMS), default='rule', help='决策来源')
+    parser.add_argument('--grid', nargs='+', required=True,
+                        help=f"参数网格 name=v1,v2,...；可用参数: {', '.join(BACKTEST_PARAMS + PROVIDER_PARAMS['rule'])}")
+    parser.add_argument('--workers', type=int, default=0, help='进程数（默认CPU核数）')
+    parser.add_argument('--output', default='sweep_results.csv', help='结果CSV')
+    parser.add_argument('--top', type=int, default=20, help='显示前N名')
+    args = parser.parse_args()
+
+    grid = parse_grid(args.grid)
+    unknown = set(grid) - set(BACKTEST_PARAMS) - set(PROVIDER_PARAMS[args.provider])
+    if unknown:
+        parser.error(f"未知参数: {', '.join(sorted(unknown))}")
+
+    decisions = None
+    if args.provider == 'recorded':
+        from config import Config
+        from .database import Database
+        decisions = RecordedDecisionProvider.from_database(Database(Config.DATABASE_PATH)).decisions
+
+    combos = expand_grid(grid)
+    runner = SweepRunner(load_candles(args.candles), args.provider, args.bar, decisions, args.workers)
+    print(f"🔍 {len(combos)}组参数，{runner.workers}个进程，{len(runner.klines):,}根K线")
+    started = time.perf_counter()
+    ranked = runner.run(combos, args.output)
+    print(f"✓ 完成，耗时{time.perf_counter() - started:.1f}s，结果已写入 {args.output}\n")
+    print(format_table(ranked, args.top))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,20 @@
 """OKX交易执行器"""
-import okx.Account as Account
-import okx.MarketData as MarketData
-import okx.Trade as Trade
 from typing import Dict, Optional, List
 import time
-import pandas as pd
+import threading
+import hashlib
+import random
+import uuid
 import urllib3
 from functools import wraps
 import os
 
+from .candle_store import CandleStore
+from .cost_basis import CostBasisEngine
+from .okx_client import AsyncOKXClient, EventLoopThread, OKX_API_URL
+from .private_feed import TERMINAL_ORDER_STATES
+from .kline_series import KlineSeries
+
 # 禁用SSL警告（仅用于测试，生产环境不建议）
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -33,10 +39,163 @@ def retry_on_error(max_retries=3, delay=2):
     return decorator
 
 
+def make_client_order_id(symbol: str, side: str, decision_key: str = None) -> str:
+    """
+    生成客户端订单ID（clOrdId）
+    同一交易对、方向、决策标识始终得到同一个ID，OKX据此识别重复提交
+    :param symbol: 交易对
+    :param side: buy/sell
+    :param decision_key: 决策标识（如本轮K线时间戳）；为None时随机生成（只在本次调用的重试间保持不变）
+    :return: 字母数字组成、不超过32位的clOrdId
+    """
+    if decision_key is None:
+        decision_key = uuid.uuid4().hex
+    digest = hashlib.sha256(f"{symbol}|{side}|{decision_key}".encode()).hexdigest()
+    return f"ai{side[0]}{digest[:28]}"
+
+
+# OKX文档中的接口限速：分组 -> (请求数, 时间窗口秒)
+OKX_RATE_LIMITS = {
+    'balance': (10, 2),      # GET /api/v5/account/balance
+    'ticker': (20, 2),       # GET /api/v5/market/ticker
+    'candles': (40, 2),      # GET /api/v5/market/candles
+    'history_candles': (20, 2),  # GET /api/v5/market/history-candles
+    'fills': (10, 2),        # GET /api/v5/trade/fills-history
+    'order': (60, 2),        # POST /api/v5/trade/order（撤单接口同样60次/2秒）
+    'order_info': (60, 2),   # GET /api/v5/trade/order
+}
+
+
+class TokenBucket:
+    """令牌桶：容量capacity，每period秒补满
+
+    priority=True的请求是优先通道：有优先请求在等待时，普通请求让出令牌。
+    """
+    
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._priority_waiting = 0
+        self._cond = threading.Condition()
+        
+        # 等待统计
+        self.requests = 0
+        self.waited = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+    
+    def acquire(self, priority: bool = False) -> float:
+        """
+        取一个令牌（令牌不足时在调用线程里阻塞等待）
+        :param priority: 是否走优先通道（下单/撤单）
+        :return: 等待时间（秒）
+        """
+        started = time.monotonic()
+        with self._cond:
+            if priority:
+                self._priority_waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1 and (priority or not self._priority_waiting):
+                        self.tokens -= 1
+                        break
+                    # 等到补出下一个令牌（让给优先请求时等它取完后的通知）
+                    self._cond.wait(max((1 - self.tokens) / self.rate, 0.01))
+            finally:
+                if priority:
+                    self._priority_waiting -= 1
+                    self._cond.notify_all()
+            
+            waited = time.monotonic() - started
+            self.requests += 1
+            if waited > 0.001:
+                self.waited += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+        return waited
+    
+    def stats(self) -> Dict:
+        """等待统计"""
+        with self._cond:
+            return {
+                'requests': self.requests,
+                'waited': self.waited,
+                'wait_total': self.wait_total,
+                'wait_max': self.wait_max,
+                'wait_avg': self.wait_total / self.requests if self.requests else 0.0
+            }
+
+
+class RateLimiter:
+    """进程级OKX限速器：每个接口分组一个令牌桶，在发请求的线程里取令牌"""
+    
+    def __init__(self, limits: Dict[str, tuple] = None):
+        """
+        :param limits: 分组 -> (请求数, 时间窗口秒)，默认OKX_RATE_LIMITS
+        """
+        self.buckets = {
+            group: TokenBucket(capacity, period)
+            for group, (capacity, period) in (limits or OKX_RATE_LIMITS).items()
+        }
+    
+    def acquire(self, group: str, priority: bool = False) -> float:
+        """
+        取分组的一个令牌
+        :return: 等待时间（秒）；未配置的分组不限速
+        """
+        bucket = self.buckets.get(group)
+        return bucket.acquire(priority) if bucket else 0.0
+    
+    def stats(self) -> Dict[str, Dict]:
+        """各分组的等待统计"""
+        return {group: bucket.stats() for group, bucket in self.buckets.items()}
+    
+    def report(self) -> str:
+        """有过等待的分组的统计摘要，如 'balance 3/40次 平均12ms 最长250ms'"""
+        parts = []
+        for group, stat in self.stats().items():
+            if stat['waited']:
+                parts.append(
+                    f"{group} {stat['waited']}/{stat['requests']}次 "
+                    f"平均{stat['wait_total'] / stat['waited'] * 1000:.0f}ms 最长{stat['wait_max'] * 1000:.0f}ms"
+                )
+        return '限速等待: ' + ('，'.join(parts) if parts else '无')
+
+
+# 同一进程内所有OKXTrader共享（OKX按账户/IP计数）
+RATE_LIMITER = RateLimiter()
+
+
 class OKXTrader:
     """OKX交易执行器"""
     
-    def __init__(self, api_key: str, secret_key: str, passphrase: str, simulated: bool = True, use_proxy: bool = False, proxy_url: str = None):
+    # 多时间周期K线配置（针对短期交易优化）
+    MULTI_TIMEFRAMES = [
+        ('15m', 30),  # 15分钟, 30根(约7.5小时)
+        ('1H', 24),   # 1小时, 24根(1天)
+    ]
+    
+    # 订单成交轮询的退避间隔（秒）：50ms起翻倍，最多1秒
+    ORDER_POLL_INITIAL_DELAY = 0.05
+    ORDER_POLL_MAX_DELAY = 1.0
+    
+    # 下单重试：短超时 + 抖动退避（100ms起翻倍，×0.5~1.5随机），重试前先按clOrdId核对
+    ORDER_SUBMIT_RETRIES = 3
+    ORDER_REQUEST_TIMEOUT = 3.0
+    ORDER_RETRY_BASE_DELAY = 0.1
+    
+    # OKX错误码
+    DUPLICATE_CL_ORD_ID = '51016'
+    ORDER_NOT_EXIST = '51603'
+    
+    def __init__(self, api_key: str, secret_key: str, passphrase: str, simulated: bool = True, use_proxy: bool = False, proxy_url: str = None,
+                 base_url: str = OKX_API_URL, db=None, order_wait_timeout: float = 5.0,
+                 rate_limiter: RateLimiter = None):
         """
         初始化
         :param api_key: API Key
@@ -45,11 +204,16 @@ class OKXTrader:
         :param simulated: 是否使用模拟盘
         :param use_proxy: 是否使用代理
         :param proxy_url: 代理地址
+        :param base_url: OKX REST地址
+        :param db: Database，用于持久化持仓成本引擎（为None时只在内存中维护）
+        :param order_wait_timeout: 等待市价单成交的最长时间（秒）
+        :param rate_limiter: 接口限速器（默认进程共享的RATE_LIMITER）
         """
         self.api_key = api_key
         self.secret_key = secret_key
         self.passphrase = passphrase
         self.simulated = simulated
+        self.order_wait_timeout = order_wait_timeout
         
         # 设置代理（通过环境变量）
         if use_proxy and proxy_url:
@@ -57,17 +221,64 @@ class OKXTrader:
             os.environ['HTTPS_PROXY'] = proxy_url
             print(f"✓ 已配置代理: {proxy_url}")
         
-        # 初始化API客户端
-        flag = '1' if simulated else '0'  # 1=模拟盘, 0=实盘
+        # 初始化API客户端：异步客户端跑在后台事件循环里，本类的同步方法是它的门面
+        self.client = AsyncOKXClient(api_key, secret_key, passphrase, simulated, base_url=base_url)
+        self._loop = EventLoopThread()
+        self.rate_limiter = rate_limiter or RATE_LIMITER
+        
+        # K线内存缓存（预热后每个周期只增量拉取新K线）
+        self.candle_store = CandleStore(max_bars=100)
+        
+        # 持仓成本引擎（每个交易对一个，增量同步成交记录）
+        self.db = db
+        self._cost_engines: Dict[str, CostBasisEngine] = {}
+        self._cost_engines_lock = threading.Lock()
         
-        self.account_api = Account.AccountAPI(api_key, secret_key, passphrase, False, flag)
-        self.market_api = MarketData.MarketAPI(api_key, secret_key, passphrase, False, flag)
-        self.trade_api = Trade.TradeAPI(api_key, secret_key, passphrase, False, flag)
+        # 可选的WebSocket推送（健康时价格/K线/订单/余额直接读内存）
+        self.market_feed = None
+        self.private_feed = None
+    
+    def attach_market_feed(self, feed):
+        """
+        接入公共行情推送
+        :param feed: PublicMarketFeed（已start）
+        """
+        self.market_feed = feed
+    
+    def attach_private_feed(self, feed):
+        """
+        接入私有频道推送（订单状态、余额）
+        :param feed: PrivateAccountFeed（已start）
+        """
+        self.private_feed = feed
+    
+    def _call(self, coro, limit: str = None, priority: bool = False, timeout: float = None):
+        """
+        在后台事件循环中执行异步客户端调用（阻塞等待结果，超时后取消请求）
+        :param limit: 限速分组（见OKX_RATE_LIMITS），先在调用线程里取令牌
+        :param priority: 走限速优先通道（下单/撤单及其查询）
+        """
+        if limit:
+            self.rate_limiter.acquire(limit, priority)
+        return self._loop.run(coro, timeout=timeout or self.client.timeout + 5)
+    
+    def close(self):
+        """关闭连接池和后台事件循环"""
+        self._loop.run(self.client.aclose(), timeout=5)
+        self._loop.stop()
     
     @retry_on_error(max_retries=3, delay=2)
-    def get_balance(self) -> Dict:
-        """获取账户余额"""
-        result = self.account_api.get_account_balance()
+    def get_balance(self, min_time: float = None) -> Dict:
+        """
+        获取账户余额（私有推送健康时读推送缓存）
+        :param min_time: 要求推送余额不早于该时间（下单后传下单时间，确保是成交后的余额）
+        """
+        if self.private_feed is not None:
+            balance = self.private_feed.get_balance(min_time=min_time)
+            if balance is not None:
+                return balance
+        
+        result = self._call(self.client.get_account_balance(), limit='balance')
         
         if result['code'] != '0':
             return {'success': False, 'error': result['msg']}
@@ -88,7 +299,7 @@ class OKXTrader:
     @retry_on_error(max_retries=3, delay=2)
     def get_spot_avg_cost(self, symbol: str = 'BTC-USDT', current_balance: float = 0) -> Dict:
         """
-        获取现货持仓的平均成本价（从成交记录计算）
+        获取现货持仓的平均成本价（FIFO成本引擎，只增量拉取新成交）
         OKX API: GET /api/v5/trade/fills-history (获取3个月内成交记录)
         :param symbol: 交易对，如 BTC-USDT
         :param current_balance: 当前BTC余额
@@ -103,76 +314,48 @@ class OKXTrader:
                     'avg_price': 0
                 }
             
-            # 获取最近的成交记录（最多100条，约3个月）
-            result = self.trade_api.get_fills_history(instType='SPOT', instId=symbol, limit='100')
-            
-            if result['code'] != '0':
-                return {'success': False, 'error': result['msg']}
-            
-            fills = result.get('data', [])
-            
-            if not fills:
-                return {
-                    'success': True,
-                    'has_position': False,
-                    'amount': current_balance,
-                    'avg_price': 0
-                }
-            
-            # 从旧到新正序处理，用FIFO原则模拟持仓变化
-            # 逻辑：维护一个持仓队列，BUY追加，SELL从头部扣除
-            fills_reversed = list(reversed(fills))  # 从旧到新排序
-            position_queue = []  # [(amount, price), ...] 先进先出
-            buy_count = 0
-            
-            for fill in fills_reversed:
-                side = fill.get('side')
-                fill_sz = float(fill.get('fillSz', 0))
-                fill_px = float(fill.get('fillPx', 0))
-                
-                if side == 'buy':
-                    # 买入：加入持仓队列
-                    position_queue.append({'amount': fill_sz, 'price': fill_px})
-                    buy_count += 1
-                elif side == 'sell':
-                    # 卖出：从队列头部扣除（先进先出）
-                    remaining_to_sell = fill_sz
-                    while remaining_to_sell > 0.00000001 and position_queue:
-                        first_position = position_queue[0]
-                        if first_position['amount'] <= remaining_to_sell:
-                            # 这笔买入全部卖出
-                            remaining_to_sell -= first_position['amount']
-                            position_queue.pop(0)
-                        else:
-                            # 部分卖出
-                            first_position['amount'] -= remaining_to_sell
-                            remaining_to_sell = 0
-            
-            # 计算队列中剩余持仓的加权平均成本
-            total_cost = sum(pos['amount'] * pos['price'] for pos in position_queue)
-            total_accounted = sum(pos['amount'] for pos in position_queue)
-            if total_accounted > 0:
-                avg_cost = total_cost / total_accounted
-                return {
-                    'success': True,
-                    'has_position': True,
-                    'amount': current_balance,
-                    'avg_price': avg_cost,
-                    'total_accounted': total_accounted,  # FIFO计算出的持仓数量
-                    'fills_count': buy_count,  # 总买入笔数
-                    'position_pieces': len(position_queue)  # 剩余持仓分几笔买入
-                }
-            else:
-                return {
-                    'success': True,
-                    'has_position': False,
-                    'amount': current_balance,
-                    'avg_price': 0
-                }
+            engine = self.get_cost_engine(symbol)
+            engine.sync()
+            return engine.position(current_balance)
                 
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    def get_realized_pnl(self, symbol: str, order_id: str) -> Optional[float]:
+        """
+        某笔卖出订单的已实现盈亏（FIFO成本）
+        :return: 盈亏；成交记录还没查到该订单或未配置数据库时返回None
+        """
+        if self.db is None:
+            return None
+        try:
+            self.get_cost_engine(symbol).sync()
+            return self.db.get_realized_pnl(order_id)
+        except Exception as e:
+            print(f"获取已实现盈亏失败: {e}")
+            return None
+    
+    def get_cost_engine(self, symbol: str) -> CostBasisEngine:
+        """获取交易对的持仓成本引擎（每个交易对一个）"""
+        with self._cost_engines_lock:
+            engine = self._cost_engines.get(symbol)
+            if engine is None:
+                engine = CostBasisEngine(symbol, lambda after: self._fetch_fills_page(symbol, after), self.db)
+                self._cost_engines[symbol] = engine
+            return engine
+    
+    def _fetch_fills_page(self, symbol: str, after: str = '') -> List[Dict]:
+        """
+        拉取一页成交记录（从新到旧）
+        :param after: 分页游标，返回billId早于它的记录
+        """
+        result = self._call(self.client.get_fills_history(
+            instType='SPOT', instId=symbol, after=after, limit=str(CostBasisEngine.PAGE_SIZE)
+        ), limit='fills')
+        if result['code'] != '0':
+            raise RuntimeError(f"OKX: {result.get('msg')} (code: {result.get('code')})")
+        return result.get('data', [])
+    
     @retry_on_error(max_retries=3, delay=2)
     def get_ticker(self, symbol: str = 'BTC-USDT') -> Optional[float]:
         """
@@ -181,7 +364,13 @@ class OKXTrader:
         :return: 价格
         """
         try:
-            result = self.market_api.get_ticker(instId=symbol)
+            # 推送健康时直接读内存价格
+            if self.market_feed is not None:
+                price = self.market_feed.get_price(symbol)
+                if price is not None:
+                    return price
+            
+            result = self._call(self.client.get_ticker(instId=symbol), limit='ticker')
             
             if result['code'] != '0' or not result['data']:
                 return None
@@ -201,128 +390,168 @@ class OKXTrader:
         :return: 多时间周期数据
         """
         try:
-            result = {
-                'symbol': symbol,
-                'timeframes': {}
-            }
-            
-            # 获取两个时间周期的数据（针对短期交易优化）
-            timeframes = [
-                ('15m', 30),  # 15分钟, 30根(约7.5小时)
-                ('1H', 24),   # 1小时, 24根(1天)
-            ]
-            
-            for bar, limit in timeframes:
+            timeframes = {}
+            for bar, limit in self.MULTI_TIMEFRAMES:
                 # 获取K线数据
                 data = self.get_kline_data(symbol, bar, limit)
                 if data:
-                    result['timeframes'][bar] = data
+                    timeframes[bar] = data
             
-            # 如果所有时间周期都失败，返回None
-            if not result['timeframes']:
-                return None
-            
-            # 使用15分钟的当前价格作为主价格
-            if '15m' in result['timeframes']:
-                result['current_price'] = result['timeframes']['15m']['current_price']
-            elif '1H' in result['timeframes']:
-                result['current_price'] = result['timeframes']['1H']['current_price']
-            else:
-                result['current_price'] = list(result['timeframes'].values())[0]['current_price']
-            
-            return result
+            return self.combine_timeframes(symbol, timeframes)
             
         except Exception as e:
             print(f"获取多时间周期数据失败: {e}")
             return None
     
+    @staticmethod
+    def combine_timeframes(symbol: str, timeframes: Dict[str, Dict]) -> Optional[Dict]:
+        """
+        把各周期的K线数据组装成多时间周期数据
+        :param symbol: 交易对
+        :param timeframes: {周期: get_kline_data返回值}
+        :return: 多时间周期数据，所有周期都失败时返回None
+        """
+        # 如果所有时间周期都失败，返回None
+        if not timeframes:
+            return None
+        
+        result = {
+            'symbol': symbol,
+            'timeframes': timeframes
+        }
+        
+        # 使用15分钟的当前价格作为主价格
+        if '15m' in timeframes:
+            result['current_price'] = timeframes['15m']['current_price']
+        elif '1H' in timeframes:
+            result['current_price'] = timeframes['1H']['current_price']
+        else:
+            result['current_price'] = list(timeframes.values())[0]['current_price']
+        
+        return result
+    
     def get_kline_data(self, symbol: str = 'BTC-USDT', bar: str = '15m', limit: int = 100) -> Optional[Dict]:
         """
-        获取K线数据
+        获取K线数据（推送健康时读推送缓冲；否则读内存K线缓存，预热后每次只增量拉取新K线）
         :param symbol: 交易对
         :param bar: K线周期 (1m/5m/15m/30m/1H/4H/1D)
         :param limit: 获取数量
         :return: K线原始数据
         """
         try:
-            # 获取K线数据
-            result = self.market_api.get_candlesticks(
-                instId=symbol,
-                bar=bar,
-                limit=str(limit)
-            )
-            
-            if result['code'] != '0' or not result['data']:
+            klines = None
+            if self.market_feed is not None:
+                klines = self.market_feed.get_klines(symbol, bar, limit)
+            
+            if klines is None:
+                if not self._sync_candles(symbol, bar, limit):
+                    return None
+                klines = self.candle_store.get(symbol, bar, limit)
+                if self.market_feed is not None:
+                    # 用REST数据预热/修复推送缓冲
+                    self.market_feed.seed(symbol, bar, klines)
+            
+            if not len(klines):
                 return None
             
-            # 解析K线数据
-            # OKX返回格式：[时间戳, 开盘价, 最高价, 最低价, 收盘价, 成交量, 成交额(Quote货币), 成交量(Base货币), confirm]
-            klines = result['data']
-            
-            # 转换为DataFrame便于计算（处理可能的9列数据）
-            df = pd.DataFrame(klines)
-            # 只取需要的列
-            df = df.iloc[:, :8]  # 取前8列
-            df.columns = [
-                'timestamp', 'open', 'high', 'low', 'close', 
-                'volume', 'volCcy', 'volCcyQuote'
-            ]
-            
-            # 转换数据类型
-            for col in ['open', 'high', 'low', 'close', 'volume']:
-                df[col] = df[col].astype(float)
-            
-            # 按时间排序（从旧到新）
-            df = df.sort_values('timestamp')
-            
             # 直接返回K线数据，不计算技术指标
             return {
-                'current_price': df['close'].iloc[-1],
+                'current_price': klines.last_close,
                 'bar_period': bar,
-                'data_count': len(df),
-                # K线原始数据（全部返回，让AI自己选择需要的部分）
-                'recent_klines': [
-                    {
-                        'timestamp': int(row['timestamp']),
-                        'open': float(row['open']),
-                        'high': float(row['high']),
-                        'low': float(row['low']),
-                        'close': float(row['close']),
-                        'volume': float(row['volume'])
-                    }
-                    for _, row in df.iterrows()
-                ]
+                'data_count': len(klines),
+                # 列式K线序列（全部返回，让AI自己选择需要的部分）
+                'klines': klines
             }
             
         except Exception as e:
             print(f"获取K线数据失败: {e}")
             return None
     
+    def _sync_candles(self, symbol: str, bar: str, limit: int) -> bool:
+        """
+        增量同步K线缓存
+        - 缓存不足limit根（预热）或落后太多：拉取完整窗口
+        - 否则只拉取最后一根缓存K线及之后的新K线
+        - 新数据与缓存不衔接或缓存中存在缺口：重新拉取完整窗口修复
+        :return: 是否同步成功
+        """
+        store = self.candle_store
+        missing = store.bars_missing(symbol, bar)
+        
+        if missing is None or store.size(symbol, bar) < limit or missing + 1 >= limit:
+            return self._reload_candles(symbol, bar, limit)
+        
+        # 多取一根：最后一根缓存K线可能在上次拉取时还未收盘
+        last_ts = store.last_timestamp(symbol, bar)
+        klines = self._fetch_klines(symbol, bar, missing + 1)
+        if not klines:
+            return False
+        
+        if int(klines.timestamp[0]) > last_ts:
+            print(f"  ⚠️ {symbol} {bar} K线缓存出现缺口，重新拉取")
+            return self._reload_candles(symbol, bar, limit)
+        
+        store.merge(symbol, bar, klines)
+        if store.find_gaps(symbol, bar):
+            print(f"  ⚠️ {symbol} {bar} K线缓存不连续，重新拉取")
+            return self._reload_candles(symbol, bar, limit)
+        return True
+    
+    def _reload_candles(self, symbol: str, bar: str, limit: int) -> bool:
+        """拉取完整K线窗口并替换缓存"""
+        klines = self._fetch_klines(symbol, bar, limit)
+        if not klines:
+            return False
+        self.candle_store.replace(symbol, bar, klines)
+        return True
+    
+    def _fetch_klines(self, symbol: str, bar: str, limit: int) -> Optional[KlineSeries]:
+        """
+        从OKX拉取最近limit根K线
+        :return: K线序列（从旧到新），失败返回None
+        """
+        result = self._call(self.client.get_candlesticks(
+            instId=symbol,
+            bar=bar,
+            limit=str(limit)
+        ), limit='candles')
+        
+        if result['code'] != '0' or not result['data']:
+            return None
+        
+        # 解析K线数据（一次向量化解析为列式序列，从旧到新）
+        # OKX返回格式：[时间戳, 开盘价, 最高价, 最低价, 收盘价, 成交量, 成交额(Quote货币), 成交量(Base货币), confirm]
+        return KlineSeries.from_okx(result['data'])
+    
     
-    @retry_on_error(max_retries=3, delay=2)
-    def buy_market(self, symbol: str, usdt_amount: float, reason: str = '') -> Dict:
+    def _fill_price(self, symbol: str, order_info: Dict):
+        """
+        成交均价；等待超时或查不到订单时用当前价格估算
+        :return: (价格, 是否为估算)；行情也查不到时价格为None
         """
-        市价买入
+        if order_info.get('avg_price'):
+            return order_info['avg_price'], False
+        price = self.get_ticker(symbol)
+        print(f"  ⚠️ 未取得成交均价，按当前价格估算: {price}")
+        return price, True
+    
+    def buy_market(self, symbol: str, usdt_amount: float, reason: str = '', cl_ord_id: str = None) -> Dict:
+        """
+        市价买入（幂等：同一cl_ord_id不会重复成交）
         :param symbol: 交易对，如 BTC-USDT
         :param usdt_amount: 使用的USDT金额（直接传入USDT，更精准）
         :param reason: 交易原因
+        :param cl_ord_id: 客户端订单ID（make_client_order_id生成；为None时随机生成）
         :return: 交易结果
         """
         try:
-            # 获取当前价格（用于日志显示）
-            current_price = self.get_ticker(symbol)
-            if not current_price:
-                return {
-                    'success': False,
-                    'error': '无法获取当前价格',
-                    'reason': reason
-                }
-            
+            cl_ord_id = cl_ord_id or make_client_order_id(symbol, 'buy')
             print(f"  调用OKX API下单...")
-            print(f"  参数: symbol={symbol}, usdt_amount={usdt_amount:.2f}, tdMode=cash")
+            print(f"  参数: symbol={symbol}, usdt_amount={usdt_amount:.2f}, tdMode=cash, clOrdId={cl_ord_id}")
             
-            result = self.trade_api.place_order(
-                instId=symbol,
+            submitted_at = time.time()
+            result = self._submit_order(
+                symbol, cl_ord_id,
                 tdMode='cash',  # 现货交易
                 side='buy',
                 ordType='market',  # 市价单
@@ -342,21 +571,25 @@ class OKXTrader:
             
             order_id = result['data'][0]['ordId']
             
-            # 等待订单成交
-            time.sleep(1)
-            
-            # 查询订单详情
-            order_info = self.get_order_info(symbol, order_id)
+            # 等待订单成交并获取成交详情
+            order_info = self._await_order(symbol, order_id)
             
-            # 计算实际买入的BTC数量
-            btc_amount = order_info.get('filled_amount', usdt_amount / current_price)
+            fill_price, price_estimated = self._fill_price(symbol, order_info)
+            btc_amount = order_info.get('filled_amount') or (usdt_amount / fill_price if fill_price else 0)
             
             return {
                 'success': True,
                 'action': 'BUY',
                 'order_id': order_id,
-                'price': order_info.get('avg_price', current_price),
+                'cl_ord_id': cl_ord_id,
+                'price': fill_price,
+                'price_estimated': price_estimated,
                 'amount': btc_amount,
+                'fee': order_info.get('fee', 0),
+                'fee_ccy': order_info.get('fee_ccy', ''),
+                'latency': order_info.get('latency'),
+                'submitted_at': submitted_at,
+                'reused': result.get('reused', False),
                 'reason': reason
             }
         
@@ -372,16 +605,17 @@ class OKXTrader:
                 'reason': reason
             }
     
-    @retry_on_error(max_retries=3, delay=2)
-    def sell_market(self, symbol: str, amount: float, reason: str = '') -> Dict:
+    def sell_market(self, symbol: str, amount: float, reason: str = '', cl_ord_id: str = None) -> Dict:
         """
-        市价卖出
+        市价卖出（幂等：同一cl_ord_id不会重复成交）
         :param symbol: 交易对
         :param amount: BTC数量
         :param reason: 交易原因
+        :param cl_ord_id: 客户端订单ID（make_client_order_id生成；为None时随机生成）
         :return: 交易结果
         """
         try:
+            cl_ord_id = cl_ord_id or make_client_order_id(symbol, 'sell')
             # OKX要求：BTC数量精度最多8位小数，去掉尾部的0
             # 使用Decimal确保精确格式化
             from decimal import Decimal, ROUND_DOWN
@@ -394,10 +628,11 @@ class OKXTrader:
             print(f"  调用OKX API卖出...")
             print(f"  原始数量: {amount}")
             print(f"  格式化后: {formatted_amount}")
-            print(f"  参数: symbol={symbol}, tdMode=cash, side=sell")
+            print(f"  参数: symbol={symbol}, tdMode=cash, side=sell, clOrdId={cl_ord_id}")
             
-            result = self.trade_api.place_order(
-                instId=symbol,
+            submitted_at = time.time()
+            result = self._submit_order(
+                symbol, cl_ord_id,
                 tdMode='cash',
                 side='sell',
                 ordType='market',
@@ -410,20 +645,25 @@ class OKXTrader:
             if result['code'] == '0':
                 # 成功
                 order_id = result['data'][0]['ordId']
-                # 查询订单详情获取实际成交价格和数量
-                order_detail = self.trade_api.get_order(instId=symbol, ordId=order_id)
+                # 等待订单成交并获取实际成交均价和数量
+                order_info = self._await_order(symbol, order_id)
+                fill_price, price_estimated = self._fill_price(symbol, order_info)
+                fill_size = order_info.get('filled_amount') or amount
                 
-                if order_detail['code'] == '0' and order_detail['data']:
-                    fill_price = float(order_detail['data'][0]['fillPx']) if order_detail['data'][0]['fillPx'] else 0
-                    fill_size = float(order_detail['data'][0]['fillSz']) if order_detail['data'][0]['fillSz'] else amount
-                    
-                    return {
-                        'success': True,
-                        'order_id': order_id,
-                        'price': fill_price if fill_price > 0 else None,
-                        'amount': fill_size,
-                        'reason': reason
-                    }
+                return {
+                    'success': True,
+                    'order_id': order_id,
+                    'cl_ord_id': cl_ord_id,
+                    'price': fill_price,
+                    'price_estimated': price_estimated,
+                    'amount': fill_size,
+                    'fee': order_info.get('fee', 0),
+                    'fee_ccy': order_info.get('fee_ccy', ''),
+                    'latency': order_info.get('latency'),
+                    'submitted_at': submitted_at,
+                    'reused': result.get('reused', False),
+                    'reason': reason
+                }
             
             # 失败 - 打印详细错误
             error_detail = result.get('data', [{}])[0] if result.get('data') else {}
@@ -447,20 +687,148 @@ class OKXTrader:
                 'reason': reason
             }
     
+    def _submit_order(self, symbol: str, cl_ord_id: str, **params) -> Dict:
+        """
+        幂等下单：同一clOrdId最多只会产生一笔订单
+        请求超时/网络异常时订单可能已被OKX接受，所以重试前先按clOrdId查询：
+        查到就直接使用该订单，确认不存在才重新提交，查询失败则不提交、等下一次重试再核对
+        :param params: place_order的其余参数（tdMode/side/ordType/sz/tgtCcy）
+        :return: OKX下单响应（沿用已有订单时构造为同样格式）
+        """
+        for attempt in range(self.ORDER_SUBMIT_RETRIES):
+            try:
+                if attempt:
+                    existing = self._find_order(symbol, cl_ord_id)
+                    if existing:
+                        print(f"  ↩️ 订单已存在(clOrdId={cl_ord_id})，沿用该订单，不重复下单")
+                        return self._existing_order_response(existing)
+                
+                result = self._call(
+                    self.client.place_order(instId=symbol, clOrdId=cl_ord_id, **params),
+                    limit='order', priority=True, timeout=self.ORDER_REQUEST_TIMEOUT
+                )
+                
+                # 同一clOrdId的订单已存在（上一次提交其实成功了）
+                if any(d.get('sCode') == self.DUPLICATE_CL_ORD_ID for d in result.get('data') or []):
+                    existing = self._find_order(symbol, cl_ord_id)
+                    if existing:
+                        print(f"  ↩️ 订单已存在(clOrdId={cl_ord_id})，沿用该订单，不重复下单")
+                        return self._existing_order_response(existing)
+                return result
+            
+            except Exception as e:
+                if attempt == self.ORDER_SUBMIT_RETRIES - 1:
+                    print(f"  ❌ 下单重试{self.ORDER_SUBMIT_RETRIES}次后仍失败 (clOrdId={cl_ord_id}): {e}")
+                    raise
+                delay = self.ORDER_RETRY_BASE_DELAY * 2 ** attempt * random.uniform(0.5, 1.5)
+                print(f"  ⚠️ 下单失败 (尝试{attempt + 1}/{self.ORDER_SUBMIT_RETRIES}): {str(e)[:50] or type(e).__name__}")
+                print(f"  {delay * 1000:.0f}ms后按clOrdId核对并重试...")
+                time.sleep(delay)
+    
+    def _find_order(self, symbol: str, cl_ord_id: str) -> Optional[Dict]:
+        """
+        按clOrdId查询订单（先查私有推送缓存，再查REST）
+        :return: OKX订单；确认不存在时返回None
+        :raises: 查询失败（无法确认订单是否存在）时抛出异常
+        """
+        if self.private_feed is not None:
+            order = self.private_feed.get_order(cl_ord_id=cl_ord_id)
+            if order is not None:
+                return order
+        
+        result = self._call(
+            self.client.get_order(instId=symbol, clOrdId=cl_ord_id),
+            limit='order_info', priority=True, timeout=self.ORDER_REQUEST_TIMEOUT
+        )
+        if result['code'] == '0' and result['data']:
+            return result['data'][0]
+        if result.get('code') == self.ORDER_NOT_EXIST:
+            return None
+        raise RuntimeError(f"无法确认订单状态: {result.get('msg')} (code: {result.get('code')})")
+    
+    @staticmethod
+    def _existing_order_response(order: Dict) -> Dict:
+        """把已存在的订单包装成下单成功的响应格式（reused=True：不是本次新下的单，调用方可能已记录过）"""
+        return {
+            'code': '0',
+            'msg': '',
+            'reused': True,
+            'data': [{'ordId': order['ordId'], 'clOrdId': order.get('clOrdId', ''), 'sCode': '0', 'sMsg': ''}]
+        }
+    
+    def _await_order(self, symbol: str, order_id: str) -> Dict:
+        """
+        等待订单进入终态并返回订单信息（附带latency：从开始等待到拿到终态的秒数）
+        私有频道推送健康时等待终态推送；否则（或推送超时）用退避轮询REST
+        """
+        started = time.monotonic()
+        if self.private_feed is not None:
+            order = self.private_feed.wait_for_order(order_id, timeout=self.order_wait_timeout)
+            if order is not None:
+                info = self._parse_order(order)
+                info['latency'] = time.monotonic() - started
+                return info
+        
+        return self.wait_for_order(symbol, order_id, started=started)
+    
+    def wait_for_order(self, symbol: str, order_id: str, timeout: float = None, started: float = None) -> Dict:
+        """
+        轮询订单直到成交/撤销（指数退避：50ms, 100ms, 200ms...，单次间隔最多1秒）
+        :param timeout: 最长等待时间（秒），默认order_wait_timeout
+        :param started: 计时起点（time.monotonic()），默认现在
+        :return: 订单信息 + latency/polls/timed_out；超时返回最后一次查到的状态
+        """
+        if timeout is None:
+            timeout = self.order_wait_timeout
+        if started is None:
+            started = time.monotonic()
+        deadline = started + timeout
+        
+        delay = self.ORDER_POLL_INITIAL_DELAY
+        info = {}
+        polls = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 and polls:
+                break
+            # 至少查询一次（推送等待超时后进入这里时可能已过截止时间）
+            time.sleep(max(min(delay, remaining), 0))
+            polls += 1
+            info = self.get_order_info(symbol, order_id) or info
+            if info.get('status') in TERMINAL_ORDER_STATES:
+                break
+            delay = min(delay * 2, self.ORDER_POLL_MAX_DELAY)
+        
+        info = dict(info)
+        info.update({
+            'latency': time.monotonic() - started,
+            'polls': polls,
+            'timed_out': info.get('status') not in TERMINAL_ORDER_STATES
+        })
+        if info['timed_out']:
+            print(f"  ⚠️ 订单{order_id}在{timeout:.1f}秒内未完成 (状态: {info.get('status') or '未知'})")
+        return info
+    
+    @staticmethod
+    def _parse_order(order: Dict) -> Dict:
+        """把OKX订单字段（REST/推送格式相同）转换为订单信息"""
+        return {
+            'avg_price': float(order.get('avgPx') or 0),
+            'filled_amount': float(order.get('accFillSz') or 0),
+            'fee': float(order.get('fee') or 0),
+            'fee_ccy': order.get('feeCcy', ''),
+            'status': order.get('state', '')
+        }
+    
     def get_order_info(self, symbol: str, order_id: str) -> Dict:
         """获取订单信息"""
         try:
-            result = self.trade_api.get_order(instId=symbol, ordId=order_id)
+            result = self._call(self.client.get_order(instId=symbol, ordId=order_id), limit='order_info', priority=True)
             
             if result['code'] != '0' or not result['data']:
                 return {}
             
-            order = result['data'][0]
-            return {
-                'avg_price': float(order.get('avgPx', 0)),
-                'filled_amount': float(order.get('accFillSz', 0)),
-                'status': order.get('state', '')
-            }
+            return self._parse_order(result['data'][0])
         
         except Exception as e:
             print(f"获取订单信息失败: {e}")
@@ -12,6 +12,12 @@ class Config:
     OKX_SECRET_KEY = os.getenv('OKX_SECRET_KEY', '')
     OKX_PASSPHRASE = os.getenv('OKX_PASSPHRASE', '')
     OKX_SIMULATED = os.getenv('OKX_SIMULATED', 'true').lower() == 'true'
+    OKX_WS_ENABLED = os.getenv('OKX_WS_ENABLED', 'false').lower() == 'true'  # WebSocket行情推送（失败时自动回退REST）
+    # 接口地址（可指向本地模拟服务器 python -m simulator；WebSocket留空=按模拟盘/实盘使用OKX默认地址）
+    OKX_BASE_URL = os.getenv('OKX_BASE_URL', 'https://www.okx.com')
+    OKX_WS_PUBLIC_URL = os.getenv('OKX_WS_PUBLIC_URL', '')
+    OKX_WS_PRIVATE_URL = os.getenv('OKX_WS_PRIVATE_URL', '')
+    OKX_WS_BUSINESS_URL = os.getenv('OKX_WS_BUSINESS_URL', '')
     
     # DeepSeek配置
     DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY', '')
@@ -39,6 +45,14 @@ class Config:
     
     # AI配置
     AI_MIN_CONFIDENCE = int(os.getenv('AI_MIN_CONFIDENCE', '60'))  # AI最低信心阈值
+    # AI响应缓存：off/read_only（只读，未命中不请求API）/write_through（读写）/bypass（总是请求并刷新缓存）
+    AI_CACHE_MODE = os.getenv('AI_CACHE_MODE', 'off')
+    AI_CACHE_PATH = os.getenv('AI_CACHE_PATH', '')  # 留空=data/ai_cache.db
+    AI_CACHE_MAX_MB = float(os.getenv('AI_CACHE_MAX_MB', '200'))  # 压缩后总大小上限，超出按LRU淘汰
+    AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', '0'))  # 条目数上限（0=不限）
+    
+    # 下单配置
+    ORDER_WAIT_TIMEOUT = float(os.getenv('ORDER_WAIT_TIMEOUT', '5'))  # 等待市价单成交的最长秒数
     
     # 代理配置
     USE_PROXY = os.getenv('USE_PROXY', 'false').lower() == 'true'
@@ -49,9 +63,22 @@ class Config:
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     _db_name = 'trading_simulated.db' if OKX_SIMULATED else 'trading_live.db'
     DATABASE_PATH = os.path.join(BASE_DIR, 'data', _db_name)
+    # 机器人发布给Web面板的状态快照（共享data目录）
+    SNAPSHOT_PATH = os.path.join(BASE_DIR, 'data', 'snapshot_simulated.json' if OKX_SIMULATED else 'snapshot_live.json')
+    AI_CACHE_PATH = AI_CACHE_PATH or os.path.join(BASE_DIR, 'data', 'ai_cache.db')
+    CANDLE_ARCHIVE_DIR = os.getenv('CANDLE_ARCHIVE_DIR', '') or os.path.join(BASE_DIR, 'data', 'candles')  # 历史K线归档（启动时预热K线缓存）
+    DB_WRITE_BEHIND = os.getenv('DB_WRITE_BEHIND', 'false').lower() == 'true'  # 状态快照异步批量写入
+    
+    # 数据保留（K线间隙增量执行）：超过N天的状态记录降采样为OHLC点，原始记录归档为gzip文件
+    STATUS_RETENTION_DAYS = int(os.getenv('STATUS_RETENTION_DAYS', '0'))  # 0=不清理（默认），>0时启用降采样归档
+    STATUS_ROLLUP = os.getenv('STATUS_ROLLUP', 'hour')  # 降采样粒度：hour/day
+    STATUS_ARCHIVE_DIR = os.getenv('STATUS_ARCHIVE_DIR', '')  # 留空=data/archive/<数据库名>/
 
     # 面板访问保护
     PANEL_TOKEN = os.getenv('PANEL_TOKEN', '')
+    STREAM_POLL_INTERVAL = float(os.getenv('STREAM_POLL_INTERVAL', '0.5'))  # 面板实时推送检测数据变化的间隔（秒）
+    API_WORKERS = int(os.getenv('API_WORKERS', '8'))  # 面板执行数据库查询的线程数
+    API_TIMEOUT = float(os.getenv('API_TIMEOUT', '5'))  # 面板单次数据读取超时（秒），超时返回504
     
     @classmethod
     def validate_config(cls):
@@ -21,6 +21,10 @@ from datetime import datetime, timedelta
 from config import Config
 from bot import OKXTrader, TradingStrategy, Database
 from bot.logger import get_logger
+from bot.gatherer import DataGatherer
+from bot.trader import make_client_order_id
+from bot.snapshot import SnapshotPublisher
+from bot.strategy import MIN_ORDER_BTC, plan_trade
 
 
 class TradingBot:
@@ -74,25 +78,80 @@ class TradingBot:
         
         # 初始化组件
         print("\n正在初始化...")
+        self.db = Database(Config.DATABASE_PATH, write_behind=Config.DB_WRITE_BEHIND)
+        
         self.trader = OKXTrader(
             Config.OKX_API_KEY,
             Config.OKX_SECRET_KEY,
             Config.OKX_PASSPHRASE,
             Config.OKX_SIMULATED,
             use_proxy=Config.USE_PROXY,
-            proxy_url=Config.HTTP_PROXY
+            proxy_url=Config.HTTP_PROXY,
+            base_url=Config.OKX_BASE_URL,
+            db=self.db,  # 持久化持仓成本引擎
+            order_wait_timeout=Config.ORDER_WAIT_TIMEOUT
         )
         
+        # 用本地K线归档预热K线缓存（首轮只需增量拉取归档之后的几根）
+        from bot.candle_archive import warm_candle_store
+        warmed = warm_candle_store(self.trader.candle_store, Config.CANDLE_ARCHIVE_DIR, Config.TRADING_SYMBOL,
+                                   [bar for bar, _ in OKXTrader.MULTI_TIMEFRAMES])
+        if warmed:
+            print(f"✓ 已从K线归档预热: {', '.join(f'{bar} {count}根' for bar, count in warmed.items())}")
+        
+        # 可选：WebSocket行情推送 + 私有频道（订单、余额）推送
+        self.market_feed = None
+        self.private_feed = None
+        if Config.OKX_WS_ENABLED:
+            from bot.market_feed import PublicMarketFeed
+            self.market_feed = PublicMarketFeed(
+                Config.TRADING_SYMBOL,
+                bars=[bar for bar, _ in OKXTrader.MULTI_TIMEFRAMES],
+                simulated=Config.OKX_SIMULATED,
+                public_url=Config.OKX_WS_PUBLIC_URL or None,
+                business_url=Config.OKX_WS_BUSINESS_URL or None
+            )
+            self.market_feed.start()
+            self.trader.attach_market_feed(self.market_feed)
+            
+            from bot.private_feed import PrivateAccountFeed
+            self.private_feed = PrivateAccountFeed(
+                Config.OKX_API_KEY,
+                Config.OKX_SECRET_KEY,
+                Config.OKX_PASSPHRASE,
+                symbol=Config.TRADING_SYMBOL,
+                simulated=Config.OKX_SIMULATED,
+                url=Config.OKX_WS_PRIVATE_URL or None
+            )
+            self.private_feed.start()
+            self.trader.attach_private_feed(self.private_feed)
+            print("✓ 已启动WebSocket行情/订单推送")
+        
         from bot.ai_analyzer import AIAnalyzer
+        from bot.ai_cache import AIResponseCache
+        ai_cache = None
+        if Config.AI_CACHE_MODE != 'off':
+            ai_cache = AIResponseCache(
+                Config.AI_CACHE_PATH,
+                mode=Config.AI_CACHE_MODE,
+                max_bytes=int(Config.AI_CACHE_MAX_MB * 1024 * 1024),
+                max_entries=Config.AI_CACHE_MAX_ENTRIES
+            )
+            print(f"✓ AI响应缓存: {Config.AI_CACHE_MODE} ({Config.AI_CACHE_PATH})")
         self.ai = AIAnalyzer(
             Config.DEEPSEEK_API_KEY,
-            Config.DEEPSEEK_BASE_URL
+            Config.DEEPSEEK_BASE_URL,
+            cache=ai_cache
         )
         
         # 策略初始化时不设置固定值
         self.strategy = TradingStrategy()
         
-        self.db = Database(Config.DATABASE_PATH)
+        # 交易循环的数据采集阶段（并发I/O）
+        self.gatherer = DataGatherer(self.trader, self.db)
+        
+        # 状态快照（Web面板直接读取，不再自己请求OKX）
+        self.publisher = SnapshotPublisher(Config.SNAPSHOT_PATH)
         
         # 初始化日志
         self.logger = get_logger()
@@ -116,9 +175,14 @@ class TradingBot:
     
     def run_once(self):
         """执行一次交易循环"""
-        # 1. 获取多时间周期K线数据
-        market_data = self.trader.get_multi_timeframe_data(Config.TRADING_SYMBOL)
+        cycle_started = time.perf_counter()
         
+        # 1. 并发采集K线、余额、成本价、最近交易/表现/决策
+        snapshot = self.gatherer.gather(Config.TRADING_SYMBOL)
+        print(f"  ⏱️ {snapshot.timing_report()}")
+        print(f"  🚦 {self.trader.rate_limiter.report()}")
+        
+        market_data = snapshot.market_data
         if not market_data:
             print("❌ 获取市场数据失败")
             price = self.trader.get_ticker(Config.TRADING_SYMBOL)
@@ -129,23 +193,24 @@ class TradingBot:
         else:
             price = market_data['current_price']
         
-        # 2. 获取余额
-        balance = self.trader.get_balance()
-        if not balance['success']:
-            print(f"❌ 获取余额失败: {balance.get('error')}")
+        # 2. 余额
+        balance = snapshot.balance
+        if not balance or not balance['success']:
+            error = balance.get('error') if balance else snapshot.errors.get('balance')
+            print(f"❌ 获取余额失败: {error}")
             return
         
         usdt = balance['usdt']
         btc = balance['btc']
         total_value = btc * price + usdt
         
-        # 3. 获取最近交易记录
-        recent_trades = self.db.get_recent_trades(5)
+        # 3. 最近交易记录
+        recent_trades = snapshot.recent_trades
         
         # 5. 准备持仓信息（优先从OKX API获取，包含准确的成本价）
         # 优先从OKX API获取现货平均成本价（从成交记录计算）
         avg_price_source = '未知'
-        position_data = self.trader.get_spot_avg_cost(Config.TRADING_SYMBOL, btc)
+        position_data = snapshot.position_data or {'success': False}
         
         if position_data['success'] and position_data.get('avg_price', 0) > 0:
             # 从成交记录成功计算出平均成本价
@@ -170,15 +235,15 @@ class TradingBot:
                 avg_price_source = '当前价(未知)'
         
         current_position = {
-            'has_position': btc >= 0.00001,  # 大于等于最小交易量才算有持仓
+            'has_position': btc >= MIN_ORDER_BTC,  # 大于等于最小交易量才算有持仓
             'amount': btc,  # 实际余额
             'avg_price': avg_price
         }
         
         # 6. AI决策分析（使用对话历史保持上下文）
         
-        performance_stats = self.db.get_recent_performance(20)
-        recent_decisions = self.db.get_recent_ai_decisions(10)  # 获取最近10条AI决策记录
+        performance_stats = snapshot.performance_stats
+        recent_decisions = snapshot.recent_decisions  # 最近10条AI决策记录
         
         analysis = self.ai.analyze_market(
             price, btc, usdt,
@@ -195,6 +260,9 @@ class TradingBot:
             self.logger.log_error(error_msg)
             return
         
+        # 本轮决策时间（毫秒），既写入快照也作为下单的决策标识
+        decided_at = time.time()
+        
         # 记录AI决策到日志（包括HOLD）
         self.logger.log_ai_decision(analysis, price, {'usdt': usdt, 'btc': btc})
         
@@ -205,6 +273,7 @@ class TradingBot:
             "risk_level": analysis.get("risk_level"),
             "reason": analysis.get("reason"),
             "suggested_amount": analysis.get("suggested_amount"),
+            "suggested_usdt": analysis.get("suggested_usdt"),
         }
         
         # 获取AI推理过程
@@ -219,51 +288,30 @@ class TradingBot:
             ai_reasoning  # 保存推理过程
         )
         
-        # 6. 执行交易（使用AI建议的参数，根据配置的最低信心阈值）
-        if analysis['action'] == 'BUY':
-            if analysis['confidence'] < Config.AI_MIN_CONFIDENCE:
-                msg = f"⚠️ AI建议BUY但信心不足({analysis['confidence']}% < {Config.AI_MIN_CONFIDENCE}%)，跳过"
-                print(msg)
-                self.logger.log_warning(msg)
-                return
-            
-            # 获取AI建议的USDT金额（兼容旧格式suggested_amount）
-            if 'suggested_usdt' not in analysis:
-                # 兼容旧格式：如果AI输出的是suggested_amount（BTC），转换为USDT
-                if 'suggested_amount' in analysis:
-                    suggested_usdt = analysis['suggested_amount'] * price
-                    msg = f"⚠️ AI使用旧格式(suggested_amount={analysis['suggested_amount']:.8f} BTC)，已转换为${suggested_usdt:.2f} USDT"
-                    print(msg)
-                    self.logger.log_warning(msg)
-                else:
-                    msg = "❌ AI建议买入但没有提供交易参数（需要suggested_usdt或suggested_amount）"
-                    print(msg)
-                    self.logger.log_error(msg)
-                    return
-            else:
-                suggested_usdt = analysis['suggested_usdt']
-            
-            # 计算最大可用USDT（保留5%余量用于滑点和手续费）
-            max_usdt_available = usdt * 0.95
-            
-            # 根据余额限制计算实际交易金额
-            actual_usdt = min(suggested_usdt, max_usdt_available)
-            
-            # 检查是否满足OKX最小交易量（0.00001 BTC）对应的USDT金额
-            min_btc = 0.00001
-            min_usdt_value = min_btc * price  # 约0.9-1 USDT（随BTC价格浮动）
-            if actual_usdt < min_usdt_value:
-                msg = f"⚠️ 交易金额太小(${actual_usdt:.2f} < ${min_usdt_value})，跳过买入"
-                print(msg)
-                self.logger.log_warning(msg)
-                return
-            
-            # 检查余额是否充足
-            if usdt < actual_usdt:
-                msg = f"⚠️ USDT余额不足: 需要${actual_usdt:.2f}, 实际${usdt:.2f}，跳过买入"
-                print(msg)
-                self.logger.log_warning(msg)
-                return
+        # 发布本轮快照（成本价只用成本引擎的结果，不用估算值）
+        cost_basis = position_data.get('avg_price', 0) if position_data['success'] else 0
+        self.publish_snapshot(
+            'cycle', price, usdt, btc, cost_basis,
+            decision=dict(ai_status_payload, timestamp=decided_at),
+            timings={
+                'gather': round(snapshot.wall_time, 3),
+                'calls': {name: round(seconds, 3) for name, seconds in snapshot.timings.items()},
+                'cycle': round(time.perf_counter() - cycle_started, 3),
+            }
+        )
+        
+        # 本轮决策标识：同一次决策的下单重试使用同一个clOrdId；重启后重新决策会得到新的标识，不会沿用旧订单
+        decision_key = f"{int(decided_at * 1000)}"
+        
+        # 6. 执行交易（使用AI建议的参数，根据配置的最低信心阈值；换算规则与回测共用plan_trade）
+        plan = plan_trade(analysis, price, usdt, btc, Config.AI_MIN_CONFIDENCE)
+        for level, msg in plan['messages']:
+            print(msg)
+            getattr(self.logger, f"log_{level}")(msg)
+        
+        if plan['action'] == 'BUY':
+            suggested_usdt = plan['suggested_usdt']
+            actual_usdt = plan['usdt']
             
             # 打印交易前的详细信息
             print(f"\n💰 准备买入:")
@@ -277,7 +325,8 @@ class TradingBot:
                 result = self.trader.buy_market(
                     Config.TRADING_SYMBOL,
                     actual_usdt,
-                    analysis['reason']
+                    analysis['reason'],
+                    cl_ord_id=make_client_order_id(Config.TRADING_SYMBOL, 'buy', decision_key)
                 )
             except Exception as e:
                 # 捕获并记录买入异常
@@ -286,12 +335,17 @@ class TradingBot:
                 self.logger.log_error(error_msg)
                 return
             
+            if result['success'] and self._already_recorded(result):
+                return
+            if result['success']:
+                self._ensure_fill_price(result, price)
+            
             if result['success']:
                 # 记录交易日志
                 self.logger.log_trade('BUY', result['price'], result['amount'], 'SUCCESS')
                 
                 # 记录到数据库
-                balance_after = self.trader.get_balance()
+                balance_after = self.trader.get_balance(min_time=result.get('submitted_at'))
                 self.db.add_trade(
                     'BUY',
                     result['price'],
@@ -299,8 +353,10 @@ class TradingBot:
                     result['reason'],
                     0,
                     balance_after.get('usdt', 0),
-                    balance_after.get('btc', 0)
+                    balance_after.get('btc', 0),
+                    order_id=result['order_id']
                 )
+                self.publish_fill('BUY', result, balance_after)
                 
                 # 记录买入价格（用于后续计算盈亏）
                 self.strategy.set_position(
@@ -312,51 +368,46 @@ class TradingBot:
                 print(f"\n❌ {error_msg}")
                 self.logger.log_error(error_msg)
         
-        elif analysis['action'] == 'SELL':
-            if analysis['confidence'] < Config.AI_MIN_CONFIDENCE:
-                msg = f"⚠️ AI建议SELL但信心不足({analysis['confidence']}% < {Config.AI_MIN_CONFIDENCE}%)，跳过"
-                print(msg)
-                self.logger.log_warning(msg)
-                return
-            
-            # 获取AI建议的交易量（必须存在）
-            if 'suggested_amount' not in analysis:
-                return
-            
-            suggested_amount = analysis['suggested_amount']
-            actual_amount = min(suggested_amount, btc)
-            
-            # 检查OKX最小交易量（0.00001 BTC）
-            min_btc_amount = 0.00001
-            
-            if actual_amount < min_btc_amount:
-                return
+        elif plan['action'] == 'SELL':
+            actual_amount = plan['amount']
             
             result = self.trader.sell_market(
                 Config.TRADING_SYMBOL,
                 actual_amount,
-                analysis['reason']
+                analysis['reason'],
+                cl_ord_id=make_client_order_id(Config.TRADING_SYMBOL, 'sell', decision_key)
             )
             
+            if result['success'] and self._already_recorded(result):
+                return
             if result['success']:
-                # 计算实际利润（优先从OKX API获取平均成本价）
-                avg_cost_data = self.trader.get_spot_avg_cost(Config.TRADING_SYMBOL, btc)
-                avg_cost = 0
-                
-                if avg_cost_data['success'] and avg_cost_data.get('avg_price', 0) > 0:
-                    # 从OKX API获取到的平均成本价（最准确）
-                    avg_cost = avg_cost_data['avg_price']
-                elif self.strategy.last_buy_price:
-                    # 退而求其次，使用内存中的最后买入价
-                    avg_cost = self.strategy.last_buy_price
+                self._ensure_fill_price(result, price)
+            
+            if result['success']:
+                # 计算实际利润（优先使用成本引擎按FIFO算出的该笔卖出已实现盈亏）
+                profit = self.trader.get_realized_pnl(Config.TRADING_SYMBOL, result['order_id'])
+                cost_note = 'FIFO成本'
                 
-                profit = (price - avg_cost) * actual_amount if avg_cost > 0 else 0
+                if profit is None:
+                    # 成交记录里还查不到这笔卖出，退回按平均成本估算
+                    avg_cost_data = self.trader.get_spot_avg_cost(Config.TRADING_SYMBOL, btc)
+                    avg_cost = 0
+                    
+                    if avg_cost_data['success'] and avg_cost_data.get('avg_price', 0) > 0:
+                        # 从OKX API获取到的平均成本价（最准确）
+                        avg_cost = avg_cost_data['avg_price']
+                    elif self.strategy.last_buy_price:
+                        # 退而求其次，使用内存中的最后买入价
+                        avg_cost = self.strategy.last_buy_price
+                    
+                    profit = (price - avg_cost) * actual_amount if avg_cost > 0 else 0
+                    cost_note = f"成本: ${avg_cost:,.2f}"
                 
                 # 记录交易日志
                 self.logger.log_trade('SELL', result['price'], result['amount'], 'SUCCESS')
-                self.logger.log_info(f"盈亏: ${profit:+,.2f} (成本: ${avg_cost:,.2f})")
+                self.logger.log_info(f"盈亏: ${profit:+,.2f} ({cost_note})")
                 
-                balance_after = self.trader.get_balance()
+                balance_after = self.trader.get_balance(min_time=result.get('submitted_at'))
                 self.db.add_trade(
                     'SELL',
                     result['price'],
@@ -364,8 +415,10 @@ class TradingBot:
                     result['reason'],
                     profit,
                     balance_after.get('usdt', 0),
-                    balance_after.get('btc', 0)
+                    balance_after.get('btc', 0),
+                    order_id=result['order_id']
                 )
+                self.publish_fill('SELL', result, balance_after)
                 
                 self.strategy.clear_position()
             else:
@@ -373,44 +426,139 @@ class TradingBot:
                 print(f"\n❌ {error_msg}")
                 self.logger.log_error(error_msg)
     
-    def run(self):
-        """运行机器人"""
-        print("🚀 AI炒币机器人启动!")
-        
-        # 检查余额
-        if not self.check_balance():
-            return
-        
-        print(f"\n机器人将在每根15分钟K线刚成型时检查市场（准点：00/15/30/45分）")
-        print("按 Ctrl+C 停止\n")
-        
-        self.running = True
-        
+    def _ensure_fill_price(self, result: dict, price: float):
+        """成交均价和行情都没取到时按本轮行情价记账，不写价格为空的交易记录"""
+        if result.get('price') is None:
+            result['price'] = price
+            result['price_estimated'] = True
+        if result.get('price_estimated'):
+            self.logger.log_warning(f"订单{result['order_id']}未取得成交均价，按${result['price']:,.2f}估算记账")
+    
+    def _already_recorded(self, result: dict) -> bool:
+        """沿用的已有订单（clOrdId重复）是否已经记过账；是则不再重复记录交易和盈亏"""
+        if not result.get('reused') or not self.db.has_trade(result['order_id']):
+            return False
+        msg = f"订单{result['order_id']}已记录过，不重复记账"
+        print(f"  ↩️ {msg}")
+        self.logger.log_info(msg)
+        return True
+    
+    def publish_snapshot(self, event: str, price: float, usdt: float, btc: float, avg_cost: float, **fields):
+        """
+        发布状态快照（失败只记录日志，不影响交易）
+        :param event: cycle（每轮结束）/ fill（成交后）
+        :param avg_cost: 持仓平均成本（未知时为0）
+        :param fields: 其他字段，如decision/timings/last_fill
+        """
         try:
-            while self.running:
+            total_value = btc * price + usdt if price else usdt
+            unrealized_pnl = 0
+            unrealized_pnl_percent = 0
+            if avg_cost > 0 and price and btc > 0:
+                unrealized_pnl = (price - avg_cost) * btc
+                unrealized_pnl_percent = (price - avg_cost) / avg_cost * 100
+            
+            self.publisher.publish(
+                event=event,
+                symbol=Config.TRADING_SYMBOL,
+                simulated=Config.OKX_SIMULATED,
+                price=price,
+                usdt=usdt,
+                btc=btc,
+                total_value=total_value,
+                avg_cost=avg_cost,
+                unrealized_pnl=unrealized_pnl,
+                unrealized_pnl_percent=unrealized_pnl_percent,
+                **fields
+            )
+        except Exception as e:
+            self.logger.log_warning(f"发布状态快照失败: {e}")
+    
+    def publish_fill(self, action: str, result: dict, balance_after: dict):
+        """成交后发布快照（成交后的余额和成本价）"""
+        if not balance_after.get('success'):
+            return
+        price = result.get('price') or self.trader.get_ticker(Config.TRADING_SYMBOL)
+        position = self.trader.get_spot_avg_cost(Config.TRADING_SYMBOL, balance_after['btc'])
+        self.publish_snapshot(
+            'fill', price, balance_after['usdt'], balance_after['btc'],
+            position.get('avg_price', 0) if position.get('success') else 0,
+            last_fill={
+                'action': action,
+                'price': result.get('price'),
+                'amount': result.get('amount'),
+                'order_id': result.get('order_id'),
+                'latency': result.get('latency'),
+                'timestamp': time.time(),
+            }
+        )
+    
+    def idle(self, wait_seconds: float, margin: float = 30):
+        """
+        K线之间的空闲时间：先分批执行数据保留任务，剩余时间sleep
+        :param wait_seconds: 距离下一次检查的秒数
+        :param margin: 距离下一次检查不足该秒数时不再开始新的批次
+        """
+        deadline = time.monotonic() + wait_seconds
+        if Config.STATUS_RETENTION_DAYS > 0:
+            archived = 0
+            while time.monotonic() < deadline - margin:
                 try:
-                    self.run_once()
+                    result = self.db.run_retention(
+                        Config.STATUS_RETENTION_DAYS,
+                        rollup=Config.STATUS_ROLLUP,
+                        archive_dir=Config.STATUS_ARCHIVE_DIR or None
+                    )
                 except Exception as e:
-                    error_msg = f"执行出错: {e}"
-                    print(f"\n❌ {error_msg}")
-                    self.logger.log_error(error_msg)
-                    import traceback
-                    traceback.print_exc()
-                
-                # 计算下一次检查时间（15分钟K线刚成型时）
-                wait_seconds = self.calculate_next_check_time(
-                    kline_interval_minutes=15
-                )
-                time.sleep(wait_seconds)
-        
-        except KeyboardInterrupt:
-            print("\n\n⏹️  停止运行...")
-            self.logger.log_info("用户手动停止机器人")
-            self.running = False
+                    self.logger.log_error(f"数据保留任务失败: {e}")
+                    break
+                if not result['archived']:
+                    break
+                archived += result['archived']
+            if archived:
+                print(f"  🗄️ 数据保留: {archived}条状态记录已降采样并归档")
+        
+        time.sleep(max(deadline - time.monotonic(), 0))
+    
+    def run(self):
+        """运行机器人（无论启动检查失败、出错还是Ctrl+C，最后都按顺序关闭推送、线程池、连接和数据库）"""
+        print("🚀 AI炒币机器人启动!")
         
-        # 打印统计
-        stats = self.db.get_statistics()
-        stats_msg = f"""
+        try:
+            # 检查余额
+            if not self.check_balance():
+                return
+            
+            print(f"\n机器人将在每根15分钟K线刚成型时检查市场（准点：00/15/30/45分）")
+            print("按 Ctrl+C 停止\n")
+            
+            self.running = True
+            
+            try:
+                while self.running:
+                    try:
+                        self.run_once()
+                    except Exception as e:
+                        error_msg = f"执行出错: {e}"
+                        print(f"\n❌ {error_msg}")
+                        self.logger.log_error(error_msg)
+                        import traceback
+                        traceback.print_exc()
+                    
+                    # 计算下一次检查时间（15分钟K线刚成型时）
+                    wait_seconds = self.calculate_next_check_time(
+                        kline_interval_minutes=15
+                    )
+                    self.idle(wait_seconds)
+            
+            except KeyboardInterrupt:
+                print("\n\n⏹️  停止运行...")
+                self.logger.log_info("用户手动停止机器人")
+                self.running = False
+            
+            # 打印统计
+            stats = self.db.get_statistics()
+            stats_msg = f"""
 交易统计:
   总交易次数: {stats['total_trades']}
   买入次数: {stats['buy_count']}
@@ -418,11 +566,21 @@ class TradingBot:
   总盈亏: ${stats['total_profit']:,.2f}
   平均盈亏: ${stats['avg_profit']:,.2f}
 """
-        print("\n" + "="*60)
-        print(stats_msg)
-        print("="*60)
-        self.logger.log_info(stats_msg)
-
+            print("\n" + "="*60)
+            print(stats_msg)
+            print("="*60)
+            self.logger.log_info(stats_msg)
+        finally:
+            self.shutdown()
+    
+    def shutdown(self):
+        """先停推送和线程池、关闭交易所连接，最后写完队列中的状态记录并关闭数据库"""
+        for feed in (self.market_feed, self.private_feed):
+            if feed is not None:
+                feed.stop()
+        self.gatherer.shutdown()
+        self.trader.close()
+        self.db.close()
 
 def main():
     """主函数"""
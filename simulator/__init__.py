@@ -0,0 +1,6 @@
+"""本地OKX模拟服务器（REST + WebSocket，按回放K线撮合，可注入延迟/错误/限流）"""
+from .exchange import MatchingEngine
+from .market import ReplayMarket, synthetic_candles
+from .server import FaultInjector, SimulatorServer, create_app
+
+__all__ = ['MatchingEngine', 'ReplayMarket', 'synthetic_candles', 'FaultInjector', 'SimulatorServer', 'create_app']
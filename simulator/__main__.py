@@ -0,0 +1,4 @@
+"""python -m simulator"""
+from .server import main
+
+main()
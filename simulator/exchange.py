@@ -0,0 +1,276 @@
+"""模拟撮合：按回放价格成交现货市价单/限价单，响应格式与OKX REST/推送一致"""
+import math
+from typing import Dict, List, Tuple
+
+from bot.backtest import DEFAULT_FEE_RATE, LOT_SIZE
+from bot.candle_store import BAR_MILLISECONDS
+from bot.strategy import MIN_ORDER_BTC
+
+from .market import ReplayMarket
+
+
+def _num(value: float) -> str:
+    """数字转OKX风格字符串（最多8位小数，去掉尾部的0）"""
+    text = f'{value:.8f}'.rstrip('0').rstrip('.')
+    return text if text not in ('', '-0') else '0'
+
+
+def _ok(data: List) -> Dict:
+    return {'code': '0', 'msg': '', 'data': data}
+
+
+def _error(code: str, msg: str, data: List = None) -> Dict:
+    return {'code': code, 'msg': msg, 'data': data or []}
+
+
+class MatchingEngine:
+    """单交易对现货撮合
+
+    - 市价单下单时立即按当前回放价格 ± 固定滑点成交；限价单挂单冻结资金，之后每次tick价格达到限价时成交
+    - 手续费与OKX一致：买入从得到的BTC里扣，卖出从得到的USDT里扣
+    - 同一clOrdId重复下单返回51016，查询不存在的订单返回51603，余额不足51008，低于最小下单量51020
+    - 订单/余额变化记为推送事件，由服务器在tick时广播给私有频道
+
+    只在服务器事件循环里调用，不加锁。
+    """
+
+    def __init__(self, market: ReplayMarket, symbol: str = 'BTC-USDT', usdt: float = 10000.0, btc: float = 0.0,
+                 fee_rate: float = DEFAULT_FEE_RATE, slippage_bps: float = 2.0, min_size: float = MIN_ORDER_BTC):
+        """
+        :param market: 回放行情
+        :param symbol: 交易对
+        :param usdt/btc: 初始余额
+        :param fee_rate: 手续费率（每边）
+        :param slippage_bps: 市价单固定滑点（基点）
+        :param min_size: 最小下单量（BTC）
+        """
+        self.market = market
+        self.symbol = symbol
+        self.base, _, self.quote = symbol.partition('-')
+        self.available = {self.base: float(btc), self.quote: float(usdt)}
+        self.frozen = {self.base: 0.0, self.quote: 0.0}
+        self.fee_rate = fee_rate
+        self.slippage_bps = slippage_bps
+        self.min_size = min_size
+        self.orders: Dict[str, Dict] = {}
+        self._cl_ord_ids: Dict[str, str] = {}
+        self._open_orders: List[str] = []
+        self.fills: List[Dict] = []
+        self._events: List[Tuple[str, List[Dict]]] = []
+        self._next_id = 1
+
+    # ---------- 行情 ----------
+
+    def ticker(self, inst_id: str) -> Dict:
+        """GET /api/v5/market/ticker"""
+        if inst_id != self.symbol:
+            return _error('51001', f"Instrument ID doesn't exist: {inst_id}")
+        now = self.market.now()
+        last = self.market.price(now)
+        spread = last * 0.00005
+        return _ok([{
+            'instType': 'SPOT', 'instId': self.symbol, 'last': f'{last:.1f}', 'lastSz': '0.001',
+            'askPx': f'{last + spread:.1f}', 'askSz': '1', 'bidPx': f'{last - spread:.1f}', 'bidSz': '1',
+            'ts': str(now),
+        }])
+
+    def candles(self, inst_id: str, bar: str = '1m', after: str = '', before: str = '', limit: str = '',
+                history: bool = False) -> Dict:
+        """GET /api/v5/market/candles 和 /api/v5/market/history-candles（history只返回已收盘K线，每页最多100根）"""
+        if inst_id != self.symbol:
+            return _error('51001', f"Instrument ID doesn't exist: {inst_id}")
+        if bar not in BAR_MILLISECONDS or BAR_MILLISECONDS[bar] % self.market.step:
+            return _error('51000', 'Parameter bar error')
+        try:
+            size = min(int(limit or 100), 100 if history else 300)
+            rows = self.market.candles(bar, int(after) if after else None, int(before) if before else None,
+                                       max(size, 1), confirmed_only=history)
+        except ValueError:
+            return _error('51000', 'Parameter after/before/limit error')
+        return _ok(rows)
+
+    # ---------- 账户 ----------
+
+    def account(self) -> Dict:
+        """账户数据（REST余额和account频道推送格式相同）"""
+        price = self.market.price()
+        details = []
+        for ccy in (self.quote, self.base):
+            available, frozen = self.available[ccy], self.frozen[ccy]
+            equity = available + frozen
+            details.append({
+                'ccy': ccy, 'availBal': _num(available), 'frozenBal': _num(frozen), 'cashBal': _num(equity),
+                'eq': _num(equity), 'eqUsd': _num(equity * (price if ccy == self.base else 1)),
+            })
+        total = sum(float(d['eqUsd']) for d in details)
+        return {'uTime': str(self.market.now()), 'totalEq': _num(total), 'details': details}
+
+    def balance(self) -> Dict:
+        """GET /api/v5/account/balance"""
+        return _ok([self.account()])
+
+    # ---------- 交易 ----------
+
+    def place_order(self, params: Dict) -> Dict:
+        """POST /api/v5/trade/order"""
+        cl_ord_id = params.get('clOrdId') or ''
+        side, ord_type = params.get('side'), params.get('ordType')
+
+        def rejected(code: str, msg: str) -> Dict:
+            return _error('1', 'All operations failed',
+                          [{'ordId': '', 'clOrdId': cl_ord_id, 'tag': '', 'sCode': code, 'sMsg': msg}])
+
+        if params.get('instId') != self.symbol:
+            return rejected('51001', f"Instrument ID doesn't exist: {params.get('instId')}")
+        if cl_ord_id and cl_ord_id in self._cl_ord_ids:
+            return rejected('51016', 'Duplicated clOrdId')
+        if side not in ('buy', 'sell') or ord_type not in ('market', 'limit'):
+            return rejected('51000', 'Parameter side/ordType error')
+        try:
+            sz = float(params.get('sz') or 0)
+            px = float(params.get('px') or 0) if ord_type == 'limit' else 0.0
+        except ValueError:
+            return rejected('51000', 'Parameter sz/px error')
+        if sz <= 0 or (ord_type == 'limit' and px <= 0):
+            return rejected('51000', 'Parameter sz/px error')
+
+        now = self.market.now()
+        price = px or self.market.price(now) * (1 + self.slippage_bps / 10000 * (1 if side == 'buy' else -1))
+        # 市价买单默认sz为USDT金额，其余默认为BTC数量
+        tgt_ccy = params.get('tgtCcy') or ('quote_ccy' if side == 'buy' and ord_type == 'market' else 'base_ccy')
+        if tgt_ccy == 'quote_ccy' and ord_type == 'market':
+            size = math.floor(sz / price / LOT_SIZE) * LOT_SIZE
+        else:
+            size = math.floor(sz / LOT_SIZE + 1e-6) * LOT_SIZE
+        if size < self.min_size:
+            return rejected('51020', f'Order size should be at least {_num(self.min_size)} {self.base}')
+
+        ccy, amount = (self.quote, size * price) if side == 'buy' else (self.base, size)
+        if amount > self.available[ccy] + 1e-9:
+            return rejected('51008', f'Order failed. Insufficient {ccy} balance')
+
+        ord_id = str(self._next_id)
+        self._next_id += 1
+        order = {
+            'instType': 'SPOT', 'instId': self.symbol, 'ordId': ord_id, 'clOrdId': cl_ord_id, 'tag': '',
+            'side': side, 'ordType': ord_type, 'tdMode': params.get('tdMode') or 'cash', 'tgtCcy': tgt_ccy,
+            'sz': params.get('sz'), 'px': params.get('px') or '', 'state': 'live',
+            'avgPx': '', 'accFillSz': '0', 'fillPx': '', 'fillSz': '0', 'fee': '0', 'feeCcy': '',
+            'cTime': str(now), 'uTime': str(now),
+        }
+        self.orders[ord_id] = order
+        if cl_ord_id:
+            self._cl_ord_ids[cl_ord_id] = ord_id
+
+        if ord_type == 'market':
+            self._emit_order(order)
+            self._fill(order, size, price, amount, now)
+        else:
+            self.available[ccy] -= amount
+            self.frozen[ccy] += amount
+            order['_reserved'] = (ccy, amount, size)
+            self._open_orders.append(ord_id)
+            self._emit_order(order)
+            self._emit_account()
+        return _ok([{'ordId': ord_id, 'clOrdId': cl_ord_id, 'tag': '', 'sCode': '0', 'sMsg': 'Order placed'}])
+
+    def _fill(self, order: Dict, size: float, price: float, amount: float, now: int):
+        """全部成交：更新余额、订单、成交记录（amount为买入花费的USDT/卖出的BTC）"""
+        if order['side'] == 'buy':
+            fee, fee_ccy = size * self.fee_rate, self.base
+            self._take(order, self.quote, amount)
+            self.available[self.base] += size - fee
+        else:
+            proceeds = size * price
+            fee, fee_ccy = proceeds * self.fee_rate, self.quote
+            self._take(order, self.base, amount)
+            self.available[self.quote] += proceeds - fee
+
+        order.update({
+            'state': 'filled', 'avgPx': _num(price), 'accFillSz': _num(size), 'fillPx': _num(price),
+            'fillSz': _num(size), 'fee': _num(-fee), 'feeCcy': fee_ccy, 'fillTime': str(now), 'uTime': str(now),
+        })
+        bill_id = len(self.fills) + 1
+        self.fills.append({
+            'instType': 'SPOT', 'instId': self.symbol, 'tradeId': str(bill_id), 'billId': str(bill_id),
+            'ordId': order['ordId'], 'clOrdId': order['clOrdId'], 'tag': '', 'side': order['side'],
+            'fillPx': _num(price), 'fillSz': _num(size), 'fee': _num(-fee), 'feeCcy': fee_ccy,
+            'execType': 'T', 'ts': str(now),
+        })
+        self._emit_order(order)
+        self._emit_account()
+
+    def _take(self, order: Dict, ccy: str, amount: float):
+        """扣除成交花费：限价单解冻后扣，市价单从可用余额扣"""
+        if '_reserved' in order:
+            reserved = order['_reserved'][1]
+            self.frozen[ccy] = max(self.frozen[ccy] - reserved, 0.0)
+            self.available[ccy] += reserved - amount    # 成交价优于限价时退回多冻结的部分
+        else:
+            self.available[ccy] = max(self.available[ccy] - amount, 0.0)
+
+    def get_order(self, inst_id: str, ord_id: str = '', cl_ord_id: str = '') -> Dict:
+        """GET /api/v5/trade/order"""
+        if not ord_id and cl_ord_id:
+            ord_id = self._cl_ord_ids.get(cl_ord_id, '')
+        order = self.orders.get(ord_id) if inst_id == self.symbol else None
+        if order is None:
+            return _error('51603', 'Order does not exist')
+        return _ok([self._public(order)])
+
+    def fills_history(self, inst_id: str = '', after: str = '', before: str = '', limit: str = '') -> Dict:
+        """GET /api/v5/trade/fills-history（按billId从新到旧分页，每页最多100条）"""
+        if inst_id and inst_id != self.symbol:
+            return _ok([])
+        try:
+            end = min(int(after) - 1, len(self.fills)) if after else len(self.fills)
+            start = int(before) if before else 0
+            size = min(int(limit or 100), 100)
+        except ValueError:
+            return _error('51000', 'Parameter after/before/limit error')
+        return _ok(self.fills[max(end - size, start, 0):max(end, 0)][::-1])
+
+    # ---------- 时钟 ----------
+
+    def tick(self) -> List[Tuple[str, List[Dict]]]:
+        """
+        撮合价格达到限价的挂单（按当前价成交，不差于限价），取出累计的推送事件
+        :return: [(频道 orders/account, 推送data), ...]
+        """
+        if self._open_orders:
+            now = self.market.now()
+            price = self.market.price(now)
+            for ord_id in list(self._open_orders):
+                order = self.orders[ord_id]
+                limit = float(order['px'])
+                if order['side'] == 'buy' and price <= limit:
+                    size = order['_reserved'][2]
+                    self._open_orders.remove(ord_id)
+                    self._fill(order, size, price, size * price, now)
+                elif order['side'] == 'sell' and price >= limit:
+                    size = order['_reserved'][2]
+                    self._open_orders.remove(ord_id)
+                    self._fill(order, size, price, size, now)
+        events, self._events = self._events, []
+        return events
+
+    def _emit_order(self, order: Dict):
+        self._events.append(('orders', [self._public(order)]))
+
+    def _emit_account(self):
+        self._events.append(('account', [self.account()]))
+
+    @staticmethod
+    def _public(order: Dict) -> Dict:
+        """订单的OKX字段（去掉内部记账字段）"""
+        return {k: v for k, v in order.items() if not k.startswith('_')}
+
+    def summary(self) -> Dict:
+        """当前余额和成交统计"""
+        return {
+            'usdt': self.available[self.quote] + self.frozen[self.quote],
+            'btc': self.available[self.base] + self.frozen[self.base],
+            'orders': len(self.orders),
+            'fills': len(self.fills),
+            'open_orders': len(self._open_orders),
+        }
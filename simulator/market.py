@@ -0,0 +1,160 @@
+"""回放行情：把历史K线平移到当前时间，按时钟逐步"走出"每根K线"""
+import time
+from typing import List
+
+import numpy as np
+
+from bot.candle_store import BAR_MILLISECONDS
+from bot.kline_series import KlineSeries
+
+DAY_MS = BAR_MILLISECONDS['1D']
+
+
+def synthetic_candles(bars: int, bar: str = '15m', seed: int = 7, price: float = 30000.0,
+                      annual_vol: float = 0.6) -> KlineSeries:
+    """几何布朗运动生成的K线（没有历史数据时用于测试/压测）"""
+    step = BAR_MILLISECONDS[bar]
+    rng = np.random.default_rng(seed)
+    sigma = annual_vol / np.sqrt(365 * 24 * 3600 * 1000 / step)
+    close = price * np.exp(np.cumsum(rng.normal(0, sigma, bars)))
+    open_ = np.r_[price, close[:-1]]
+    spread = np.abs(rng.normal(0, sigma, bars)) * close
+    return KlineSeries(
+        1704067200000 + np.arange(bars, dtype=np.int64) * step,
+        open_, np.maximum(open_, close) + spread, np.minimum(open_, close) - spread, close,
+        rng.uniform(50, 300, bars)
+    )
+
+
+class ReplayMarket:
+    """回放行情
+
+    - K线时间戳整体平移整天数，与机器人看到的本机时间和各周期K线边界一致
+    - 每根K线内价格按 开→低→高→收（阴线为 开→高→低→收）分段线性移动，当前K线的高低收随时间更新
+    - speed>1时加速回放（压测用；此时K线时间与本机时钟不再对齐）
+    - 回放到最后一根后价格停在最后收盘价
+    """
+
+    def __init__(self, klines: KlineSeries, bar: str = '15m', start: int = None, speed: float = 1.0,
+                 now_ms: int = None):
+        """
+        :param klines: 回放K线（从旧到新）
+        :param bar: K线周期（更大的周期由它合并而来）
+        :param start: 从第几根附近开始回放（之前的作为历史K线，默认保留500根历史）
+        :param speed: 回放速度倍数
+        :param now_ms: 回放起点对应的本机时间（毫秒，默认现在）
+        """
+        if len(klines) < 2:
+            raise ValueError('回放K线至少需要2根')
+        self.klines = klines
+        self.bar = bar
+        self.step = BAR_MILLISECONDS[bar]
+        self.speed = speed
+        start = min(500, len(klines) - 1) if start is None else start
+        self.wall_start = int(time.time() * 1000) if now_ms is None else now_ms
+        # 平移量取整天，1H/4H/1D等更大周期的K线边界也和本机时间对齐；回放从第start根之后不到一天的位置开始
+        self.offset = (self.wall_start - int(klines.timestamp[start])) // DAY_MS * DAY_MS
+        self.replay_start = self.wall_start - self.offset
+        self._resampled = {}
+
+    # ---------- 时钟 ----------
+
+    def now(self, wall_ms: int = None) -> int:
+        """当前回放时间（平移后，毫秒）"""
+        if wall_ms is None:
+            wall_ms = int(time.time() * 1000)
+        return self.replay_start + int((wall_ms - self.wall_start) * self.speed) + self.offset
+
+    def _position(self, now: int):
+        """(当前K线下标, K线内进度0~1)；now为平移后时间"""
+        original = now - self.offset
+        ts = self.klines.timestamp
+        index = int(np.searchsorted(ts, original, side='right')) - 1
+        index = min(max(index, 0), len(ts) - 1)
+        progress = min(max((original - int(ts[index])) / self.step, 0.0), 1.0)
+        return index, progress
+
+    def _path(self, index: int):
+        """第index根K线内的价格路径（进度 -> 价格的分段点）"""
+        k = self.klines
+        o, h, l, c = float(k.open[index]), float(k.high[index]), float(k.low[index]), float(k.close[index])
+        middle = (l, h) if c >= o else (h, l)
+        return [0.0, 1 / 3, 2 / 3, 1.0], [o, middle[0], middle[1], c]
+
+    def price(self, now: int = None) -> float:
+        """当前成交价"""
+        index, progress = self._position(self.now() if now is None else now)
+        points, prices = self._path(index)
+        return float(np.interp(progress, points, prices))
+
+    def forming(self, now: int = None):
+        """
+        当前基础周期K线
+        :return: (下标, 进度, (开, 高, 低, 收, 量))
+        """
+        index, progress = self._position(self.now() if now is None else now)
+        points, prices = self._path(index)
+        current = float(np.interp(progress, points, prices))
+        passed = [p for x, p in zip(points, prices) if x <= progress] + [current]
+        values = (prices[0], max(passed), min(passed), current, float(self.klines.volume[index]) * progress)
+        return index, progress, values
+
+    # ---------- K线 ----------
+
+    def series(self, bar: str, now: int = None):
+        """
+        截至当前时间的K线（原始时间戳）
+        :param bar: 周期，必须是基础周期的整数倍
+        :return: (之前的K线（视图，从旧到新）, 当前K线（1根）)
+        """
+        step = BAR_MILLISECONDS.get(bar)
+        if not step or step % self.step:
+            raise ValueError(f"不支持的K线周期: {bar}")
+        index, _, values = self.forming(self.now() if now is None else now)
+        current_open = int(self.klines.timestamp[index])
+        forming = KlineSeries(np.array([current_open], dtype=np.int64), *(np.array([v]) for v in values))
+        if step == self.step:
+            return self.klines[:index], forming
+
+        if bar not in self._resampled:
+            self._resampled[bar] = self.klines.resample(step)
+        resampled = self._resampled[bar]
+        bucket = current_open // step * step
+        position = int(np.searchsorted(resampled.timestamp, bucket))
+        first = int(np.searchsorted(self.klines.timestamp, bucket))
+        return resampled[:position], self.klines[first:index].merge(forming).resample(step)
+
+    def candles(self, bar: str, after: int = None, before: int = None, limit: int = 100,
+                confirmed_only: bool = False, now: int = None) -> List[List[str]]:
+        """
+        OKX格式K线（平移后时间戳，从新到旧）
+        :param after: 只返回开盘时间早于它的（分页游标）
+        :param before: 只返回开盘时间晚于它的
+        :param limit: 最多返回根数
+        :param confirmed_only: 只返回已收盘K线（history-candles）
+        """
+        now = self.now() if now is None else now
+        step = BAR_MILLISECONDS.get(bar, 0)
+        closed, forming = self.series(bar, now)
+        original_now = now - self.offset
+        if int(forming.timestamp[0]) + step <= original_now:
+            # 回放结束后最后一根也已收盘
+            closed, forming = closed.merge(forming), KlineSeries.empty()
+        elif confirmed_only:
+            forming = KlineSeries.empty()
+
+        # 游标换算到原始时间后二分定位，只格式化需要的几根
+        lo = int(np.searchsorted(closed.timestamp, before - self.offset, side='right')) if before is not None else 0
+        hi = int(np.searchsorted(closed.timestamp, after - self.offset, side='left')) if after is not None else len(closed)
+        rows = []
+        if len(forming):
+            ts = int(forming.timestamp[0]) + self.offset
+            if (after is None or ts < after) and (before is None or ts > before):
+                rows.append(self._row(forming, 0, '0'))
+        rows.extend(self._row(closed, i, '1') for i in range(hi - 1, max(lo, hi - limit) - 1, -1))
+        return rows[:limit]
+
+    def _row(self, series: KlineSeries, i: int, confirm: str) -> List[str]:
+        v, c = float(series.volume[i]), float(series.close[i])
+        return [str(int(series.timestamp[i]) + self.offset), f'{series.open[i]:.1f}', f'{series.high[i]:.1f}',
+                f'{series.low[i]:.1f}', f'{c:.1f}', f'{v:.8f}', f'{v * c:.4f}', f'{v * c:.4f}', confirm]
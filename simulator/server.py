@@ -0,0 +1,488 @@
+"""本地OKX模拟服务器（FastAPI：REST + 公共/私有/business WebSocket）
+
+机器人只需把REST和WebSocket地址指向这里（OKX_BASE_URL / OKX_WS_*_URL），不用改任何代码即可离线联调和压测：
+    python -m simulator --port 8900 --latency-ms 50 --error-rate 0.02 --throttle-rate 0.02
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Set, Tuple
+
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from bot.trader import OKX_RATE_LIMITS
+
+from .exchange import MatchingEngine
+
+
+# REST接口 -> 限速分组（与OKXTrader使用的分组一致）
+ROUTE_LIMITS = {
+    ('GET', '/api/v5/account/balance'): 'balance',
+    ('GET', '/api/v5/market/ticker'): 'ticker',
+    ('GET', '/api/v5/market/candles'): 'candles',
+    ('GET', '/api/v5/market/history-candles'): 'history_candles',
+    ('GET', '/api/v5/trade/fills-history'): 'fills',
+    ('POST', '/api/v5/trade/order'): 'order',
+    ('GET', '/api/v5/trade/order'): 'order_info',
+}
+# 需要签名的接口前缀
+PRIVATE_PREFIXES = ('/api/v5/account/', '/api/v5/trade/')
+
+
+class FaultInjector:
+    """故障注入
+
+    - latency_ms + 0~jitter_ms 随机延迟（每个REST请求）
+    - 按OKX文档限速（令牌桶，超出返回HTTP 429 / code 50011），throttle_rate 再随机注入429
+    - error_rate 随机返回HTTP 503 / code 50001（服务暂不可用）
+    - lost_reply_rate 下单请求正常处理后丢掉响应（返回非JSON的502），用来验证按clOrdId核对、不重复下单
+    """
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0,
+                 throttle_rate: float = 0, lost_reply_rate: float = 0, enforce_limits: bool = True,
+                 limits: Dict[str, tuple] = None, seed: int = None):
+        """
+        :param latency_ms: 固定延迟（毫秒）
+        :param jitter_ms: 额外随机延迟上限（毫秒）
+        :param error_rate: 随机503的概率
+        :param throttle_rate: 随机429的概率
+        :param lost_reply_rate: 下单成功后丢失响应的概率
+        :param enforce_limits: 是否按限速表返回429
+        :param limits: 分组 -> (请求数, 时间窗口秒)，默认OKX_RATE_LIMITS
+        :param seed: 随机种子（复现同一串故障）
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.lost_reply_rate = lost_reply_rate
+        self.enforce_limits = enforce_limits
+        self.limits = limits or OKX_RATE_LIMITS
+        self.random = random.Random(seed)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self.counts = Counter()
+
+    async def delay(self):
+        """注入延迟"""
+        delay = self.latency_ms + (self.random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+    def check(self, group: Optional[str]) -> Optional[Tuple[int, Dict]]:
+        """
+        请求处理前的故障
+        :return: (HTTP状态码, 响应)；None表示正常处理
+        """
+        self.counts['requests'] += 1
+        if group and self.enforce_limits and group in self.limits:
+            # 与OKXTrader的TokenBucket同样的令牌桶语义（容量count，每period秒补满），只是不等待
+            count, period = self.limits[group]
+            tokens, updated = self._buckets.get(group, (float(count), time.monotonic()))
+            now = time.monotonic()
+            tokens = min(count, tokens + (now - updated) * count / period)
+            if tokens < 1:
+                self._buckets[group] = (tokens, now)
+                self.counts['rate_limited'] += 1
+                return 429, {'code': '50011', 'msg': 'Too Many Requests', 'data': []}
+            self._buckets[group] = (tokens - 1, now)
+        if self.throttle_rate and self.random.random() < self.throttle_rate:
+            self.counts['throttled'] += 1
+            return 429, {'code': '50011', 'msg': 'Too Many Requests', 'data': []}
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.counts['errors'] += 1
+            return 503, {'code': '50001', 'msg': 'Service temporarily unavailable. Please try again later.',
+                         'data': []}
+        return None
+
+    def lose_reply(self) -> bool:
+        """下单已处理，是否丢掉响应"""
+        if self.lost_reply_rate and self.random.random() < self.lost_reply_rate:
+            self.counts['lost_replies'] += 1
+            return True
+        return False
+
+
+def sign(secret_key: str, message: str) -> str:
+    """OKX签名：Base64(HMAC-SHA256(message))"""
+    return base64.b64encode(hmac.new(secret_key.encode(), message.encode(), hashlib.sha256).digest()).decode()
+
+
+class _Session:
+    """一条WebSocket连接：订阅集合 + 发送队列（广播只入队，慢客户端不拖慢其他连接）"""
+
+    QUEUE_SIZE = 1000
+
+    def __init__(self, ws: WebSocket, kind: str):
+        self.ws = ws
+        self.kind = kind
+        self.logged_in = False
+        self.channels: Set[Tuple[str, str]] = set()    # (channel, instId)
+        self.queue: asyncio.Queue = asyncio.Queue(self.QUEUE_SIZE)
+        self.overflow = False
+        self.conn_id = f'{id(self):x}'
+
+    def send(self, message):
+        """消息入队；队列满时断开（客户端处理不过来）"""
+        if self.overflow:
+            return
+        try:
+            self.queue.put_nowait(message if isinstance(message, str) else json.dumps(message))
+        except asyncio.QueueFull:
+            self.overflow = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def sender(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                if message is None:
+                    await self.ws.close(code=4001)
+                    return
+                await self.ws.send_text(message)
+        except Exception:
+            pass    # 连接已断开，由接收循环清理
+
+
+def create_app(engine: MatchingEngine, faults: FaultInjector = None, api_key: str = '', secret_key: str = '',
+               passphrase: str = '', tick_interval: float = 0.5) -> FastAPI:
+    """
+    创建模拟服务器
+    :param engine: 撮合引擎
+    :param faults: 故障注入（默认不注入，只按OKX限速）
+    :param api_key/secret_key/passphrase: 配置后校验REST签名和私有频道登录（留空不校验）
+    :param tick_interval: 撮合限价单、推送行情的间隔（秒）
+    """
+    faults = faults or FaultInjector()
+    sessions: Set[_Session] = set()
+
+    def flush_private():
+        """把撮合产生的订单/余额事件推给订阅了的私有连接"""
+        for channel, data in engine.tick():
+            for session in list(sessions):
+                for subscribed, inst_id in session.channels:
+                    if subscribed == channel and (channel == 'account' or inst_id in ('', data[0].get('instId'))):
+                        arg = {'channel': channel, 'instType': 'SPOT'} if channel == 'orders' else {'channel': channel}
+                        session.send({'arg': arg, 'data': data})
+                        break
+
+    async def tick_loop():
+        """定时撮合 + 推送行情（K线换根时先推上一根的收盘数据）"""
+        last_open: Dict[str, str] = {}
+        while True:
+            await asyncio.sleep(tick_interval)
+            flush_private()
+            channels = {channel for session in sessions if session.kind != 'private'
+                        for channel, _ in session.channels}
+            if not channels:
+                continue
+            pushes = {}
+            if 'tickers' in channels:
+                pushes['tickers'] = [engine.ticker(engine.symbol)['data']]
+            for channel in channels - {'tickers'}:
+                rows = engine.market.candles(channel[len('candle'):], limit=2)
+                batches = []
+                if last_open.get(channel) not in (None, rows[0][0]) and len(rows) > 1:
+                    batches.append([rows[1]])
+                last_open[channel] = rows[0][0]
+                batches.append([rows[0]])
+                pushes[channel] = batches
+            for session in list(sessions):
+                for channel, inst_id in session.channels:
+                    for data in pushes.get(channel, ()):
+                        session.send({'arg': {'channel': channel, 'instId': inst_id}, 'data': data})
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        task = asyncio.get_running_loop().create_task(tick_loop())
+        try:
+            yield
+        finally:
+            task.cancel()
+
+    app = FastAPI(title='OKX模拟服务器', lifespan=lifespan)
+    app.state.engine = engine
+    app.state.faults = faults
+
+    def authenticate(request: Request, body: str) -> Optional[Dict]:
+        """校验REST签名；不通过时返回OKX错误响应"""
+        if not api_key or not request.url.path.startswith(PRIVATE_PREFIXES):
+            return None
+        headers = request.headers
+        if headers.get('OK-ACCESS-KEY') != api_key:
+            return {'code': '50111', 'msg': 'Invalid OK-ACCESS-KEY', 'data': []}
+        if headers.get('OK-ACCESS-PASSPHRASE') != passphrase:
+            return {'code': '50105', 'msg': 'Your OK-ACCESS-PASSPHRASE is incorrect', 'data': []}
+        query = request.url.query
+        path = f"{request.url.path}?{query}" if query else request.url.path
+        expected = sign(secret_key, f"{headers.get('OK-ACCESS-TIMESTAMP', '')}{request.method}{path}{body}")
+        if not hmac.compare_digest(headers.get('OK-ACCESS-SIGN', ''), expected):
+            return {'code': '50113', 'msg': 'Invalid Sign', 'data': []}
+        return None
+
+    async def handle(request: Request, handler):
+        """REST请求的公共流程：延迟 → 限速/故障 → 签名 → 处理"""
+        await faults.delay()
+        injected = faults.check(ROUTE_LIMITS.get((request.method, request.url.path)))
+        if injected:
+            return JSONResponse(injected[1], status_code=injected[0])
+        body = (await request.body()).decode() if request.method == 'POST' else ''
+        error = authenticate(request, body)
+        if error:
+            return JSONResponse(error, status_code=401)
+        params = json.loads(body or '{}') if request.method == 'POST' else dict(request.query_params)
+        return JSONResponse(handler(params))
+
+    @app.get('/api/v5/account/balance')
+    async def balance(request: Request):
+        return await handle(request, lambda p: engine.balance())
+
+    @app.get('/api/v5/market/ticker')
+    async def ticker(request: Request):
+        return await handle(request, lambda p: engine.ticker(p.get('instId', '')))
+
+    @app.get('/api/v5/market/candles')
+    async def candles(request: Request):
+        return await handle(request, lambda p: engine.candles(
+            p.get('instId', ''), p.get('bar') or '1m', p.get('after', ''), p.get('before', ''), p.get('limit', '')))
+
+    @app.get('/api/v5/market/history-candles')
+    async def history_candles(request: Request):
+        return await handle(request, lambda p: engine.candles(
+            p.get('instId', ''), p.get('bar') or '1m', p.get('after', ''), p.get('before', ''), p.get('limit', ''),
+            history=True))
+
+    @app.get('/api/v5/trade/fills-history')
+    async def fills_history(request: Request):
+        return await handle(request, lambda p: engine.fills_history(
+            p.get('instId', ''), p.get('after', ''), p.get('before', ''), p.get('limit', '')))
+
+    @app.get('/api/v5/trade/order')
+    async def get_order(request: Request):
+        return await handle(request, lambda p: engine.get_order(
+            p.get('instId', ''), p.get('ordId', ''), p.get('clOrdId', '')))
+
+    @app.post('/api/v5/trade/order')
+    async def place_order(request: Request):
+        response = await handle(request, engine.place_order)
+        flush_private()
+        if response.status_code == 200 and faults.lose_reply():
+            return PlainTextResponse('Bad Gateway', status_code=502)
+        return response
+
+    # ---------- WebSocket ----------
+
+    def login(session: _Session, args) -> Dict:
+        if not args:
+            return {'event': 'error', 'code': '60009', 'msg': 'Login failed.'}
+        arg = args[0]
+        if api_key:
+            expected = sign(secret_key, f"{arg.get('timestamp', '')}GET/users/self/verify")
+            if (arg.get('apiKey') != api_key or arg.get('passphrase') != passphrase
+                    or not hmac.compare_digest(arg.get('sign', ''), expected)):
+                return {'event': 'error', 'code': '60009', 'msg': 'Login failed.'}
+        session.logged_in = True
+        return {'event': 'login', 'code': '0', 'msg': '', 'connId': session.conn_id}
+
+    def subscribe(session: _Session, arg: Dict):
+        """订阅一个频道并推送当前快照"""
+        channel = arg.get('channel', '')
+        inst_id = arg.get('instId', '')
+        allowed = {'public': channel == 'tickers',
+                   'business': channel.startswith('candle'),
+                   'private': channel in ('orders', 'account')}[session.kind]
+        if channel == 'tickers' and inst_id != engine.symbol:
+            allowed = False
+        elif channel.startswith('candle') and engine.candles(inst_id, channel[len('candle'):], limit='1')['code'] != '0':
+            allowed = False
+        if not allowed:
+            session.send({'event': 'error', 'code': '60018', 'msg': f"Wrong URL or channel:{channel}",
+                          'connId': session.conn_id})
+            return
+        if session.kind == 'private' and not session.logged_in:
+            session.send({'event': 'error', 'code': '60011', 'msg': 'Please log in', 'connId': session.conn_id})
+            return
+        session.channels.add((channel, inst_id))
+        session.send({'event': 'subscribe', 'arg': arg, 'connId': session.conn_id})
+        if channel == 'tickers':
+            session.send({'arg': arg, 'data': engine.ticker(inst_id)['data']})
+        elif channel.startswith('candle'):
+            session.send({'arg': arg, 'data': engine.candles(inst_id, channel[len('candle'):], limit='1')['data']})
+        elif channel == 'account':
+            session.send({'arg': arg, 'data': [engine.account()]})
+
+    async def serve_ws(ws: WebSocket, kind: str):
+        await ws.accept()
+        session = _Session(ws, kind)
+        sessions.add(session)
+        sender = asyncio.get_running_loop().create_task(session.sender())
+        try:
+            while not session.overflow:
+                raw = await ws.receive_text()
+                if raw == 'ping':
+                    session.send('pong')
+                    continue
+                try:
+                    message = json.loads(raw)
+                except ValueError:
+                    session.send({'event': 'error', 'code': '60012', 'msg': f'Invalid request: {raw[:50]}'})
+                    continue
+                op = message.get('op')
+                if op == 'login' and kind == 'private':
+                    session.send(login(session, message.get('args')))
+                elif op == 'subscribe':
+                    for arg in message.get('args') or []:
+                        subscribe(session, arg)
+                elif op == 'unsubscribe':
+                    for arg in message.get('args') or []:
+                        session.channels.discard((arg.get('channel', ''), arg.get('instId', '')))
+                        session.send({'event': 'unsubscribe', 'arg': arg, 'connId': session.conn_id})
+                else:
+                    session.send({'event': 'error', 'code': '60012', 'msg': f'Invalid request: {raw[:50]}'})
+        except WebSocketDisconnect:
+            pass
+        finally:
+            sessions.discard(session)
+            sender.cancel()
+
+    @app.websocket('/ws/v5/public')
+    async def ws_public(ws: WebSocket):
+        await serve_ws(ws, 'public')
+
+    @app.websocket('/ws/v5/business')
+    async def ws_business(ws: WebSocket):
+        await serve_ws(ws, 'business')
+
+    @app.websocket('/ws/v5/private')
+    async def ws_private(ws: WebSocket):
+        await serve_ws(ws, 'private')
+
+    return app
+
+
+class SimulatorServer:
+    """在后台线程里运行模拟服务器（测试/压测脚本用：with SimulatorServer(engine) as server: ...）"""
+
+    def __init__(self, engine: MatchingEngine, faults: FaultInjector = None, host: str = '127.0.0.1',
+                 port: int = 0, **app_options):
+        """
+        :param engine: 撮合引擎
+        :param faults: 故障注入
+        :param host: 监听地址
+        :param port: 端口（0=自动选一个空闲端口）
+        :param app_options: create_app的其余参数（凭证、tick_interval）
+        """
+        self.engine = engine
+        self.faults = faults or FaultInjector()
+        self.host = host
+        self.port = port or self._free_port(host)
+        self.app = create_app(engine, self.faults, **app_options)
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _free_port(host: str) -> int:
+        with socket.socket() as sock:
+            sock.bind((host, 0))
+            return sock.getsockname()[1]
+
+    @property
+    def base_url(self) -> str:
+        """REST地址（OKX_BASE_URL）"""
+        return f'http://{self.host}:{self.port}'
+
+    def ws_url(self, kind: str) -> str:
+        """WebSocket地址：kind为public/private/business"""
+        return f'ws://{self.host}:{self.port}/ws/v5/{kind}'
+
+    def start(self, timeout: float = 10.0):
+        """启动并等待端口就绪"""
+        import uvicorn
+        config = uvicorn.Config(self.app, host=self.host, port=self.port, log_level='warning', ws='websockets')
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, name='okx-simulator', daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError('模拟服务器启动失败')
+            time.sleep(0.01)
+
+    def stop(self):
+        """停止服务器"""
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=10)
+            self._server = None
+
+    def __enter__(self) -> 'SimulatorServer':
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    """命令行入口: python -m simulator [--candles FILE] [--port 8900] [故障注入参数]"""
+    from bot.backtest import load_candles
+    from .market import ReplayMarket, synthetic_candles
+
+    parser = argparse.ArgumentParser(description='本地OKX模拟服务器')
+    parser.add_argument('--candles', help='回放K线文件（OKX格式CSV、.npz或.candles；默认生成随机行情）')
+    parser.add_argument('--bar', default='15m', help='回放K线周期（默认15m）')
+    parser.add_argument('--symbol', default='BTC-USDT', help='交易对')
+    parser.add_argument('--start', type=int, help='从第几根K线开始回放（默认保留500根历史）')
+    parser.add_argument('--speed', type=float, default=1.0, help='回放速度倍数（>1时K线时间与本机时钟不再对齐）')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--usdt', type=float, default=10000.0, help='初始USDT')
+    parser.add_argument('--btc', type=float, default=0.0, help='初始BTC')
+    parser.add_argument('--latency-ms', type=float, default=0, help='每个REST请求的固定延迟')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='额外随机延迟上限')
+    parser.add_argument('--error-rate', type=float, default=0, help='随机503的概率')
+    parser.add_argument('--throttle-rate', type=float, default=0, help='随机429的概率')
+    parser.add_argument('--lost-reply-rate', type=float, default=0, help='下单成功但丢失响应的概率')
+    parser.add_argument('--no-rate-limit', action='store_true', help='不按OKX限速返回429')
+    parser.add_argument('--seed', type=int, help='故障注入随机种子')
+    parser.add_argument('--tick', type=float, default=0.5, help='撮合/推送间隔（秒）')
+    parser.add_argument('--api-key', default='', help='配置后校验签名（与机器人.env中的凭证一致）')
+    parser.add_argument('--secret-key', default='')
+    parser.add_argument('--passphrase', default='')
+    args = parser.parse_args()
+
+    import uvicorn
+    klines = load_candles(args.candles) if args.candles else synthetic_candles(35040, args.bar)
+    market = ReplayMarket(klines, args.bar, start=args.start, speed=args.speed)
+    engine = MatchingEngine(market, args.symbol, usdt=args.usdt, btc=args.btc)
+    faults = FaultInjector(args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate,
+                           args.lost_reply_rate, enforce_limits=not args.no_rate_limit, seed=args.seed)
+    app = create_app(engine, faults, args.api_key, args.secret_key, args.passphrase, args.tick)
+
+    host = f'{args.host}:{args.port}'
+    print(f"🧪 OKX模拟服务器 {args.symbol}，回放{len(klines):,}根{args.bar}K线，当前价格 {market.price():.1f}")
+    print("   机器人 .env 配置:")
+    print(f"     OKX_BASE_URL=http://{host}")
+    for kind in ('public', 'private', 'business'):
+        print(f"     OKX_WS_{kind.upper()}_URL=ws://{host}/ws/v5/{kind}")
+    try:
+        uvicorn.run(app, host=args.host, port=args.port, log_level='warning', ws='websockets')
+    finally:
+        summary = engine.summary()
+        print(f"\n📊 余额 USDT {summary['usdt']:.2f} / BTC {summary['btc']:.8f}，"
+              f"订单{summary['orders']}笔，成交{summary['fills']}笔；注入故障 {dict(faults.counts)}")
+
+
+if __name__ == '__main__':
+    main()